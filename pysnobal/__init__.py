@@ -0,0 +1,8 @@
+def build_info() -> dict:
+    """
+    Describe the build of the Snobal extension in use, see
+    pysnobal.c_snobal.build_info.
+    """
+    from pysnobal.c_snobal import build_info
+
+    return build_info()
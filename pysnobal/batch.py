@@ -0,0 +1,319 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Optional
+
+import pandas as pd
+import yaml
+
+import pysnobal.pysnobal as pysnobal
+
+
+def load_manifest(path: Path) -> list[dict[str, Any]]:
+    """
+    Loads a batch manifest YAML file into a list of jobs.
+
+    The manifest lists the jobs under 'jobs', each with the path to a config file
+    (relative to the manifest) and optional overrides and name:
+
+        jobs:
+          - config: station_a.yaml
+            overrides: [params.elevation_m=2101]
+          - config: station_b.yaml
+            name: station_b_wet
+
+    Args:
+        path (Path): Path to manifest file.
+
+    Returns:
+        list[dict]: Jobs, with the config path, overrides and name.
+    """
+    path = Path(path)
+    with open(path, "r") as f:
+        manifest = yaml.safe_load(f)
+
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("jobs"), list):
+        raise ValueError(f"manifest {path} must contain a list of 'jobs'")
+
+    jobs = []
+    for entry in manifest["jobs"]:
+        if isinstance(entry, str):
+            entry = {"config": entry}
+        if entry.get("config") is None:
+            raise ValueError(f"every job in manifest {path} must specify a config")
+
+        config_path = Path(entry["config"])
+        if not config_path.is_absolute():
+            config_path = path.parent / config_path
+
+        jobs.append(
+            {
+                "config": str(config_path),
+                "overrides": list(entry.get("overrides") or []),
+                "name": entry.get("name"),
+            }
+        )
+
+    return jobs
+
+
+def run_batch(
+    jobs: list[dict[str, Any]],
+    workers: Optional[int] = None,
+    log_dir: Optional[Path] = None,
+    overrides: Optional[list[str]] = None,
+) -> pd.DataFrame:
+    """
+    Run many model configurations across a bounded pool of worker processes.
+
+    Worker processes are reused between jobs, so the interpreter start up and imports
+    are paid once per worker. Each job writes its output to 'io.output_path' of its
+    config and, when log_dir is given, a log to '<log_dir>/<name>.log'. Failing jobs are
+    recorded in the summary and do not stop the batch.
+
+    Args:
+        jobs (list[dict]): Jobs, each with a 'config' path and optional 'overrides' and
+            'name' (see load_manifest).
+        workers (int): Number of worker processes. Defaults to the number of CPUs.
+        log_dir (Path): Directory for the per-job logs.
+        overrides (list[str]): Overrides applied to all jobs, before the job overrides.
+
+    Returns:
+        pd.DataFrame: Summary with one row per job: name, config, status, runtime_s,
+            timesteps and error.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if log_dir is not None:
+        Path(log_dir).mkdir(parents=True, exist_ok=True)
+
+    names = _job_names(jobs)
+
+    # spawn fresh workers, as forking after OpenMP was used in this process can hang
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=min(workers, max(len(jobs), 1)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    ) as executor:
+        futures = {
+            executor.submit(
+                _run_job,
+                name,
+                job["config"],
+                list(overrides or []) + list(job.get("overrides") or []),
+                None if log_dir is None else str(Path(log_dir) / f"{name}.log"),
+            ): (name, job["config"])
+            for name, job in zip(names, jobs)
+        }
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # the worker died before returning a result, e.g. BrokenProcessPool
+                name, config_path = futures[future]
+                results.append(
+                    {
+                        "name": name,
+                        "config": config_path,
+                        "status": "failed",
+                        "runtime_s": 0.0,
+                        "timesteps": 0,
+                        "error": f"{type(e).__name__}: {e}",
+                    }
+                )
+
+    order = {name: i for i, name in enumerate(names)}
+    results.sort(key=lambda r: order[r["name"]])
+
+    return pd.DataFrame(
+        results,
+        columns=["name", "config", "status", "runtime_s", "timesteps", "error"],
+    )
+
+
+def summarize(summary_df: pd.DataFrame, wall_time_s: float, workers: int) -> str:
+    """
+    Format the runtime, throughput and failures of a batch.
+
+    Args:
+        summary_df (pd.DataFrame): Summary returned by run_batch.
+        wall_time_s (float): Wall time of the batch in seconds.
+        workers (int): Number of worker processes.
+
+    Returns:
+        str: Multi-line summary.
+    """
+    failed = summary_df[summary_df["status"] != "ok"]
+    n_jobs = len(summary_df)
+    timesteps = summary_df["timesteps"].sum()
+
+    lines = [
+        f"jobs: {n_jobs} ({n_jobs - len(failed)} succeeded, {len(failed)} failed)",
+        f"workers: {workers}",
+        f"wall time: {wall_time_s:.1f} s",
+        f"job runtime: {summary_df['runtime_s'].sum():.1f} s total, "
+        f"{summary_df['runtime_s'].mean():.2f} s mean",
+        f"throughput: {n_jobs / wall_time_s:.2f} jobs/s, "
+        f"{timesteps / wall_time_s:.0f} timesteps/s",
+    ]
+    for _, row in failed.iterrows():
+        lines.append(f"FAILED {row['name']} ({row['config']}): {row['error']}")
+
+    return "\n".join(lines)
+
+
+def run_pysnobal_batch(args: Optional[list[str]] = None) -> pd.DataFrame:
+    """
+    Execute many model configurations from the command line, e.g.
+
+        pysnobal batch --configs 'configs/*.yaml' --workers 16 --log-dir logs
+
+    Args:
+        args (list[str]): Command line arguments, after 'batch'.
+
+    Returns:
+        pd.DataFrame: Summary returned by run_batch.
+    """
+    parser = argparse.ArgumentParser(
+        prog="pysnobal batch",
+        description="Run Snobal for many configs across a pool of worker processes.",
+    )
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--configs",
+        nargs="+",
+        help="Glob patterns of YAML config files, e.g. 'configs/*.yaml'.",
+    )
+    source.add_argument(
+        "--manifest", type=str, help="Path to a YAML manifest of configs and overrides."
+    )
+    parser.add_argument(
+        "--override",
+        "-o",
+        nargs="*",
+        default=[],
+        help="Override config values of all jobs, e.g. -o io.forcing_cache=True",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=None,
+        help="Number of worker processes. Defaults to the number of CPUs.",
+    )
+    parser.add_argument(
+        "--log-dir", type=str, default=None, help="Per-job log directory."
+    )
+    parser.add_argument(
+        "--summary", type=str, default=None, help="Path to write the job summary CSV."
+    )
+
+    args = parser.parse_args(args)
+
+    if args.manifest is not None:
+        jobs = load_manifest(args.manifest)
+    else:
+        paths = sorted({p for pattern in args.configs for p in glob.glob(pattern)})
+        if len(paths) == 0:
+            raise ValueError(f"No config files match {args.configs}")
+        jobs = [{"config": p} for p in paths]
+
+    workers = args.workers or os.cpu_count() or 1
+
+    start = time.perf_counter()
+    summary_df = run_batch(jobs, workers, args.log_dir, args.override)
+    wall_time_s = time.perf_counter() - start
+
+    print(summarize(summary_df, wall_time_s, workers))
+
+    if args.summary is not None:
+        summary_df.to_csv(args.summary, index=False)
+
+    return summary_df
+
+
+def _job_names(jobs: list[dict[str, Any]]) -> list[str]:
+    """
+    Unique job names, used for the logs.
+
+    Jobs are named by their 'name' or else their config file. Repeated names get a
+    numbered suffix that no other job uses, e.g. 'a', 'a', 'a_1' -> 'a', 'a_2', 'a_1'.
+    """
+    bases = [job.get("name") or Path(job["config"]).stem for job in jobs]
+
+    names = []
+    for i, base in enumerate(bases):
+        name = base
+        n = 1
+        # suffixed names must not be used by this or a later job
+        while name in names or (name != base and name in bases[i:]):
+            name = f"{base}_{n}"
+            n += 1
+        names.append(name)
+
+    return names
+
+
+def _init_worker() -> None:
+    # imports are paid once per worker process, not once per job
+    import pysnobal.c_snobal.snobal  # noqa: F401
+
+
+def _run_job(
+    name: str, config_path: str, overrides: list[str], log_path: Optional[str]
+) -> dict[str, Any]:
+    """
+    Run a single job in a worker process, capturing its errors in the result.
+    """
+    start = time.perf_counter()
+    result = {
+        "name": name,
+        "config": config_path,
+        "status": "ok",
+        "runtime_s": 0.0,
+        "timesteps": 0,
+        "error": None,
+    }
+
+    log = open(log_path, "w") if log_path is not None else None
+    try:
+        _log(log, f"job {name}: config {config_path}, overrides {overrides}")
+
+        config = pysnobal._override_config(pysnobal.load_config(config_path), overrides)
+        forcing_data_df = pysnobal.load_forcing(
+            config["io"]["forcing_path"],
+            use_cache=bool(config["io"].get("forcing_cache")),
+        )
+        _log(
+            log, f"forcing {config['io']['forcing_path']}: {len(forcing_data_df)} rows"
+        )
+
+        output_df = pysnobal.run_snobal(forcing_data_df, config)
+        output_df.to_csv(config["io"]["output_path"])
+
+        result["timesteps"] = len(output_df)
+        _log(log, f"output {config['io']['output_path']}: {len(output_df)} rows")
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = f"{type(e).__name__}: {e}"
+        _log(log, traceback.format_exc())
+    finally:
+        result["runtime_s"] = time.perf_counter() - start
+        _log(log, f"{result['status']} in {result['runtime_s']:.2f} s")
+        if log is not None:
+            log.close()
+
+    return result
+
+
+def _log(log, message: str) -> None:
+    if log is not None:
+        log.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {message}\n")
+        log.flush()
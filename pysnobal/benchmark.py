@@ -0,0 +1,114 @@
+import argparse
+import time
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from pysnobal.model import SnobalModel
+from pysnobal.pysnobal import load_config
+
+# Forcing of a cold, cloudy winter hour with light snowfall, in Snobal units
+FORCING = {
+    "S_n": 50.0,
+    "I_lw": 260.0,
+    "T_a": 268.0,
+    "e_a": 350.0,
+    "u": 3.0,
+    "T_g": 272.0,
+    "m_pp": 0.5,
+    "percent_snow": 1.0,
+    "rho_snow": 100.0,
+    "T_pp": 268.0,
+}
+
+
+def benchmark_threads(
+    config: dict,
+    shape: tuple[int, int],
+    threads: list[int],
+    n_steps: int = 24,
+    numa: bool = False,
+) -> pd.DataFrame:
+    """
+    Measure how the computation of a grid scales with the number of threads, e.g.
+    with and without numa, to check whether NUMA-aware runs pay off on a node.
+
+    Each thread count runs a fresh SnobalModel, so the arrays are allocated (and
+    placed, with numa) for that number of threads. The forcing is spatially uniform
+    and the same every timestep, so the snowcover builds up from the initial state.
+
+    Args:
+        config (dict): Model configuration parameters, see SnobalModel.
+        shape (tuple): Shape of the grid.
+        threads (list[int]): Numbers of threads to run.
+        n_steps (int): Number of hourly data timesteps of each run.
+        numa (bool): NUMA-aware runs, see do_tstep_grid.
+
+    Returns:
+        pd.DataFrame: Per number of threads, the seconds per timestep, the pixels
+            computed per second and the speedup and parallel efficiency relative
+            to the first number of threads.
+    """
+    rows = []
+    for nthreads in threads:
+        model = SnobalModel(
+            config,
+            np.full(shape, 2000.0),
+            0.01,
+            "2020-01-01",
+            3600.0,
+            nthreads=nthreads,
+            numa=numa,
+        )
+        for forcing in [model.forcing_t, model.forcing_t1]:
+            for k, v in FORCING.items():
+                forcing[k][:] = v
+
+        # the first timestep (re)initializes the snowcover
+        model.step()
+        start = time.perf_counter()
+        for _ in range(n_steps):
+            model.step()
+        seconds = (time.perf_counter() - start) / n_steps
+
+        rows.append(
+            {
+                "threads": nthreads,
+                "seconds_per_step": seconds,
+                "pixels_per_second": shape[0] * shape[1] / seconds,
+            }
+        )
+
+    table = pd.DataFrame(rows).set_index("threads")
+    base = table.iloc[0]
+    table["speedup"] = base["seconds_per_step"] / table["seconds_per_step"]
+    table["efficiency"] = table["speedup"] * base.name / table.index
+    return table
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Thread scaling of a Snobal grid, with and without NUMA-aware runs"
+    )
+    parser.add_argument("config", help="Model config file")
+    parser.add_argument("--shape", type=int, nargs=2, default=[1000, 1000])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--steps", type=int, default=24)
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    for numa in [False, True]:
+        table = benchmark_threads(
+            config,
+            tuple(args.shape),
+            args.threads,
+            n_steps=args.steps,
+            numa=numa,
+        )
+        print(f"numa={numa}")
+        print(table.to_string(float_format="{:.3g}".format))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,85 @@
-# from pysnobal import lib
-# import lib
-# import ipysnobal
-from . import snobal
+import importlib
+import os
+import sys
+
+from . import snobal as _baseline
+
+# Instruction set variants of the extension, from the least to the most capable
+# (see setup.py). The baseline is the 'snobal' module itself.
+ISA_VARIANTS = ["baseline", "avx2", "avx512"]
+ISA_ENV = "PYSNOBAL_ISA"
+
+
+def _import_variant(isa: str):
+    if isa == "baseline":
+        return _baseline
+    return importlib.import_module(f"{__name__}.snobal_{isa}")
+
+
+def built_variants() -> list[str]:
+    """
+    Instruction set variants of the extension that were built and are installed.
+    """
+    built = []
+    for isa in ISA_VARIANTS:
+        try:
+            _import_variant(isa)
+        except ImportError:
+            continue
+        built.append(isa)
+    return built
+
+
+def _select_variant():
+    """
+    Import the variant requested with the PYSNOBAL_ISA environment variable, or
+    else the most capable variant that was built and that the CPU supports.
+    """
+    supported = ISA_VARIANTS[: ISA_VARIANTS.index(_baseline.cpu_isa()) + 1]
+
+    requested = os.environ.get(ISA_ENV)
+    if requested:
+        if requested not in ISA_VARIANTS:
+            raise ValueError(
+                f"Invalid {ISA_ENV} {requested}. Must be one of {ISA_VARIANTS}"
+            )
+        if requested not in supported:
+            raise ImportError(
+                f"{ISA_ENV}={requested} requested, but the CPU only supports {supported}"
+            )
+        try:
+            return _import_variant(requested)
+        except ImportError as e:
+            raise ImportError(
+                f"{ISA_ENV}={requested} requested, but that variant was not built"
+            ) from e
+
+    for isa in reversed(supported):
+        try:
+            return _import_variant(isa)
+        except ImportError:
+            continue
+
+
+snobal = _select_variant()
+
+# every import of pysnobal.c_snobal.snobal resolves to the selected variant
+sys.modules[f"{__name__}.snobal"] = snobal
+
+
+def build_info() -> dict:
+    """
+    Describe the build of the Snobal extension in use.
+
+    Returns:
+        dict: The instruction set variant in use ('isa'), the variants that were
+            built ('built'), the best variant the CPU supports ('cpu'), the value of
+            the PYSNOBAL_ISA override ('override', None when unset) and the compiler.
+    """
+    return {
+        "isa": snobal.ISA,
+        "built": built_variants(),
+        "cpu": _baseline.cpu_isa(),
+        "override": os.environ.get(ISA_ENV) or None,
+        "compiler": snobal.COMPILER,
+    }
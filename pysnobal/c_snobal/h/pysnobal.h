@@ -123,6 +123,16 @@ typedef struct {
 	double max_z_s_0;
 } PARAMS;
 
+/* CPUs that the threads of a NUMA-aware run are pinned to (see numa.c) */
+#define NUMA_MAX_CPUS 1024
+
+typedef struct {
+	int n_cpus;                  /* 0 when the threads are not pinned */
+	int cpus[NUMA_MAX_CPUS];
+	int n_saved;
+	void *saved;                 /* affinity of each thread before pinning, a cpu_set_t per thread */
+} NUMA_PINNING;
+
 /* ------------------------------------------------------------------------- */
 
 /*
@@ -130,7 +140,25 @@ typedef struct {
  */
 
 //extern int call_snobal(int N, int nthreads, int first_step, TSTEP_REC tstep_info[4], OUTPUT_REC** output_rec, INPUT_REC_ARR* input1, INPUT_REC_ARR* input2, PARAMS params, OUTPUT_REC_ARR* output1);
-extern int call_snobal(int N, int nthreads, int first_step, TSTEP_REC tstep_info[4], INPUT_REC_ARR* input1, INPUT_REC_ARR* input2, PARAMS params, OUTPUT_REC_ARR* output1);
+extern int call_snobal(int N, int nthreads, int numa, int first_step, TSTEP_REC tstep_info[4], INPUT_REC_ARR* input1, INPUT_REC_ARR* input2, PARAMS params, OUTPUT_REC_ARR* output1);
+
+extern void numa_begin(NUMA_PINNING* pinning);
+extern void numa_pin_thread(NUMA_PINNING* pinning);
+extern void numa_end(NUMA_PINNING* pinning);
+extern void numa_first_touch(int N, int nthreads, char* data, int itemsize);
+
+/* instruction set variant of the build (see setup.py) */
+#ifndef SNOBAL_ISA
+#define SNOBAL_ISA "baseline"
+#endif
+
+#ifdef __VERSION__
+#define SNOBAL_COMPILER __VERSION__
+#else
+#define SNOBAL_COMPILER "unknown"
+#endif
+
+extern const char* snobal_cpu_isa(void);
 
 //extern	void	assign_buffers (int masked, int n, int output, OUTPUT_REC **output_rec);
 //extern	void	buffers        (void);
@@ -0,0 +1,29 @@
+/*
+ * cpu_features.c
+ * Instruction set extensions supported by the CPU and the operating system,
+ * for selecting the instruction set variant of the extension at import
+ */
+
+// clang-format off
+#include "snobal.h"
+#include "pysnobal.h"
+// clang-format on
+
+/*
+ * Name of the best instruction set variant (see setup.py) that the CPU can run:
+ * "avx512", "avx2" or "baseline".
+ */
+const char *snobal_cpu_isa(void) {
+#if (defined(__GNUC__) || defined(__clang__)) && (defined(__x86_64__) || defined(__i386__))
+    __builtin_cpu_init();
+
+    if (__builtin_cpu_supports("avx2") && __builtin_cpu_supports("fma")) {
+        if (__builtin_cpu_supports("avx512f") && __builtin_cpu_supports("avx512cd") &&
+            __builtin_cpu_supports("avx512bw") && __builtin_cpu_supports("avx512dq") &&
+            __builtin_cpu_supports("avx512vl"))
+            return "avx512";
+        return "avx2";
+    }
+#endif
+    return "baseline";
+}
@@ -0,0 +1,148 @@
+/*
+ * numa.c
+ * NUMA-aware placement of the pixels of a grid run
+ *
+ * Memory is placed on the NUMA node of the thread that first writes to it
+ * (first touch). In a NUMA-aware run (numa != 0 in call_snobal), the pixels
+ * are split between the threads with a static schedule, i.e. in equal
+ * contiguous ranges in thread order, and each thread is pinned to a CPU.
+ * Arrays allocated with numa_first_touch are first written with the same
+ * static split by the same pinned threads, so each thread computes the pixels
+ * held in the memory of its own node. The threads get back their previous
+ * affinity at the end of the run.
+ *
+ * Threads are pinned only on Linux, and only when the OpenMP runtime does not
+ * bind them already (OMP_PROC_BIND / OMP_PLACES).
+ */
+
+#define _GNU_SOURCE
+
+#include <omp.h>
+#include <stdlib.h>
+#include <string.h>
+
+#ifdef __linux__
+#include <sched.h>
+#endif
+
+// clang-format off
+#include "snobal.h"
+#include "pysnobal.h"
+// clang-format on
+
+/*
+ * Find the CPUs that the threads of the next parallel region are pinned to.
+ * Each thread saves its affinity in numa_pin_thread, which is restored by
+ * numa_end. Threads that do not take part in the region keep the affinity of
+ * the calling thread, which they inherit.
+ */
+void numa_begin(NUMA_PINNING *pinning) {
+    pinning->n_cpus = 0;
+    pinning->n_saved = 0;
+    pinning->saved = NULL;
+
+#ifdef __linux__
+    int cpu, thread;
+    int nthreads = omp_get_max_threads();
+    cpu_set_t *saved;
+
+    if (omp_get_proc_bind() != omp_proc_bind_false)
+        return;
+
+    saved = malloc((size_t)nthreads * sizeof(cpu_set_t));
+    if (saved == NULL)
+        return;
+    if (sched_getaffinity(0, sizeof(cpu_set_t), &saved[0]) != 0) {
+        free(saved);
+        return;
+    }
+    for (thread = 1; thread < nthreads; thread++)
+        saved[thread] = saved[0];
+
+    pinning->saved = saved;
+    pinning->n_saved = nthreads;
+
+    for (cpu = 0; cpu < CPU_SETSIZE && pinning->n_cpus < NUMA_MAX_CPUS; cpu++) {
+        if (CPU_ISSET(cpu, &saved[0]))
+            pinning->cpus[pinning->n_cpus++] = cpu;
+    }
+#endif
+}
+
+/*
+ * Pin the calling thread of a parallel region to its CPU. The threads are
+ * spread evenly over the CPUs, so fewer threads than CPUs are spread over
+ * all NUMA nodes rather than packed on the first.
+ */
+void numa_pin_thread(NUMA_PINNING *pinning) {
+#ifdef __linux__
+    int thread = omp_get_thread_num();
+    int nthreads = omp_get_num_threads();
+    int cpu;
+    cpu_set_t set;
+
+    if (pinning->n_cpus == 0)
+        return;
+
+    if (thread < pinning->n_saved)
+        sched_getaffinity(0, sizeof(cpu_set_t), &((cpu_set_t *)pinning->saved)[thread]);
+
+    if (nthreads <= pinning->n_cpus)
+        cpu = pinning->cpus[(long)thread * pinning->n_cpus / nthreads];
+    else
+        cpu = pinning->cpus[thread % pinning->n_cpus];
+
+    CPU_ZERO(&set);
+    CPU_SET(cpu, &set);
+    sched_setaffinity(0, sizeof(cpu_set_t), &set);
+#endif
+}
+
+/*
+ * Restore the affinity of the threads pinned by numa_pin_thread. The OpenMP
+ * runtime keeps its threads between parallel regions, so each one restores
+ * its own affinity in a parallel region of the same threads.
+ */
+void numa_end(NUMA_PINNING *pinning) {
+#ifdef __linux__
+    cpu_set_t *saved = (cpu_set_t *)pinning->saved;
+
+    if (pinning->n_cpus > 0) {
+#pragma omp parallel num_threads(pinning->n_saved) shared(saved)
+        {
+            sched_setaffinity(0, sizeof(cpu_set_t), &saved[omp_get_thread_num()]);
+        }
+    }
+    free(saved);
+    pinning->saved = NULL;
+    pinning->n_saved = 0;
+#endif
+}
+
+/*
+ * Zero an array of N items of itemsize bytes with the pinned threads and static
+ * split of a NUMA-aware run, so each part is placed on the node that computes it.
+ */
+void numa_first_touch(int N, int nthreads, char *data, int itemsize) {
+    int n;
+    NUMA_PINNING pinning;
+
+    /* set threads */
+    if (nthreads != 1) {
+        omp_set_num_threads(nthreads);
+    }
+
+    numa_begin(&pinning);
+
+#pragma omp parallel shared(pinning, data) private(n)
+    {
+        numa_pin_thread(&pinning);
+
+#pragma omp for schedule(static)
+        for (n = 0; n < N; n++) {
+            memset(data + (size_t)n * itemsize, 0, itemsize);
+        }
+    }
+
+    numa_end(&pinning);
+}
@@ -99,7 +99,11 @@ cdef extern from "envphys.h":
 
 
 cdef extern from "pysnobal.h":
-    cdef int call_snobal(int N, int nthreads, int first_step, TSTEP_REC tstep_info[4], INPUT_REC_ARR* input1, INPUT_REC_ARR* input2, PARAMS params, OUTPUT_REC_ARR* output1);
+    cdef int call_snobal(int N, int nthreads, int numa, int first_step, TSTEP_REC tstep_info[4], INPUT_REC_ARR* input1, INPUT_REC_ARR* input2, PARAMS params, OUTPUT_REC_ARR* output1) nogil;
+    cdef void numa_first_touch(int N, int nthreads, char* data, int itemsize) nogil;
+    const char* SNOBAL_ISA
+    const char* SNOBAL_COMPILER
+    const char* snobal_cpu_isa()
 
     ctypedef struct OUTPUT_REC:
         int masked;
@@ -198,13 +202,26 @@ cdef extern from "pysnobal.h":
 @cython.boundscheck(False)
 @cython.wraparound(False)
 # https://github.com/cython/cython/wiki/tutorials-NumpyPointerToC
-def do_tstep_grid(input1, input2, output_rec, tstep_rec, mh, params, int first_step=1, int nthreads=1):
+def do_tstep_grid(input1, input2, output_rec, tstep_rec, mh, params, int first_step=1, int nthreads=1, output_vars=None, bint numa=False):
     """
     Do the timestep given the inputs, model state, and measurement heights
     There is no first_step value since the snow state records were already
     pulled in an initialized. Therefore only the values need to be pulled
     out before calling 'init_snow()'
+
+    output_vars limits the output only terms (e.g. 'm_s', 'cc_s', 'h2o') that
+    are passed to and copied back from Snobal. The model state is always kept
+    up to date in output_rec. All terms are returned when None.
+
+    numa splits the pixels statically between threads pinned to CPUs, so arrays
+    allocated with numa_empty are computed by the NUMA node that holds them
+    (see numa.c). The results are identical.
     """
+    if output_vars is None:
+        out_vars = set(output_rec.keys())
+    else:
+        out_vars = set(output_vars)
+
     cdef int N = (output_rec['elevation']).size
     cdef int n
     shp = output_rec['elevation'].shape
@@ -235,8 +252,11 @@ def do_tstep_grid(input1, input2, output_rec, tstep_rec, mh, params, int first_s
     output1_c.z_0 = &output1_z_0[0,0]
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_z_s_0
-    output1_z_s_0 = np.ascontiguousarray(output_rec['z_s_0'], dtype=np.float64)
-    output1_c.z_s_0 = &output1_z_s_0[0,0]
+    if 'z_s_0' in out_vars:
+        output1_z_s_0 = np.ascontiguousarray(output_rec['z_s_0'], dtype=np.float64)
+        output1_c.z_s_0 = &output1_z_s_0[0,0]
+    else:
+        output1_c.z_s_0 = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_current_time
     output1_current_time = np.ascontiguousarray(output_rec['current_time'], dtype=np.float64)
@@ -247,7 +267,7 @@ def do_tstep_grid(input1, input2, output_rec, tstep_rec, mh, params, int first_s
     output1_c.time_since_out = &output1_time_since_out[0,0]
 
     cdef np.ndarray[int, mode="c", ndim=2] output1_masked
-    output1_masked = np.ascontiguousarray(output_rec['mask'], dtype=np.int32)
+    output1_masked = _as_int32(output_rec['mask'], numa, nthreads)
     output1_c.masked = &output1_masked[0,0]
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_elevation
@@ -255,8 +275,11 @@ def do_tstep_grid(input1, input2, output_rec, tstep_rec, mh, params, int first_s
     output1_c.elevation = &output1_elevation[0,0]
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_z_s_l
-    output1_z_s_l = np.ascontiguousarray(output_rec['z_s_l'], dtype=np.float64)
-    output1_c.z_s_l = &output1_z_s_l[0,0]
+    if 'z_s_l' in out_vars:
+        output1_z_s_l = np.ascontiguousarray(output_rec['z_s_l'], dtype=np.float64)
+        output1_c.z_s_l = &output1_z_s_l[0,0]
+    else:
+        output1_c.z_s_l = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_z_s
     output1_z_s = np.ascontiguousarray(output_rec['z_s'], dtype=np.float64)
@@ -279,51 +302,81 @@ def do_tstep_grid(input1, input2, output_rec, tstep_rec, mh, params, int first_s
     output1_c.T_s = &output1_T_s[0,0]
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_cc_s_0
-    output1_cc_s_0 = np.ascontiguousarray(output_rec['cc_s_0'], dtype=np.float64)
-    output1_c.cc_s_0 = &output1_cc_s_0[0,0]
+    if 'cc_s_0' in out_vars:
+        output1_cc_s_0 = np.ascontiguousarray(output_rec['cc_s_0'], dtype=np.float64)
+        output1_c.cc_s_0 = &output1_cc_s_0[0,0]
+    else:
+        output1_c.cc_s_0 = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_cc_s_l
-    output1_cc_s_l = np.ascontiguousarray(output_rec['cc_s_l'], dtype=np.float64)
-    output1_c.cc_s_l = &output1_cc_s_l[0,0]
+    if 'cc_s_l' in out_vars:
+        output1_cc_s_l = np.ascontiguousarray(output_rec['cc_s_l'], dtype=np.float64)
+        output1_c.cc_s_l = &output1_cc_s_l[0,0]
+    else:
+        output1_c.cc_s_l = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_cc_s
-    output1_cc_s = np.ascontiguousarray(output_rec['cc_s'], dtype=np.float64)
-    output1_c.cc_s = &output1_cc_s[0,0]
+    if 'cc_s' in out_vars:
+        output1_cc_s = np.ascontiguousarray(output_rec['cc_s'], dtype=np.float64)
+        output1_c.cc_s = &output1_cc_s[0,0]
+    else:
+        output1_c.cc_s = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_m_s_0
-    output1_m_s_0 = np.ascontiguousarray(output_rec['m_s_0'], dtype=np.float64)
-    output1_c.m_s_0 = &output1_m_s_0[0,0]
+    if 'm_s_0' in out_vars:
+        output1_m_s_0 = np.ascontiguousarray(output_rec['m_s_0'], dtype=np.float64)
+        output1_c.m_s_0 = &output1_m_s_0[0,0]
+    else:
+        output1_c.m_s_0 = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_m_s_l
-    output1_m_s_l = np.ascontiguousarray(output_rec['m_s_l'], dtype=np.float64)
-    output1_c.m_s_l = &output1_m_s_l[0,0]
+    if 'm_s_l' in out_vars:
+        output1_m_s_l = np.ascontiguousarray(output_rec['m_s_l'], dtype=np.float64)
+        output1_c.m_s_l = &output1_m_s_l[0,0]
+    else:
+        output1_c.m_s_l = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_m_s
-    output1_m_s = np.ascontiguousarray(output_rec['m_s'], dtype=np.float64)
-    output1_c.m_s = &output1_m_s[0,0]
+    if 'm_s' in out_vars:
+        output1_m_s = np.ascontiguousarray(output_rec['m_s'], dtype=np.float64)
+        output1_c.m_s = &output1_m_s[0,0]
+    else:
+        output1_c.m_s = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_h2o_sat
     output1_h2o_sat = np.ascontiguousarray(output_rec['h2o_sat'], dtype=np.float64)
     output1_c.h2o_sat = &output1_h2o_sat[0,0]
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_h2o_max
-    output1_h2o_max = np.ascontiguousarray(output_rec['h2o_max'], dtype=np.float64)
-    output1_c.h2o_max = &output1_h2o_max[0,0]
+    if 'h2o_max' in out_vars:
+        output1_h2o_max = np.ascontiguousarray(output_rec['h2o_max'], dtype=np.float64)
+        output1_c.h2o_max = &output1_h2o_max[0,0]
+    else:
+        output1_c.h2o_max = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_h2o
-    output1_h2o = np.ascontiguousarray(output_rec['h2o'], dtype=np.float64)
-    output1_c.h2o = &output1_h2o[0,0]
+    if 'h2o' in out_vars:
+        output1_h2o = np.ascontiguousarray(output_rec['h2o'], dtype=np.float64)
+        output1_c.h2o = &output1_h2o[0,0]
+    else:
+        output1_c.h2o = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_h2o_vol
-    output1_h2o_vol = np.ascontiguousarray(output_rec['h2o_vol'], dtype=np.float64)
-    output1_c.h2o_vol = &output1_h2o_vol[0,0]
+    if 'h2o_vol' in out_vars:
+        output1_h2o_vol = np.ascontiguousarray(output_rec['h2o_vol'], dtype=np.float64)
+        output1_c.h2o_vol = &output1_h2o_vol[0,0]
+    else:
+        output1_c.h2o_vol = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_h2o_total
-    output1_h2o_total = np.ascontiguousarray(output_rec['h2o_total'], dtype=np.float64)
-    output1_c.h2o_total = &output1_h2o_total[0,0]
+    if 'h2o_total' in out_vars:
+        output1_h2o_total = np.ascontiguousarray(output_rec['h2o_total'], dtype=np.float64)
+        output1_c.h2o_total = &output1_h2o_total[0,0]
+    else:
+        output1_c.h2o_total = NULL
 
     cdef np.ndarray[int, mode="c", ndim=2] output1_layer_count
-    output1_layer_count = np.ascontiguousarray(output_rec['layer_count'], dtype=np.int32)
+    output1_layer_count = _as_int32(output_rec['layer_count'], numa, nthreads)
     output1_c.layer_count = &output1_layer_count[0,0]
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_R_n_bar
@@ -343,8 +396,11 @@ def do_tstep_grid(input1, input2, output_rec, tstep_rec, mh, params, int first_s
     output1_c.G_bar = &output1_G_bar[0,0]
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_G_0_bar
-    output1_G_0_bar = np.ascontiguousarray(output_rec['G_0_bar'], dtype=np.float64)
-    output1_c.G_0_bar = &output1_G_0_bar[0,0]
+    if 'G_0_bar' in out_vars:
+        output1_G_0_bar = np.ascontiguousarray(output_rec['G_0_bar'], dtype=np.float64)
+        output1_c.G_0_bar = &output1_G_0_bar[0,0]
+    else:
+        output1_c.G_0_bar = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_M_bar
     output1_M_bar = np.ascontiguousarray(output_rec['M_bar'], dtype=np.float64)
@@ -355,8 +411,11 @@ def do_tstep_grid(input1, input2, output_rec, tstep_rec, mh, params, int first_s
     output1_c.delta_Q_bar = &output1_delta_Q_bar[0,0]
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_delta_Q_0_bar
-    output1_delta_Q_0_bar = np.ascontiguousarray(output_rec['delta_Q_0_bar'], dtype=np.float64)
-    output1_c.delta_Q_0_bar = &output1_delta_Q_0_bar[0,0]
+    if 'delta_Q_0_bar' in out_vars:
+        output1_delta_Q_0_bar = np.ascontiguousarray(output_rec['delta_Q_0_bar'], dtype=np.float64)
+        output1_c.delta_Q_0_bar = &output1_delta_Q_0_bar[0,0]
+    else:
+        output1_c.delta_Q_0_bar = NULL
 
     cdef np.ndarray[double, mode="c", ndim=2] output1_E_s_sum
     output1_E_s_sum = np.ascontiguousarray(output_rec['E_s_sum'], dtype=np.float64)
@@ -458,8 +517,11 @@ def do_tstep_grid(input1, input2, output_rec, tstep_rec, mh, params, int first_s
     input2_T_g = np.ascontiguousarray(input2['T_g'], dtype=np.float64)
     input2_c.T_g = &input2_T_g[0,0]
 
-    # Run the model
-    rt = call_snobal(N, nthreads, first_step, tstep_info, &input1_c, &input2_c, c_params, &output1_c)
+    # Run the model. The GIL is released, so grids can be run from several threads;
+    # the Snobal globals are thread private.
+    cdef int rt
+    with nogil:
+        rt = call_snobal(N, nthreads, numa, first_step, tstep_info, &input1_c, &input2_c, c_params, &output1_c)
 
     if rt != -1:
         return rt
@@ -467,7 +529,8 @@ def do_tstep_grid(input1, input2, output_rec, tstep_rec, mh, params, int first_s
     cdef np.npy_intp shp_np[2]
     shp_np[:] = (shp[0], shp[1])
     output_rec['z_0'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.z_0)
-    output_rec['z_s_0'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.z_s_0)
+    if 'z_s_0' in out_vars:
+        output_rec['z_s_0'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.z_s_0)
 
     output_rec['current_time'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.current_time)
     output_rec['time_since_out'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.time_since_out)
@@ -478,28 +541,41 @@ def do_tstep_grid(input1, input2, output_rec, tstep_rec, mh, params, int first_s
     output_rec['T_s_l'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.T_s_l)
     output_rec['T_s'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.T_s)
     output_rec['h2o_sat'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.h2o_sat)
-    output_rec['h2o_max'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.h2o_max)
-    output_rec['h2o'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.h2o)
-    output_rec['h2o_vol'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.h2o_vol)
-    output_rec['h2o_total'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.h2o_total)
+    if 'h2o_max' in out_vars:
+        output_rec['h2o_max'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.h2o_max)
+    if 'h2o' in out_vars:
+        output_rec['h2o'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.h2o)
+    if 'h2o_vol' in out_vars:
+        output_rec['h2o_vol'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.h2o_vol)
+    if 'h2o_total' in out_vars:
+        output_rec['h2o_total'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.h2o_total)
     output_rec['layer_count'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_INT32, output1_c.layer_count)
-    output_rec['cc_s_0'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.cc_s_0)
-    output_rec['cc_s_l'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.cc_s_l)
-    output_rec['cc_s'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.cc_s)
-    output_rec['m_s_0'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.m_s_0)
-    output_rec['m_s_l'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.m_s_l)
-    output_rec['m_s'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.m_s)
-    output_rec['z_s_l'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.z_s_l)
+    if 'cc_s_0' in out_vars:
+        output_rec['cc_s_0'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.cc_s_0)
+    if 'cc_s_l' in out_vars:
+        output_rec['cc_s_l'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.cc_s_l)
+    if 'cc_s' in out_vars:
+        output_rec['cc_s'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.cc_s)
+    if 'm_s_0' in out_vars:
+        output_rec['m_s_0'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.m_s_0)
+    if 'm_s_l' in out_vars:
+        output_rec['m_s_l'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.m_s_l)
+    if 'm_s' in out_vars:
+        output_rec['m_s'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.m_s)
+    if 'z_s_l' in out_vars:
+        output_rec['z_s_l'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.z_s_l)
     output_rec['z_s'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.z_s)
 
     output_rec['R_n_bar'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.R_n_bar)
     output_rec['H_bar'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.H_bar)
     output_rec['L_v_E_bar'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.L_v_E_bar)
     output_rec['G_bar'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.G_bar)
-    output_rec['G_0_bar'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.G_0_bar)
+    if 'G_0_bar' in out_vars:
+        output_rec['G_0_bar'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.G_0_bar)
     output_rec['M_bar'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.M_bar)
     output_rec['delta_Q_bar'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.delta_Q_bar)
-    output_rec['delta_Q_0_bar'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.delta_Q_0_bar)
+    if 'delta_Q_0_bar' in out_vars:
+        output_rec['delta_Q_0_bar'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.delta_Q_0_bar)
     output_rec['E_s_sum'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.E_s_sum)
     output_rec['melt_sum'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.melt_sum)
     output_rec['ro_pred_sum'][:] = np.PyArray_SimpleNewFromData(2, shp_np, np.NPY_FLOAT64, output1_c.ro_pred_sum)
@@ -507,6 +583,235 @@ def do_tstep_grid(input1, input2, output_rec, tstep_rec, mh, params, int first_s
     return rt
 
 
+# Instruction set variant and compiler of this build of the extension
+ISA = (<bytes> SNOBAL_ISA).decode()
+COMPILER = (<bytes> SNOBAL_COMPILER).decode()
+
+
+def cpu_isa():
+    """
+    Best instruction set variant ('avx512', 'avx2' or 'baseline') that the CPU
+    can run, whether or not that variant was built.
+    """
+    return (<bytes> snobal_cpu_isa()).decode()
+
+
+def numa_empty(shape, dtype=np.float64, int nthreads=1):
+    """
+    Allocate an array for a NUMA-aware run (numa=True) with nthreads, placing each
+    part of the array on the NUMA node of the thread that computes it.
+
+    The array is zeroed by the pinned threads of the run, with the same static
+    split of the pixels (see numa.c), so it must be allocated with the nthreads of
+    the run, and filled by copying into it rather than by replacing it.
+
+    Args:
+        shape: shape of the array, whose flat index is the pixel index
+        dtype: dtype of the array
+        nthreads: number of threads of the run
+
+    Returns:
+        zeroed C-contiguous array
+    """
+    array = np.empty(shape, dtype=dtype)
+    cdef int N = array.size
+    cdef int itemsize = array.itemsize
+    cdef char* data = <char*> np.PyArray_DATA(array)
+    with nogil:
+        numa_first_touch(N, nthreads, data, itemsize)
+    return array
+
+
+def _as_int32(array, bint numa, int nthreads):
+    """
+    C-contiguous int32 array, allocated with numa_empty when converted for a
+    NUMA-aware run.
+    """
+    if not numa or (isinstance(array, np.ndarray) and array.dtype == np.int32 and array.flags['C_CONTIGUOUS']):
+        return np.ascontiguousarray(array, dtype=np.int32)
+    converted = numa_empty(np.shape(array), np.int32, nthreads)
+    converted[:] = array
+    return converted
+
+
+# State terms that Snobal only writes when requested in output_vars
+OPTIONAL_OUTPUT = (
+    'h2o_max', 'h2o', 'h2o_vol', 'h2o_total', 'cc_s_0', 'cc_s_l', 'cc_s', 'm_s_0',
+    'm_s_l', 'm_s', 'z_s_0', 'z_s_l', 'G_0_bar', 'delta_Q_0_bar',
+)
+FORCING = ('S_n', 'I_lw', 'T_a', 'e_a', 'u', 'T_g', 'm_pp', 'percent_snow', 'rho_snow', 'T_pp')
+
+
+cdef class SnobalGrid:
+    """
+    Grid bound to Snobal once, for stepping with minimal overhead.
+
+    do_tstep_grid converts and checks every array of its dicts on each call. Here
+    the state and forcing arrays are checked and their pointers taken once, when
+    bound, and advance only calls Snobal, with the GIL released. The arrays are
+    updated in place, so they can be read between timesteps without copies.
+
+    The state arrays must be C-contiguous and of the grid shape, float64 except for
+    'layer_count' and 'mask' (int32).
+    """
+    cdef OUTPUT_REC_ARR output_c
+    cdef INPUT_REC_ARR input1_c
+    cdef INPUT_REC_ARR input2_c
+    cdef PARAMS params_c
+    cdef TSTEP_REC tstep_c[4]
+    cdef int N
+    cdef int nthreads
+    cdef bint numa
+    cdef double* time_since_out
+    cdef readonly tuple shape
+    cdef readonly dict state
+    cdef readonly dict input1
+    cdef readonly dict input2
+
+    def __init__(self, state, tstep_rec, mh, params, output_vars=None, int nthreads=1, bint numa=False):
+        """
+        Args:
+            state: dict of the Snobal state and static layers, as ipysnobal.initialize
+            tstep_rec: timestep info, see get_timestep_info
+            mh: measurement heights
+            params: Snobal parameters
+            output_vars: output only terms to compute, all when None
+            nthreads: number of threads used by Snobal
+            numa: NUMA-aware run, see do_tstep_grid
+        """
+        self.nthreads = nthreads
+        self.numa = numa
+
+        self.shape = tuple(state['elevation'].shape)
+        self.N = state['elevation'].size
+        self.state = dict(state)
+        out_vars = set(OPTIONAL_OUTPUT if output_vars is None else output_vars)
+
+        self.params_c.z_u = mh['z_u']
+        self.params_c.z_T = mh['z_t']
+        self.params_c.z_g = mh['z_g']
+        self.params_c.relative_heights = int(params['relative_heights'])
+        self.params_c.max_h2o_vol = params['max_h2o_vol']
+        self.params_c.max_z_s_0 = params['max_z_s_0']
+
+        for i in range(len(tstep_rec)):
+            self.tstep_c[i].level = int(tstep_rec[i]['level'])
+            if tstep_rec[i]['time_step'] is not None:
+                self.tstep_c[i].time_step = tstep_rec[i]['time_step']
+            if tstep_rec[i]['intervals'] is not None:
+                self.tstep_c[i].intervals = int(tstep_rec[i]['intervals'])
+            if tstep_rec[i]['threshold'] is not None:
+                self.tstep_c[i].threshold = tstep_rec[i]['threshold']
+            self.tstep_c[i].output = int(tstep_rec[i]['output'])
+
+        self.output_c.masked = <int*> self._pointer(self.state, 'mask', np.int32)
+        self.output_c.layer_count = <int*> self._pointer(self.state, 'layer_count', np.int32)
+        self.output_c.current_time = self._state(out_vars, 'current_time')
+        self.output_c.time_since_out = self._state(out_vars, 'time_since_out')
+        self.output_c.elevation = self._state(out_vars, 'elevation')
+        self.output_c.z_0 = self._state(out_vars, 'z_0')
+        self.output_c.rho = self._state(out_vars, 'rho')
+        self.output_c.T_s_0 = self._state(out_vars, 'T_s_0')
+        self.output_c.T_s_l = self._state(out_vars, 'T_s_l')
+        self.output_c.T_s = self._state(out_vars, 'T_s')
+        self.output_c.h2o_sat = self._state(out_vars, 'h2o_sat')
+        self.output_c.h2o_max = self._state(out_vars, 'h2o_max')
+        self.output_c.h2o = self._state(out_vars, 'h2o')
+        self.output_c.h2o_vol = self._state(out_vars, 'h2o_vol')
+        self.output_c.h2o_total = self._state(out_vars, 'h2o_total')
+        self.output_c.cc_s_0 = self._state(out_vars, 'cc_s_0')
+        self.output_c.cc_s_l = self._state(out_vars, 'cc_s_l')
+        self.output_c.cc_s = self._state(out_vars, 'cc_s')
+        self.output_c.m_s_0 = self._state(out_vars, 'm_s_0')
+        self.output_c.m_s_l = self._state(out_vars, 'm_s_l')
+        self.output_c.m_s = self._state(out_vars, 'm_s')
+        self.output_c.z_s_0 = self._state(out_vars, 'z_s_0')
+        self.output_c.z_s_l = self._state(out_vars, 'z_s_l')
+        self.output_c.z_s = self._state(out_vars, 'z_s')
+        self.output_c.R_n_bar = self._state(out_vars, 'R_n_bar')
+        self.output_c.H_bar = self._state(out_vars, 'H_bar')
+        self.output_c.L_v_E_bar = self._state(out_vars, 'L_v_E_bar')
+        self.output_c.G_bar = self._state(out_vars, 'G_bar')
+        self.output_c.G_0_bar = self._state(out_vars, 'G_0_bar')
+        self.output_c.M_bar = self._state(out_vars, 'M_bar')
+        self.output_c.delta_Q_bar = self._state(out_vars, 'delta_Q_bar')
+        self.output_c.delta_Q_0_bar = self._state(out_vars, 'delta_Q_0_bar')
+        self.output_c.E_s_sum = self._state(out_vars, 'E_s_sum')
+        self.output_c.melt_sum = self._state(out_vars, 'melt_sum')
+        self.output_c.ro_pred_sum = self._state(out_vars, 'ro_pred_sum')
+        self.time_since_out = self.output_c.time_since_out
+
+    cdef void* _pointer(self, dict arrays, str key, dtype) except NULL:
+        array = arrays.get(key)
+        if not isinstance(array, np.ndarray) or array.dtype != dtype \
+                or array.shape != self.shape or not array.flags['C_CONTIGUOUS'] \
+                or not array.flags['WRITEABLE']:
+            raise ValueError(
+                f"{key} must be a writeable C-contiguous {np.dtype(dtype).name} array of shape {self.shape}"
+            )
+        return np.PyArray_DATA(array)
+
+    cdef double* _state(self, set out_vars, str key) except? NULL:
+        if key in OPTIONAL_OUTPUT and key not in out_vars:
+            return NULL
+        return <double*> self._pointer(self.state, key, np.float64)
+
+    cdef void _bind(self, INPUT_REC_ARR* input_c, dict forcing) except *:
+        input_c.S_n = <double*> self._pointer(forcing, 'S_n', np.float64)
+        input_c.I_lw = <double*> self._pointer(forcing, 'I_lw', np.float64)
+        input_c.T_a = <double*> self._pointer(forcing, 'T_a', np.float64)
+        input_c.e_a = <double*> self._pointer(forcing, 'e_a', np.float64)
+        input_c.u = <double*> self._pointer(forcing, 'u', np.float64)
+        input_c.T_g = <double*> self._pointer(forcing, 'T_g', np.float64)
+        input_c.m_pp = <double*> self._pointer(forcing, 'm_pp', np.float64)
+        input_c.percent_snow = <double*> self._pointer(forcing, 'percent_snow', np.float64)
+        input_c.rho_snow = <double*> self._pointer(forcing, 'rho_snow', np.float64)
+        input_c.T_pp = <double*> self._pointer(forcing, 'T_pp', np.float64)
+
+    def bind_forcing(self, dict input1, dict input2):
+        """
+        Bind the forcing arrays at the start (input1) and end (input2) of the
+        timesteps. The arrays are read by Snobal in place on each advance, so new
+        forcing is written into them rather than passed.
+        """
+        cdef INPUT_REC_ARR input1_c
+        cdef INPUT_REC_ARR input2_c
+        self._bind(&input1_c, input1)
+        self._bind(&input2_c, input2)
+        self.input1_c = input1_c
+        self.input2_c = input2_c
+        self.input1 = input1
+        self.input2 = input2
+
+    def swap_forcing(self):
+        """
+        Swap the bound forcing arrays, so the forcing at the end of a timestep is
+        the forcing at the start of the next one.
+        """
+        self.input1_c, self.input2_c = self.input2_c, self.input1_c
+        self.input1, self.input2 = self.input2, self.input1
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    cpdef int advance(self, int first_step=0):
+        """
+        Advance the grid one data timestep, resetting time_since_out.
+
+        Returns:
+            -1 on success, as do_tstep_grid
+        """
+        if self.input1 is None:
+            raise ValueError("No forcing is bound, see bind_forcing")
+
+        cdef int rt
+        cdef int n
+        with nogil:
+            rt = call_snobal(self.N, self.nthreads, self.numa, first_step, self.tstep_c, &self.input1_c, &self.input2_c, self.params_c, &self.output_c)
+            for n in range(self.N):
+                self.time_since_out[n] = 0.0
+        return rt
+
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
 def do_tstep(input1, input2, output_rec, tstep_rec, mh, params, first_step=True):
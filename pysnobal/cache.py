@@ -0,0 +1,555 @@
+import errno
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+import pysnobal.defaults as defaults
+
+try:
+    from pysnobal.version import __version__
+except ImportError:
+    __version__ = "unknown"
+
+
+class ResultCache:
+    """
+    On-disk, content-addressed cache of run_snobal output.
+
+    Entries are keyed by a hash of the forcing data, the normalised model configuration,
+    the requested output variables and the library version. Each entry is stored as an
+    uncompressed .npz file. The cache is bounded in size, evicting the least recently
+    used entries first.
+
+    Args:
+        cache_dir (Path): Directory holding the cache entries. Created if missing.
+        max_size_mb (float): Maximum size of all entries, in megabytes.
+    """
+
+    SUFFIX = ".npz"
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path],
+        max_size_mb: Optional[float] = None,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        if max_size_mb is None:
+            max_size_mb = defaults.DEFAULT_CACHE_SIZE_MB
+        self.max_bytes = int(max_size_mb * 1024**2)
+
+    def key(
+        self,
+        forcing_data_df: pd.DataFrame,
+        config: dict[str, Any],
+        output_vars: list[str],
+    ) -> str:
+        """
+        Hash the inputs that determine the model output.
+
+        The 'io' section of config only holds paths and is excluded from the key.
+
+        Args:
+            forcing_data_df (pd.DataFrame): Forcing data.
+            config (dict): Model configuration parameters, after default backfill.
+            output_vars (list[str]): Snobal names of the requested output variables.
+
+        Returns:
+            str: Hex digest identifying the run.
+        """
+        # forcing from the forcing cache is already renamed and converted to Kelvin
+        if defaults.SNOBAL_FORCING_ATTR in forcing_data_df.attrs:
+            forcing_cols = list(defaults.FORCING_NAMES_CUSTOM2SNOBAL.values())
+        else:
+            forcing_cols = list(defaults.FORCING_NAMES_CUSTOM2SNOBAL.keys())
+
+        h = hashlib.sha256()
+        h.update(__version__.encode())
+        h.update(json.dumps(forcing_cols).encode())
+        h.update(
+            pd.util.hash_pandas_object(
+                forcing_data_df[forcing_cols], index=True
+            ).values.tobytes()
+        )
+        h.update(
+            json.dumps(
+                _normalise({k: v for k, v in config.items() if k != "io"}),
+                sort_keys=True,
+            ).encode()
+        )
+        h.update(json.dumps(list(output_vars)).encode())
+
+        return h.hexdigest()
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        """
+        Load cached output, marking the entry as recently used.
+
+        Args:
+            key (str): Cache key.
+
+        Returns:
+            pd.DataFrame: Cached output, None when the key is not in the cache.
+        """
+        path = self._path(key)
+        if not path.exists():
+            return None
+
+        # a concurrent process can evict the entry while it is read
+        try:
+            output_df = _load_output(path)
+            self._touch(path)
+        except (OSError, EOFError, ValueError, zipfile.BadZipFile):
+            path.unlink(missing_ok=True)
+            return None
+
+        return output_df
+
+    def put(self, key: str, output_df: pd.DataFrame) -> None:
+        """
+        Store output in the cache and evict least recently used entries over the size limit.
+
+        Args:
+            key (str): Cache key.
+            output_df (pd.DataFrame): Output returned by run_snobal.
+
+        Returns:
+            None
+        """
+        path = self._path(key)
+        _save_output(path, output_df)
+        self._touch(path)
+
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Remove least recently used entries until the cache is within its size limit.
+
+        Returns:
+            None
+        """
+        entries = sorted(
+            (p.stat().st_mtime_ns, p.stat().st_size, p)
+            for p in self.cache_dir.glob(f"*{self.SUFFIX}")
+        )
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}{self.SUFFIX}"
+
+    @staticmethod
+    def _touch(path: Path) -> None:
+        # set the modification time explicitly, as it orders entries for eviction
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+
+
+class RunCheckpoints:
+    """
+    Snapshots of the model state of a run_snobal run, to re-run only the timesteps
+    after a change to the forcing data.
+
+    The timesteps are split into blocks of block_size timesteps. For each block, the
+    run stores a hash of the forcing data the block reads and a snapshot of the model
+    state at its start, along with the output of the run. A re-run restores the
+    snapshot at the start of the first block whose forcing changed and computes only
+    the timesteps from there on, keeping the stored output before that block.
+
+    Runs are stored in a directory keyed by a hash of the forcing source, the
+    normalised model configuration, the requested output variables, the block size
+    and the library version, so a change to any of these runs all timesteps again and
+    runs of the same configuration on different forcing do not overwrite each other.
+
+    Args:
+        checkpoint_dir (Path): Directory holding the runs. Created if missing.
+        config (dict): Model configuration parameters, after default backfill.
+        output_vars (list[str]): Snobal names of the requested output variables.
+        block_size (int): Number of timesteps between snapshots.
+        source (str): Identifies the forcing data, e.g. the path it was loaded from.
+    """
+
+    META = "meta.json"
+    OUTPUT = "output.npz"
+
+    def __init__(
+        self,
+        checkpoint_dir: Union[str, Path],
+        config: dict[str, Any],
+        output_vars: list[str],
+        block_size: Optional[int] = None,
+        source: Optional[str] = None,
+    ):
+        if block_size is None:
+            block_size = defaults.DEFAULT_CHECKPOINT_BLOCK
+        if int(block_size) < 1:
+            raise ValueError("The checkpoint block size must be at least 1 timestep")
+        self.block_size = int(block_size)
+
+        h = hashlib.sha256()
+        h.update(__version__.encode())
+        h.update(json.dumps(source).encode())
+        h.update(
+            json.dumps(
+                _normalise({k: v for k, v in config.items() if k != "io"}),
+                sort_keys=True,
+            ).encode()
+        )
+        h.update(json.dumps(list(output_vars)).encode())
+        h.update(str(self.block_size).encode())
+
+        self.run_dir = Path(checkpoint_dir) / h.hexdigest()
+        self.run_dir.mkdir(parents=True, exist_ok=True)
+
+        self._block_hashes = None
+
+    def block_hashes(self, forcing_data_df: pd.DataFrame) -> list[str]:
+        """
+        Hash the forcing data read by each block of timesteps.
+
+        A block reads the forcing at the start of each of its timesteps and at the end
+        of its last timestep, so consecutive blocks share one row. The hashes include
+        the datetime index.
+
+        Args:
+            forcing_data_df (pd.DataFrame): Forcing data, renamed and converted to the
+                units used within Snobal.
+
+        Returns:
+            list[str]: Hex digest of each block.
+        """
+        rows = pd.util.hash_pandas_object(
+            forcing_data_df[list(defaults.FORCING_NAMES_CUSTOM2SNOBAL.values())],
+            index=True,
+        ).values
+        n_steps = len(forcing_data_df) - 1
+
+        hashes = []
+        for start in range(0, n_steps, self.block_size):
+            end = min(start + self.block_size, n_steps)
+            hashes.append(hashlib.sha256(rows[start : end + 1].tobytes()).hexdigest())
+        return hashes
+
+    def restore(
+        self,
+        forcing_data_df: pd.DataFrame,
+        output_rec: dict[str, np.ndarray],
+    ) -> tuple[int, Optional[pd.DataFrame]]:
+        """
+        Restore the model state at the start of the first block whose forcing
+        changed since the stored run.
+
+        The stored run is invalidated until save is called, so an interrupted re-run
+        is not mistaken for a complete one.
+
+        Args:
+            forcing_data_df (pd.DataFrame): Forcing data, renamed and converted to the
+                units used within Snobal.
+            output_rec (dict): Model state, updated in place.
+
+        Returns:
+            tuple: Index of the timestep to continue the run from, and the stored
+                output of the timesteps before it (None when the run starts from the
+                first timestep).
+        """
+        self._block_hashes = self.block_hashes(forcing_data_df)
+
+        meta_path = self.run_dir / self.META
+        if not meta_path.exists():
+            return 0, None
+        with open(meta_path) as f:
+            stored_hashes = json.load(f)["block_hashes"]
+
+        block = 0
+        for new, stored in zip(self._block_hashes, stored_hashes):
+            if new != stored:
+                break
+            block += 1
+
+        n_steps = len(forcing_data_df) - 1
+        if block == len(self._block_hashes):
+            # the forcing is unchanged, or a truncation of the stored forcing
+            return n_steps, _load_output(self.run_dir / self.OUTPUT).iloc[:n_steps]
+
+        # the re-run overwrites the snapshots after the restored block
+        meta_path.unlink()
+
+        snapshot = self._snapshot_path(block)
+        if block == 0 or not snapshot.exists():
+            return 0, None
+
+        with np.load(snapshot, allow_pickle=False) as data:
+            for k, v in output_rec.items():
+                v[:] = data[k]
+
+        start = block * self.block_size
+        output_df = _load_output(self.run_dir / self.OUTPUT).iloc[:start]
+
+        return start, output_df
+
+    def snapshot(self, step: int, output_rec: dict[str, np.ndarray]) -> None:
+        """
+        Store the model state at the start of a timestep, when it starts a block.
+
+        Args:
+            step (int): Index of the timestep.
+            output_rec (dict): Model state.
+
+        Returns:
+            None
+        """
+        if step % self.block_size != 0:
+            return
+
+        path = self._snapshot_path(step // self.block_size)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **output_rec)
+        os.replace(tmp_path, path)
+
+    def save(self, output_df: pd.DataFrame) -> None:
+        """
+        Store the output of the run along with the block hashes of its forcing data.
+
+        Args:
+            output_df (pd.DataFrame): Output returned by run_snobal.
+
+        Returns:
+            None
+        """
+        if self._block_hashes is None:
+            raise ValueError("restore must be called before saving a run")
+
+        _save_output(self.run_dir / self.OUTPUT, output_df)
+
+        # written last, marking the run as complete
+        meta_path = self.run_dir / self.META
+        tmp_path = meta_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"version": __version__, "block_hashes": self._block_hashes}, f)
+        os.replace(tmp_path, meta_path)
+
+    def _snapshot_path(self, block: int) -> Path:
+        return self.run_dir / f"state_{block}.npz"
+
+
+def _save_output(path: Path, output_df: pd.DataFrame) -> None:
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            index=output_df.index.values.astype("datetime64[ns]"),
+            columns=np.array(output_df.columns, dtype=str),
+            values=output_df.to_numpy(dtype=np.float64),
+        )
+    os.replace(tmp_path, path)
+
+
+def _load_output(path: Path) -> pd.DataFrame:
+    with np.load(path, allow_pickle=False) as data:
+        return pd.DataFrame(
+            data["values"],
+            index=pd.DatetimeIndex(data["index"], name="Datetime"),
+            columns=data["columns"].tolist(),
+        )
+
+
+def _normalise(value: Any) -> Any:
+    """
+    Convert config values to a canonical form, so e.g. 60 and 60.0 hash the same.
+    """
+    if isinstance(value, dict):
+        return {str(k): _normalise(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalise(v) for v in value]
+    if isinstance(value, (bool, np.bool_)) or value is None:
+        return value
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    return str(value)
+
+
+class ForcingCache:
+    """
+    Binary cache of checked and converted forcing data, stored next to the source CSV.
+
+    The cache is a directory '<source>.snobal' holding one .npy file per column (and one
+    for the datetime index), which are memory-mapped when loaded, and a meta.json file.
+    The cache is valid while the source file has the same modification time and size,
+    or, when those changed, the same SHA-256 hash as when the cache was stored.
+
+    Args:
+        source (Path): Path to the forcing data CSV file.
+    """
+
+    META = "meta.json"
+    INDEX = "index.npy"
+
+    def __init__(self, source: Union[str, Path]):
+        self.source = Path(source)
+        self.cache_dir = self.source.with_name(self.source.name + ".snobal")
+
+    def load(self) -> Optional[pd.DataFrame]:
+        """
+        Load the cached forcing data, if it is valid for the source file.
+
+        Returns:
+            pd.DataFrame: Forcing data, None when there is no valid cache.
+        """
+        try:
+            meta = self._valid_meta()
+            if meta is None:
+                return None
+
+            index = np.load(self.cache_dir / self.INDEX, mmap_mode="r")
+            columns = {
+                name: np.load(self.cache_dir / f"{i}.npy", mmap_mode="r")
+                for i, name in enumerate(meta["columns"])
+            }
+        except (FileNotFoundError, ValueError):
+            # the cache was replaced by another writer while loading
+            return None
+
+        forcing_data_df = pd.DataFrame(
+            columns, index=pd.DatetimeIndex(index, name=meta["index_name"])
+        )
+        forcing_data_df.attrs[defaults.SNOBAL_FORCING_ATTR] = meta["data_tstep_sec"]
+
+        return forcing_data_df
+
+    def store(self, forcing_data_df: pd.DataFrame) -> None:
+        """
+        Store checked and converted forcing data, replacing any stale cache.
+
+        The cache is written to a unique temporary directory and renamed into place,
+        so concurrent writers for the same source never see each other's partial
+        files. When another writer stored a valid cache first, it is kept and this
+        copy is dropped.
+
+        Only numeric columns are stored.
+
+        Args:
+            forcing_data_df (pd.DataFrame): Forcing data, as returned by
+                pysnobal._convert_forcing_df.
+
+        Returns:
+            None
+        """
+        data_tstep_sec = forcing_data_df.attrs.get(defaults.SNOBAL_FORCING_ATTR)
+        if data_tstep_sec is None:
+            raise ValueError("Only checked and converted forcing data can be cached")
+
+        columns = list(forcing_data_df.select_dtypes("number").columns)
+        stat = self.source.stat()
+        meta = {
+            "version": __version__,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "source_size": stat.st_size,
+            "source_sha256": _sha256(self.source),
+            "data_tstep_sec": float(data_tstep_sec),
+            "index_name": forcing_data_df.index.name,
+            "columns": columns,
+        }
+
+        tmp_dir = Path(
+            tempfile.mkdtemp(
+                prefix=self.cache_dir.name + ".tmp", dir=self.cache_dir.parent
+            )
+        )
+        try:
+            np.save(
+                tmp_dir / self.INDEX,
+                forcing_data_df.index.values.astype("datetime64[ns]"),
+            )
+            for i, name in enumerate(columns):
+                np.save(
+                    tmp_dir / f"{i}.npy",
+                    forcing_data_df[name].to_numpy(dtype=np.float64),
+                )
+            with open(tmp_dir / self.META, "w") as f:
+                json.dump(meta, f)
+
+            while True:
+                try:
+                    # atomic, and fails while another cache is in place
+                    os.rename(tmp_dir, self.cache_dir)
+                    return
+                except OSError as e:
+                    if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                        raise
+
+                if self._valid_meta() is not None:
+                    return
+
+                # move the stale cache aside, readers of it see it disappear
+                stale_dir = Path(
+                    tempfile.mkdtemp(
+                        prefix=self.cache_dir.name + ".stale",
+                        dir=self.cache_dir.parent,
+                    )
+                )
+                try:
+                    os.replace(self.cache_dir, stale_dir)
+                except FileNotFoundError:
+                    pass
+                shutil.rmtree(stale_dir, ignore_errors=True)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def _valid_meta(self) -> Optional[dict[str, Any]]:
+        """
+        Read the meta data of the cache, None when it is missing or stale.
+        """
+        try:
+            with open(self.cache_dir / self.META, "r") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if meta.get("version") != __version__:
+            return None
+
+        stat = self.source.stat()
+        if (stat.st_mtime_ns, stat.st_size) != (
+            meta["source_mtime_ns"],
+            meta["source_size"],
+        ):
+            if _sha256(self.source) != meta["source_sha256"]:
+                return None
+
+            # source touched, but unchanged
+            meta["source_mtime_ns"] = stat.st_mtime_ns
+            meta["source_size"] = stat.st_size
+            try:
+                fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.cache_dir)
+            except FileNotFoundError:
+                return None
+            with os.fdopen(fd, "w") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, self.cache_dir / self.META)
+
+        return meta
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024**2), b""):
+            h.update(chunk)
+    return h.hexdigest()
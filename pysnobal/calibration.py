@@ -0,0 +1,358 @@
+import copy
+import itertools
+import warnings
+from typing import Any, Callable, Optional
+
+import numpy as np
+import pandas as pd
+
+import pysnobal.defaults as defaults
+import pysnobal.ipysnobal as ipysnobal
+import pysnobal.utils as utils
+from pysnobal.c_snobal import snobal
+from pysnobal.pysnobal import _check_config, _check_output_vars, _parse_inputs
+
+# Parameters that Snobal takes per pixel, mapped to their output_rec term. Parameter sets
+# differing only in these are run side by side as pixels of a single grid.
+PIXEL_PARAMS = {
+    "params.elevation_m": "elevation",
+    "params.roughness_length_m": "z_0",
+}
+
+SAMPLING_METHODS = ["grid", "random", "lhs"]
+
+
+def rmse(simulated: np.ndarray, observed: np.ndarray) -> np.ndarray:
+    """
+    Root mean square error of each simulated series, ignoring missing observations.
+
+    Args:
+        simulated (np.ndarray): Simulated values, shape (n_sets, n_times).
+        observed (np.ndarray): Observed values, shape (n_times,).
+
+    Returns:
+        np.ndarray: RMSE for each parameter set.
+    """
+    valid = ~np.isnan(observed)
+    error = simulated[:, valid] - observed[valid]
+    return np.sqrt(np.mean(error**2, axis=1))
+
+
+def kge(simulated: np.ndarray, observed: np.ndarray) -> np.ndarray:
+    """
+    Kling-Gupta efficiency of each simulated series, ignoring missing observations.
+
+    Args:
+        simulated (np.ndarray): Simulated values, shape (n_sets, n_times).
+        observed (np.ndarray): Observed values, shape (n_times,).
+
+    Returns:
+        np.ndarray: KGE for each parameter set (1 is a perfect fit).
+    """
+    valid = ~np.isnan(observed)
+    sim = simulated[:, valid]
+    obs = observed[valid]
+
+    sim_mean = sim.mean(axis=1)
+    sim_std = sim.std(axis=1)
+    obs_mean = obs.mean()
+    obs_std = obs.std()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r = ((sim - sim_mean[:, None]) * (obs - obs_mean)).mean(axis=1) / (
+            sim_std * obs_std
+        )
+        alpha = sim_std / obs_std
+        beta = sim_mean / obs_mean
+
+    return 1 - np.sqrt((r - 1) ** 2 + (alpha - 1) ** 2 + (beta - 1) ** 2)
+
+
+# objective function and whether lower values are better
+OBJECTIVES: dict[str, tuple[Callable[[np.ndarray, np.ndarray], np.ndarray], bool]] = {
+    "rmse": (rmse, True),
+    "kge": (kge, False),
+}
+
+
+def sample_parameters(
+    bounds: dict[str, tuple[float, float]],
+    n: int,
+    method: str = "lhs",
+    seed: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Sample parameter sets within the given bounds.
+
+    Args:
+        bounds (dict): Lower and upper bound for each parameter, keyed by the config
+            parameter in dot notation, e.g. {'params.roughness_length_m': (0.0005, 0.01)}.
+        n (int): Number of samples. For 'grid', the number of values per parameter.
+        method (str): Sampling method, one of 'grid', 'random' or 'lhs' (Latin hypercube).
+        seed (int): Seed of the random number generator.
+
+    Returns:
+        pd.DataFrame: One parameter set per row.
+    """
+    if method not in SAMPLING_METHODS:
+        raise ValueError(
+            f"Invalid sampling method {method}. Must be one of {SAMPLING_METHODS}"
+        )
+
+    names = list(bounds.keys())
+    lower = np.array([bounds[k][0] for k in names], dtype=float)
+    upper = np.array([bounds[k][1] for k in names], dtype=float)
+    rng = np.random.default_rng(seed)
+
+    if method == "grid":
+        axes = [np.linspace(lo, up, n) for lo, up in zip(lower, upper)]
+        samples = np.array(list(itertools.product(*axes)))
+    elif method == "random":
+        samples = lower + rng.random((n, len(names))) * (upper - lower)
+    else:
+        # one sample in each of n equal strata per parameter, strata paired at random
+        strata = np.stack([rng.permutation(n) for _ in names], axis=1)
+        unit = (strata + rng.random((n, len(names)))) / n
+        samples = lower + unit * (upper - lower)
+
+    return pd.DataFrame(samples, columns=names)
+
+
+def run_parameter_sets(
+    forcing_data_df: pd.DataFrame,
+    config: dict[str, Any],
+    param_sets: pd.DataFrame,
+    output_vars: Optional[list[str]] = None,
+    nthreads: int = 1,
+) -> dict[str, pd.DataFrame]:
+    """
+    Run Snobal for many parameter sets, laid out as pixels of a grid.
+
+    Parameter sets are grouped by the parameters Snobal takes for the whole grid
+    (e.g. 'defaults.max_h2o_vol_frac'). Each group is a single grid run, in which the
+    pixel level parameters (see PIXEL_PARAMS) vary across pixels. Sampling a global
+    parameter continuously (e.g. with 'lhs' or 'random') gives one grid per parameter
+    set, which runs no faster than separate point runs, so a warning is issued when the
+    groups average fewer than two parameter sets. Sample global parameters with 'grid'
+    to keep many pixels in each grid.
+
+    Args:
+        forcing_data_df (pd.DataFrame): Forcing data.
+        config (dict): Model configuration parameters, used for all parameters not
+            given in param_sets.
+        param_sets (pd.DataFrame): One parameter set per row, with columns named by
+            the config parameter in dot notation.
+        output_vars (list[str]): Output variables to return. Defaults to 'z_s'.
+        nthreads (int): Number of threads used by Snobal.
+
+    Returns:
+        dict: Output column name mapped to a frame of simulated values, with one row
+            per timestep and one column per parameter set (matching param_sets' index).
+    """
+    output_vars = _check_output_vars(output_vars or ["z_s"])
+    config = copy.deepcopy(config)
+    _check_config(config)
+
+    for name in param_sets.columns:
+        _get_config_value(config, name)
+
+    global_params = [c for c in param_sets.columns if c not in PIXEL_PARAMS]
+    pixel_params = [c for c in param_sets.columns if c in PIXEL_PARAMS]
+
+    simulated = {
+        v: np.empty((len(forcing_data_df) - 1, len(param_sets))) for v in output_vars
+    }
+
+    if len(global_params) > 0:
+        groups = list(param_sets.groupby(global_params, sort=False).indices.values())
+    else:
+        groups = [np.arange(len(param_sets))]
+
+    if len(groups) > 1 and 2 * len(groups) > len(param_sets):
+        warnings.warn(
+            f"The global parameters {global_params} split {len(param_sets)} parameter "
+            f"sets into {len(groups)} grid runs. Only {list(PIXEL_PARAMS)} vary across "
+            "the pixels of a grid, sample other parameters on a grid of few values"
+        )
+
+    for positions in groups:
+        group = param_sets.iloc[positions]
+
+        group_config = copy.deepcopy(config)
+        for name in global_params:
+            _set_config_value(group_config, name, group[name].iloc[0].item())
+
+        pixel_values = {
+            PIXEL_PARAMS[name]: group[name].to_numpy(dtype=np.float64)
+            for name in pixel_params
+        }
+
+        datetime, group_output = _run_grid(
+            forcing_data_df.copy(),
+            group_config,
+            len(group),
+            pixel_values,
+            output_vars,
+            nthreads,
+        )
+
+        for v in output_vars:
+            simulated[v][:, positions] = group_output[v]
+
+    return {
+        defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[v]: pd.DataFrame(
+            simulated[v],
+            index=pd.Index(datetime, name="Datetime"),
+            columns=param_sets.index,
+        )
+        for v in output_vars
+    }
+
+
+def calibrate(
+    forcing_data_df: pd.DataFrame,
+    config: dict[str, Any],
+    observed: pd.Series,
+    param_sets: pd.DataFrame,
+    output_var: str = "z_s",
+    objective: str = "rmse",
+    nthreads: int = 1,
+) -> pd.DataFrame:
+    """
+    Evaluate parameter sets against an observed series.
+
+    Example, calibrating against the observed snow depth in the RCEW test data. The
+    'grid' method gives 10 values of max_h2o_vol_frac, so the 100 parameter sets run as
+    10 grids of 10 roughness lengths:
+
+        param_sets = sample_parameters(
+            {"params.roughness_length_m": (0.0005, 0.01), "defaults.max_h2o_vol_frac": (0.01, 0.05)},
+            n=10,
+            method="grid",
+        )
+        surface = calibrate(forcing_df, config, forcing_df["d_snow_ars"], param_sets)
+        best = surface.head()
+
+    Args:
+        forcing_data_df (pd.DataFrame): Forcing data.
+        config (dict): Model configuration parameters.
+        observed (pd.Series): Observed values of output_var, indexed by datetime. Missing
+            timesteps and NaN are ignored.
+        param_sets (pd.DataFrame): One parameter set per row (see sample_parameters).
+        output_var (str): Output variable compared to the observations.
+        objective (str): Objective function, one of the keys of OBJECTIVES.
+        nthreads (int): Number of threads used by Snobal.
+
+    Returns:
+        pd.DataFrame: Response surface, with the parameter sets and their objective value,
+            sorted from best to worst.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(
+            f"Invalid objective {objective}. Must be one of {list(OBJECTIVES.keys())}"
+        )
+    objective_func, ascending = OBJECTIVES[objective]
+
+    output_var = _check_output_vars([output_var])[0]
+    simulated = run_parameter_sets(
+        forcing_data_df,
+        config,
+        param_sets,
+        output_vars=[output_var],
+        nthreads=nthreads,
+    )[defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[output_var]]
+
+    obs = observed.reindex(simulated.index).to_numpy(dtype=np.float64)
+    if np.all(np.isnan(obs)):
+        raise ValueError("observed does not overlap with the simulated period")
+
+    surface = param_sets.copy()
+    surface[objective] = objective_func(simulated.to_numpy().T, obs)
+
+    return surface.sort_values(objective, ascending=ascending)
+
+
+def _run_grid(
+    forcing_data_df: pd.DataFrame,
+    config: dict[str, Any],
+    n_pixels: int,
+    pixel_values: dict[str, np.ndarray],
+    output_vars: list[str],
+    nthreads: int,
+) -> tuple[list, dict[str, np.ndarray]]:
+    """
+    Run a (1, n_pixels) grid sharing the same forcing and global parameters.
+    """
+    forcing_data_df, mh, params, timestep_info, output_rec = _parse_inputs(
+        forcing_data_df, config
+    )
+
+    shape = (1, n_pixels)
+    for key, value in output_rec.items():
+        output_rec[key] = np.full(shape, value.ravel()[0], dtype=np.float64)
+    for key, values in pixel_values.items():
+        output_rec[key][:] = values
+
+    forcing = {
+        k: forcing_data_df[k].to_numpy(dtype=np.float64)
+        for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values()
+    }
+    datetime = forcing_data_df.index.to_list()[:-1]
+
+    # the same forcing for all pixels, broadcast into the double buffer
+    output = {v: np.empty((len(datetime), n_pixels)) for v in output_vars}
+    forcing_buffer = ipysnobal.ForcingBuffer(
+        {k: np.full(shape, v[0]) for k, v in forcing.items()}
+    )
+
+    for i, dt in enumerate(datetime):
+        input1, input2 = forcing_buffer.advance(
+            {k: v[i + 1] for k, v in forcing.items()}
+        )
+
+        rt = snobal.do_tstep_grid(
+            input1,
+            input2,
+            output_rec,
+            timestep_info,
+            mh,
+            params,
+            first_step=int(i == 1),
+            nthreads=nthreads,
+            output_vars=output_vars,
+        )
+
+        if rt != -1:
+            raise ValueError(f"pointsnobal error on time step {dt}")
+
+        for v in output_vars:
+            if "temp" in defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[v]:
+                output[v][i] = output_rec[v][0] - utils.C_TO_K
+            else:
+                output[v][i] = output_rec[v][0]
+
+        output_rec["time_since_out"][:] = 0.0
+
+    return datetime, output
+
+
+def _get_config_value(config: dict[str, Any], name: str) -> Any:
+    keys = name.split(".")
+    subconfig = config
+    for k in keys[:-1]:
+        subconfig = subconfig.get(k)
+        if subconfig is None:
+            break
+    if subconfig is None or keys[-1] not in subconfig:
+        raise ValueError(
+            f"Invalid parameter '{name}'. Parameter not accepted in config."
+        )
+    return subconfig[keys[-1]]
+
+
+def _set_config_value(config: dict[str, Any], name: str, value: Any) -> None:
+    keys = name.split(".")
+    subconfig = config
+    for k in keys[:-1]:
+        subconfig = subconfig[k]
+    subconfig[keys[-1]] = value
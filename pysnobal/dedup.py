@@ -0,0 +1,161 @@
+from typing import Optional
+
+import numpy as np
+
+import pysnobal.defaults as defaults
+from pysnobal.c_snobal import snobal
+
+# Everything Snobal reads for a pixel (see the input and state loads of run_pixel,
+# the pixel loop body of call_snobal in call_snobal.c)
+KEY_INPUTS1 = list(defaults.FORCING_NAMES_CUSTOM2SNOBAL.values())
+KEY_INPUTS2 = ["S_n", "I_lw", "T_a", "e_a", "u", "T_g"]
+KEY_STATE = ["elevation", "z_0"] + defaults.STATE_VARS
+
+# Output only terms, which Snobal writes when requested in output_vars
+OPTIONAL_OUTPUT = [
+    k
+    for k in defaults.OUTPUT_NAMES_SNOBAL2CUSTOM.keys()
+    if k not in defaults.STATE_VARS
+]
+
+
+class PixelGroups:
+    """
+    Groups of the unmasked pixels of a grid whose inputs and state are identical.
+    """
+
+    def __init__(self, shape: tuple[int, int], pixels: np.ndarray, labels: np.ndarray):
+        """
+        Args:
+            shape (tuple): Shape of the grid.
+            pixels (np.ndarray): Flat indices of the unmasked pixels.
+            labels (np.ndarray): Group of each unmasked pixel, numbered in the
+                order of the first pixel of each group.
+        """
+        self.shape = tuple(shape)
+        self.pixels = np.unravel_index(pixels, shape)
+        self.labels = labels
+        self.n_pixels = len(labels)
+        self.n_groups = int(labels.max()) + 1 if len(labels) > 0 else 0
+
+        # first pixel of each group, which is computed for the whole group
+        first = np.full(self.n_groups, len(labels))
+        np.minimum.at(first, labels, np.arange(len(labels)))
+        self.representatives = tuple(p[first] for p in self.pixels)
+
+
+def group_pixels(
+    input1: dict[str, np.ndarray],
+    input2: dict[str, np.ndarray],
+    output_rec: dict[str, np.ndarray],
+) -> PixelGroups:
+    """
+    Group the unmasked pixels whose forcing and state are bitwise identical, which
+    Snobal advances to identical results.
+
+    Args:
+        input1 (dict): Forcing at the start of the timestep.
+        input2 (dict): Forcing at the end of the timestep.
+        output_rec (dict): Snobal state and static layers.
+
+    Returns:
+        PixelGroups: The groups.
+    """
+    shape = output_rec["elevation"].shape
+    pixels = np.flatnonzero(np.asarray(output_rec["mask"], dtype=np.int32) == 1)
+
+    columns = (
+        [input1[k] for k in KEY_INPUTS1]
+        + [input2[k] for k in KEY_INPUTS2]
+        + [output_rec[k] for k in KEY_STATE]
+    )
+    keys = np.empty((len(pixels), len(columns)), dtype=np.float64)
+    for n, column in enumerate(columns):
+        keys[:, n] = np.broadcast_to(column, shape).ravel()[pixels]
+
+    # compare the bytes of each row, so only bitwise identical pixels are merged
+    rows = np.ascontiguousarray(keys).view(np.dtype((np.void, keys.shape[1] * 8)))
+    _, first, labels = np.unique(rows.ravel(), return_index=True, return_inverse=True)
+
+    # number the groups in order of their first pixel
+    order = np.empty(len(first), dtype=np.intp)
+    order[np.argsort(first)] = np.arange(len(first))
+
+    return PixelGroups(shape, pixels, order[labels.ravel()])
+
+
+def do_tstep_grid_dedup(
+    input1: dict[str, np.ndarray],
+    input2: dict[str, np.ndarray],
+    output_rec: dict[str, np.ndarray],
+    timestep_info: list[dict],
+    mh: dict,
+    params: dict,
+    first_step: int = 1,
+    nthreads: int = 1,
+    output_vars: Optional[list[str]] = None,
+    groups: Optional[PixelGroups] = None,
+) -> tuple[int, PixelGroups]:
+    """
+    Advance a grid like do_tstep_grid, computing each group of identical pixels
+    once and copying the result to the other pixels of the group. The output is
+    identical to that of do_tstep_grid.
+
+    The pixels are grouped every call, unless groups are given. Groups from a
+    previous timestep (static grouping) stay valid only while the forcing of the
+    pixels of each group is identical, e.g. in ensembles of identical members or
+    with coarse forcing over a fine grid of repeated elevation and roughness.
+
+    Args:
+        input1 (dict): Forcing at the start of the timestep.
+        input2 (dict): Forcing at the end of the timestep.
+        output_rec (dict): Snobal state and static layers, updated in place.
+        timestep_info (list[dict]): Timestep info, see _parse_config.
+        mh (dict): Measurement heights.
+        params (dict): Snobal parameters.
+        first_step (int): See do_tstep_grid.
+        nthreads (int): Number of threads used by Snobal.
+        output_vars (list[str]): Snobal names of the output only terms to compute,
+            see do_tstep_grid.
+        groups (PixelGroups): Groups to use, see group_pixels.
+
+    Returns:
+        int: Return value of do_tstep_grid.
+        PixelGroups: The groups of the timestep.
+    """
+    if groups is None:
+        groups = group_pixels(input1, input2, output_rec)
+    if groups.n_groups == 0:
+        return -1, groups
+
+    shape = output_rec["elevation"].shape
+
+    def _compact(values: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+        return {
+            k: np.ascontiguousarray(
+                np.broadcast_to(v, shape)[groups.representatives][None, :],
+                dtype=np.float64,
+            )
+            for k, v in values.items()
+        }
+
+    compact_rec = _compact(output_rec)
+    rt = snobal.do_tstep_grid(
+        _compact(input1),
+        _compact(input2),
+        compact_rec,
+        timestep_info,
+        mh,
+        params,
+        first_step=first_step,
+        nthreads=nthreads,
+        output_vars=output_vars,
+    )
+
+    written = defaults.STATE_VARS + [
+        k for k in OPTIONAL_OUTPUT if output_vars is None or k in output_vars
+    ]
+    for k in written:
+        output_rec[k][groups.pixels] = compact_rec[k][0, groups.labels]
+
+    return rt, groups
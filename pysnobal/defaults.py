@@ -28,6 +28,27 @@ DEFAULT_PARAMS = {
     "small_tstep_min": 1.0,
 }
 
+# ***** Forcing and Result Caches *****
+
+# DataFrame.attrs entry marking forcing data that has been checked, renamed to the
+# names Snobal expects and converted to Kelvin. Holds the data timestep in seconds.
+SNOBAL_FORCING_ATTR = "snobal_data_tstep_sec"
+
+DEFAULT_CACHE_SIZE_MB = 1024.0  # maximum on-disk size of the run_snobal result cache
+
+# Timesteps between state snapshots of incremental re-runs
+DEFAULT_CHECKPOINT_BLOCK = 720
+
+# Optional io settings, which can be overridden in configs that do not list them
+DEFAULT_IO = {
+    "forcing_cache": False,
+    "output_vars": None,
+    "cache_dir": None,
+    "cache_size_mb": DEFAULT_CACHE_SIZE_MB,
+    "checkpoint_dir": None,
+    "checkpoint_block": DEFAULT_CHECKPOINT_BLOCK,
+}
+
 # ***** Output Variables *****
 
 EM_OUT = [
@@ -61,6 +82,31 @@ SNOW_OUT = [
     "ro_pred_sum",
 ]
 
+# ***** Model State Variables *****
+
+# Terms Snobal reads back from output_rec at the start of every timestep. These
+# are always carried between timesteps, regardless of the requested output.
+STATE_VARS = [
+    "current_time",
+    "time_since_out",
+    "layer_count",
+    "z_s",
+    "rho",
+    "T_s",
+    "T_s_0",
+    "T_s_l",
+    "h2o_sat",
+    "R_n_bar",
+    "H_bar",
+    "L_v_E_bar",
+    "G_bar",
+    "M_bar",
+    "delta_Q_bar",
+    "E_s_sum",
+    "melt_sum",
+    "ro_pred_sum",
+]
+
 # ***** Mappings from Custom Variable Names to Names Snobal Expects *****
 
 FORCING_NAMES_CUSTOM2SNOBAL = {
@@ -0,0 +1,229 @@
+import copy
+from typing import Any, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+import pysnobal.defaults as defaults
+import pysnobal.utils as utils
+from pysnobal.pipeline import run_pipeline
+from pysnobal.pysnobal import _check_output_vars, _parse_inputs
+
+# Physical (lower, upper) bounds of forcing variables, clipped after perturbation
+FORCING_BOUNDS = {
+    "S_n": (0.0, None),
+    "u": (0.0, None),
+    "m_pp": (0.0, None),
+    "percent_snow": (0.0, 1.0),
+    "rho_snow": (0.0, None),
+}
+
+
+class Perturbation:
+    """
+    Perturbation of one forcing variable in each ensemble member, applied to the
+    base forcing on the fly as value * factor + offset.
+    """
+
+    def __init__(
+        self,
+        variable: str,
+        factor: Union[np.ndarray, float] = 1.0,
+        offset: Union[np.ndarray, float] = 0.0,
+    ):
+        """
+        Args:
+            variable (str): Forcing variable, by its Snobal name (e.g. 'm_pp') or
+                forcing column name (e.g. 'precip_mass_mm').
+            factor (np.ndarray): Multiplicative perturbation, one per member or the
+                same for all members.
+            offset (np.ndarray): Additive perturbation in the units of the forcing
+                (degC and K differences are equal), one per member or the same for
+                all members.
+        """
+        snobal_names = list(defaults.FORCING_NAMES_CUSTOM2SNOBAL.values())
+        if variable in defaults.FORCING_NAMES_CUSTOM2SNOBAL:
+            variable = defaults.FORCING_NAMES_CUSTOM2SNOBAL[variable]
+        elif variable not in snobal_names:
+            raise ValueError(
+                f"Invalid forcing variable {variable}. Must be one of: {snobal_names}"
+            )
+
+        self.variable = variable
+        self.factor = np.asarray(factor, dtype=np.float64)
+        self.offset = np.asarray(offset, dtype=np.float64)
+
+    def apply(self, values: np.ndarray) -> None:
+        """
+        Perturb the forcing of the members in place.
+
+        Args:
+            values (np.ndarray): Forcing of each member.
+        """
+        values *= self.factor
+        values += self.offset
+
+
+class EnsembleStatistics:
+    """
+    Statistics over the ensemble members of the output variables, computed as each
+    timestep completes, so the output of the individual members is never stored.
+    """
+
+    def __init__(
+        self,
+        times: Union[pd.DatetimeIndex, np.ndarray],
+        output_vars: Optional[list[str]] = None,
+        quantiles: Sequence[float] = (0.05, 0.5, 0.95),
+    ):
+        """
+        Args:
+            times (pd.DatetimeIndex): Time of each recorded timestep.
+            output_vars (list[str]): Output variables, see run_snobal. Defaults to
+                all variables.
+            quantiles (list[float]): Quantiles to compute besides the mean.
+        """
+        self.output_vars = _check_output_vars(output_vars)
+        self.times = pd.DatetimeIndex(times)
+        self.quantiles = list(quantiles)
+        self.statistics = ["mean"] + [f"q{q:g}" for q in self.quantiles]
+
+        self._values = {
+            v: np.full((len(self.times), len(self.statistics)), np.nan)
+            for v in self.output_vars
+        }
+
+    def record(self, step: int, output_rec: dict[str, np.ndarray]) -> None:
+        """
+        Compute the statistics over the members at the end of one timestep.
+
+        Args:
+            step (int): Index of the timestep in times.
+            output_rec (dict): Output variables of the members.
+        """
+        for v in self.output_vars:
+            members = output_rec[v].ravel()
+            self._values[v][step, 0] = members.mean()
+            if len(self.quantiles) > 0:
+                self._values[v][step, 1:] = np.quantile(members, self.quantiles)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: Time series with a column per output variable and
+                statistic, named and in the units of the point model output.
+        """
+        columns = {}
+        for v in self.output_vars:
+            name = defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[v]
+            values = self._values[v]
+            if "temp" in name:
+                values = values - utils.C_TO_K
+            for n, statistic in enumerate(self.statistics):
+                columns[(name, statistic)] = values[:, n]
+
+        output_df = pd.DataFrame(columns, index=self.times.rename("Datetime"))
+        output_df.columns.names = ["variable", "statistic"]
+        return output_df
+
+
+def clip_forcing(forcing: dict[str, np.ndarray], variables: list[str]) -> None:
+    """
+    Clip forcing variables to their physical range, in place.
+
+    Args:
+        forcing (dict): Forcing arrays, by Snobal name.
+        variables (list[str]): Variables to clip. Variables without bounds in
+            FORCING_BOUNDS are left unchanged.
+    """
+    for k in variables:
+        if k in FORCING_BOUNDS:
+            lower, upper = FORCING_BOUNDS[k]
+            np.clip(forcing[k], lower, upper, out=forcing[k])
+
+
+def run_ensemble(
+    forcing_data_df: pd.DataFrame,
+    config: dict[str, Any],
+    perturbations: list[Perturbation],
+    n_members: int,
+    output_vars: Optional[list[str]] = None,
+    quantiles: Sequence[float] = (0.05, 0.5, 0.95),
+    nthreads: int = 1,
+) -> pd.DataFrame:
+    """
+    Run an ensemble of forcing perturbations of a point and return statistics over
+    the members, e.g. for uncertainty estimates.
+
+    The base forcing is held once. The members are the pixels of a 1 x n_members
+    grid, run together by Snobal, and the perturbations are applied to the base
+    forcing as each timestep is read. The statistics are computed as each timestep
+    completes. Perturbed forcing is clipped to its physical range (see
+    FORCING_BOUNDS): net solar radiation, wind speed, precipitation mass and snow
+    density at zero, and the snow fraction of precipitation to [0, 1].
+
+    Args:
+        forcing_data_df (pd.DataFrame): Base forcing data, as for run_snobal.
+        config (dict): Model configuration parameters.
+        perturbations (list[Perturbation]): Perturbations of the members, applied
+            in order.
+        n_members (int): Number of ensemble members.
+        output_vars (list[str]): Output variables, see run_snobal. Defaults to
+            'io.output_vars' in config, or all variables.
+        quantiles (list[float]): Quantiles over the members to return besides the
+            mean.
+        nthreads (int): Number of threads used by Snobal.
+
+    Returns:
+        pd.DataFrame: Statistics over the members, with (variable, statistic)
+            columns, see EnsembleStatistics.
+    """
+    config = copy.deepcopy(config)
+    if n_members < 1:
+        raise ValueError("n_members must be at least 1")
+    for p in perturbations:
+        for name, values in [("factor", p.factor), ("offset", p.offset)]:
+            if values.ndim > 1 or values.size not in [1, n_members]:
+                raise ValueError(
+                    f"{name} of the {p.variable} perturbation must be a scalar or "
+                    f"have one value per member"
+                )
+
+    forcing_data_df, mh, params, timestep_info, output_rec = _parse_inputs(
+        forcing_data_df.copy(), config
+    )
+    if output_vars is None:
+        output_vars = config["io"].get("output_vars")
+    output_vars = _check_output_vars(output_vars)
+
+    shape = (1, n_members)
+    for key, value in output_rec.items():
+        output_rec[key] = np.full(shape, value.ravel()[0], dtype=np.float64)
+
+    base = {
+        k: forcing_data_df[k].to_numpy(dtype=np.float64)
+        for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values()
+    }
+    perturbed = list(dict.fromkeys(p.variable for p in perturbations))
+
+    def read_forcing(step: int, buffer: dict[str, np.ndarray]) -> None:
+        for k, v in base.items():
+            buffer[k][:] = v[step]
+        for p in perturbations:
+            p.apply(buffer[p.variable][0])
+        clip_forcing(buffer, perturbed)
+
+    statistics = EnsembleStatistics(forcing_data_df.index[:-1], output_vars, quantiles)
+    run_pipeline(
+        read_forcing,
+        statistics.record,
+        len(forcing_data_df) - 1,
+        output_rec,
+        timestep_info,
+        mh,
+        params,
+        output_vars=output_vars,
+        nthreads=nthreads,
+    )
+
+    return statistics.to_dataframe()
@@ -0,0 +1,262 @@
+import copy
+from pathlib import Path
+from typing import Any, Optional, Union
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+import pysnobal.defaults as defaults
+import pysnobal.ipysnobal as ipysnobal
+import pysnobal.utils as utils
+from pysnobal.c_snobal import snobal
+from pysnobal.live_state import FILE_SUFFIX, LiveState
+from pysnobal.pysnobal import _check_config, _check_output_vars, _parse_config
+
+STATIC_LAYERS = ["elevation", "z_0", "mask"]
+
+
+def run_gridded(
+    forcing: xr.Dataset,
+    elevation: xr.DataArray,
+    roughness_length: Union[xr.DataArray, float],
+    config: dict[str, Any],
+    mask: Optional[xr.DataArray] = None,
+    output_vars: Optional[list[str]] = None,
+    chunks: Optional[dict[str, int]] = None,
+    nthreads: int = 1,
+    live_state_dir: Optional[Union[str, Path]] = None,
+) -> xr.Dataset:
+    """
+    Run iSnobal over a grid of xarray forcing, lazily and in parallel over spatial chunks.
+
+    The forcing variables are named as the keys of FORCING_NAMES_CUSTOM2SNOBAL (with
+    temperatures in degC) and have a 'time' dimension and the two spatial dimensions
+    of elevation. Each spatial dask chunk is an independent Snobal grid run over all
+    timesteps, so only the forcing of one chunk is loaded at a time. The runs are
+    scheduled by dask, e.g. on threads (Snobal releases the GIL) or a distributed cluster.
+
+    Args:
+        forcing (xr.Dataset): Forcing data.
+        elevation (xr.DataArray): Elevation (m), with the spatial dimensions.
+        roughness_length (xr.DataArray): Roughness length (m), a layer or a scalar.
+        config (dict): Model configuration parameters for the 'z', 'init' and
+            'defaults' sections, as in the point model config. 'io' and 'params'
+            are not used.
+        mask (xr.DataArray): Pixels to run (1) or skip (0). Defaults to all pixels.
+        output_vars (list[str]): Output variables to return, see run_snobal.
+        chunks (dict): Spatial chunk sizes, e.g. {'y': 250, 'x': 250}. Defaults to the
+            chunks of the forcing, or a single chunk when it is not a dask array.
+        nthreads (int): Number of threads used by Snobal within each chunk.
+        live_state_dir (Path): Directory for a live state file per chunk, holding
+            the model state as it runs, for monitoring (see live_state.read_live_grid).
+
+    Returns:
+        xr.Dataset: Lazily evaluated output, named as the point model output columns,
+            at the start of each forcing timestep. Masked pixels are NaN.
+    """
+    output_vars = _check_output_vars(output_vars)
+
+    missing = [
+        k for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.keys() if k not in forcing
+    ]
+    if len(missing) > 0:
+        raise ValueError(f"forcing is missing the variables {missing}")
+
+    if len(elevation.dims) != 2:
+        raise ValueError("elevation must have two spatial dimensions")
+    spatial_dims = list(elevation.dims)
+
+    # check the model config, backfilling the sections the point model requires
+    config = copy.deepcopy(config)
+    config["io"] = {"output_path": ""}
+    config["params"] = {"elevation_m": 0.0, "roughness_length_m": 0.0}
+    _check_config(config)
+
+    data_tstep_sec = _check_time(forcing)
+    mh, params, timestep_info = _parse_config(config, data_tstep_sec)
+
+    init = {
+        defaults.INIT_NAMES_CUSTOM2SNOBAL[k]: float(v)
+        for k, v in config["init"].items()
+    }
+    init["T_s_0"] += utils.C_TO_K
+    init["T_s"] += utils.C_TO_K
+
+    # merge forcing and static layers, so the layers are chunked with the forcing
+    if mask is None:
+        mask = xr.ones_like(elevation)
+    if not isinstance(roughness_length, xr.DataArray):
+        roughness_length = xr.full_like(elevation, roughness_length, dtype=np.float64)
+
+    ds = forcing[list(defaults.FORCING_NAMES_CUSTOM2SNOBAL.keys())].assign(
+        elevation=elevation, z_0=roughness_length, mask=mask
+    )
+    ds = ds.transpose("time", *spatial_dims)
+    if chunks is not None or ds.chunks is None or len(ds.chunks) == 0:
+        ds = ds.chunk(chunks or {d: -1 for d in spatial_dims})
+    ds = ds.chunk({"time": -1})
+
+    # grid index of each pixel, locating the chunks in the live state files
+    if live_state_dir is not None:
+        Path(live_state_dir).mkdir(parents=True, exist_ok=True)
+        for d in spatial_dims:
+            ds[f"{d}_index"] = xr.DataArray(np.arange(ds.sizes[d]), dims=[d]).chunk(
+                {d: ds.chunks[d]}
+            )
+
+    # output template: one timestep less than the forcing, chunked as the input
+    time = ds["time"].isel(time=slice(None, -1))
+    template = xr.Dataset(
+        {
+            defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[v]: (
+                ["time", *spatial_dims],
+                _empty_like(ds["elevation"].data, len(time)),
+            )
+            for v in output_vars
+        },
+        coords={"time": time} | {d: ds[d] for d in spatial_dims if d in ds.coords},
+    )
+
+    return xr.map_blocks(
+        _run_block,
+        ds,
+        kwargs={
+            "mh": mh,
+            "params": params,
+            "timestep_info": timestep_info,
+            "init": init,
+            "output_vars": output_vars,
+            "spatial_dims": spatial_dims,
+            "nthreads": nthreads,
+            "live_state_dir": live_state_dir,
+        },
+        template=template,
+    )
+
+
+def _check_time(forcing: xr.Dataset) -> float:
+    """
+    Verify the forcing has a uniform timestep and return it in seconds.
+    """
+    if "time" not in forcing.dims:
+        raise ValueError("forcing must have a 'time' dimension")
+
+    timesteps = np.unique(np.diff(forcing["time"].values) / np.timedelta64(1, "s"))
+    if len(timesteps) != 1:
+        raise ValueError(
+            f"forcing has a non-uniform timestep. Found the following timesteps: {timesteps}"
+        )
+
+    return float(timesteps[0])
+
+
+def _empty_like(layer, n_times: int):
+    # lazy placeholder for the template, as dask array when the layer is one
+    if hasattr(layer, "chunks"):
+        import dask.array as da
+
+        return da.empty(
+            (n_times, *layer.shape),
+            chunks=((n_times,), *layer.chunks),
+            dtype=np.float64,
+        )
+    return np.empty((n_times, *layer.shape))
+
+
+def _run_block(
+    block: xr.Dataset,
+    mh: dict,
+    params: dict,
+    timestep_info: list[dict],
+    init: dict[str, float],
+    output_vars: list[str],
+    spatial_dims: list[str],
+    nthreads: int,
+    live_state_dir: Optional[Union[str, Path]],
+) -> xr.Dataset:
+    """
+    Run Snobal over all timesteps of one spatial chunk.
+    """
+    shape = block["elevation"].shape
+
+    output_rec = {
+        key: np.zeros(shape) for key in defaults.OUTPUT_NAMES_SNOBAL2CUSTOM.keys()
+    }
+    for key in STATIC_LAYERS:
+        output_rec[key] = np.ascontiguousarray(block[key].values, dtype=np.float64)
+    for key, value in init.items():
+        output_rec[key][:] = value
+
+    # forcing renamed to Snobal names and converted to Kelvin
+    forcing = {}
+    for k, v in defaults.FORCING_NAMES_CUSTOM2SNOBAL.items():
+        forcing[v] = block[k].values.astype(np.float64)
+        if v in ["T_a", "T_g", "T_pp"]:
+            forcing[v] += utils.C_TO_K
+
+    times = block["time"].values
+    live_state = None
+    if live_state_dir is not None:
+        origin = tuple(int(block[f"{d}_index"].values[0]) for d in spatial_dims)
+        live_state = LiveState(
+            Path(live_state_dir) / f"{origin[0]}_{origin[1]}{FILE_SUFFIX}",
+            shape,
+            origin=origin,
+        )
+        live_state.attach(output_rec)
+        live_state.commit(0, times[0])
+
+    n_times = block.sizes["time"] - 1
+    output = {v: np.empty((n_times, *shape)) for v in output_vars}
+    forcing_buffer = ipysnobal.ForcingBuffer({k: v[0] for k, v in forcing.items()})
+
+    for i in range(n_times):
+        input1, input2 = forcing_buffer.advance(
+            {k: v[i + 1] for k, v in forcing.items()}
+        )
+
+        if live_state is not None:
+            live_state.begin()
+
+        rt = snobal.do_tstep_grid(
+            input1,
+            input2,
+            output_rec,
+            timestep_info,
+            mh,
+            params,
+            first_step=int(i == 1),
+            nthreads=nthreads,
+            output_vars=output_vars,
+        )
+
+        if rt != -1:
+            raise ValueError(f"isnobal error on time step {pd.Timestamp(times[i])}")
+
+        for v in output_vars:
+            if "temp" in defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[v]:
+                output[v][i] = output_rec[v] - utils.C_TO_K
+            else:
+                output[v][i] = output_rec[v]
+
+        output_rec["time_since_out"][:] = 0.0
+
+        if live_state is not None:
+            live_state.commit(i + 1, times[i + 1])
+
+    if live_state is not None:
+        live_state.close()
+
+    masked = output_rec["mask"] == 0
+    for v in output_vars:
+        output[v][:, masked] = np.nan
+
+    return xr.Dataset(
+        {
+            defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[v]: (["time", *spatial_dims], output[v])
+            for v in output_vars
+        },
+        coords={"time": times[:-1]}
+        | {d: block[d] for d in spatial_dims if d in block.coords},
+    )
@@ -105,11 +105,13 @@ def get_timestep_info(options, config):
     return params, timestep_info
 
 
-def initialize(init):
+def initialize(init, numa_threads=None):
     # create the OUTPUT_REC with additional fields and fill
     # There are a lot of additional terms that the original output_rec does not
     # have due to the output function being outside the C code which doesn't
     # have access to those variables
+    # With numa_threads, the arrays are allocated for a NUMA-aware run with that
+    # many threads (see snobal.numa_empty) and init is copied into them
     sz = init["elevation"].shape
 
     fields = [
@@ -150,11 +152,73 @@ def initialize(init):
         "z_s_l",
     ]
     # Initialize according to the topo shape
-    s = {key: np.zeros(sz) for key in fields}
+    if numa_threads is None:
+        s = {key: np.zeros(sz) for key in fields}
+    else:
+        from pysnobal.c_snobal import snobal
+
+        s = {key: snobal.numa_empty(sz, nthreads=numa_threads) for key in fields}
 
     # Update values from config
     for key, val in init.items():
         if key in fields:
-            s[key] = val
+            if numa_threads is None:
+                s[key] = val
+            else:
+                s[key][:] = val
 
     return s
+
+
+class ForcingBuffer:
+    """
+    Double buffer of the forcing for consecutive timesteps.
+
+    The forcing at the end of one timestep (input2) is the forcing at the start of
+    the next one (input1). Two preallocated slots of contiguous float64 arrays, as
+    passed to Snobal by do_tstep_grid, are swapped between timesteps, so every
+    forcing slice is converted and copied exactly once, into the free slot.
+
+    The arrays returned by advance are overwritten by the call after next.
+    """
+
+    def __init__(self, forcing):
+        """
+        Args:
+            forcing: dict of the forcing variables (2D arrays or scalars) at the
+                start of the first timestep
+        """
+        self._slots = [
+            {
+                k: np.empty(np.atleast_2d(v).shape, dtype=np.float64)
+                for k, v in forcing.items()
+            }
+            for _ in range(2)
+        ]
+        self._current = 0
+        self._load(forcing)
+
+    @property
+    def input2(self):
+        return self._slots[self._current]
+
+    def advance(self, forcing):
+        """
+        Load the forcing at the end of the next timestep.
+
+        Args:
+            forcing: dict of the forcing variables at the end of the timestep
+
+        Returns:
+            input1 and input2 for do_tstep_grid
+        """
+        input1 = self._slots[self._current]
+        self._current = 1 - self._current
+        self._load(forcing)
+
+        return input1, self.input2
+
+    def _load(self, forcing):
+        slot = self._slots[self._current]
+        for k, v in forcing.items():
+            np.copyto(slot[k], v, casting="same_kind")
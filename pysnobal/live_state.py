@@ -0,0 +1,293 @@
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+import pysnobal.defaults as defaults
+
+MAGIC = b"SNOBLIVE"
+VERSION = 1
+FILE_SUFFIX = ".snobal_live"
+
+# Fixed header at the start of the file, followed by the field table. The sequence
+# counter is odd while the state is being written and even when it is consistent.
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("n_fields", "<u4"),
+        ("sequence", "<u8"),
+        ("step", "<i8"),
+        ("time", "<i8"),
+        ("shape", "<i8", (2,)),
+        ("origin", "<i8", (2,)),
+        ("data_offset", "<u8"),
+    ]
+)
+FIELD_DTYPE = np.dtype([("name", "S16"), ("offset", "<u8")])
+
+DATA_ALIGNMENT = 4096
+FIELD_ALIGNMENT = 64
+
+
+class LiveState:
+    """
+    Model state of a running grid simulation, backed by a memory-mapped file.
+
+    The state arrays of output_rec are replaced with views of the file, so Snobal
+    updates the file in place and the simulation pays no copy per timestep. Each
+    timestep is bracketed by begin and commit, which bump a sequence counter in the
+    header, so readers in other processes can take consistent snapshots (see
+    LiveStateReader) without any synchronisation on the compute side.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        shape: tuple[int, int],
+        fields: Optional[list[str]] = None,
+        origin: tuple[int, int] = (0, 0),
+    ):
+        """
+        Create the live state file, overwriting an existing one.
+
+        Args:
+            path (Path): Path of the live state file.
+            shape (tuple): Shape of the grid.
+            fields (list[str]): Terms of output_rec to place in the file. Defaults to
+                all Snobal output terms.
+            origin (tuple): Index of the first pixel of the grid within a larger
+                domain, e.g. of a spatial chunk.
+        """
+        self.path = Path(path)
+        self.fields = list(fields or defaults.OUTPUT_NAMES_SNOBAL2CUSTOM.keys())
+        for name in self.fields:
+            if len(name.encode()) > FIELD_DTYPE["name"].itemsize:
+                raise ValueError(f"live state field name {name} is too long")
+
+        ny, nx = shape
+        field_size = _align(ny * nx * 8, FIELD_ALIGNMENT)
+        table_end = HEADER_DTYPE.itemsize + len(self.fields) * FIELD_DTYPE.itemsize
+        data_offset = _align(table_end, DATA_ALIGNMENT)
+
+        with open(self.path, "wb") as f:
+            f.truncate(data_offset + len(self.fields) * field_size)
+
+        self._header = np.memmap(self.path, dtype=HEADER_DTYPE, mode="r+", shape=())
+        table = np.memmap(
+            self.path,
+            dtype=FIELD_DTYPE,
+            mode="r+",
+            offset=HEADER_DTYPE.itemsize,
+            shape=(len(self.fields),),
+        )
+
+        # odd sequence until the initial state is committed
+        self._header["sequence"] = 1
+        self._header["magic"] = MAGIC
+        self._header["version"] = VERSION
+        self._header["n_fields"] = len(self.fields)
+        self._header["step"] = -1
+        self._header["shape"] = shape
+        self._header["origin"] = origin
+        self._header["data_offset"] = data_offset
+
+        self.arrays = {}
+        for n, name in enumerate(self.fields):
+            offset = data_offset + n * field_size
+            table[n] = (name.encode(), offset)
+            self.arrays[name] = np.memmap(
+                self.path, dtype=np.float64, mode="r+", offset=offset, shape=shape
+            )
+        table.flush()
+
+    def attach(self, output_rec: dict[str, np.ndarray]) -> None:
+        """
+        Copy the state of output_rec into the file and back output_rec with it.
+
+        Args:
+            output_rec (dict): Snobal state, updated in place.
+        """
+        for name in self.fields:
+            self.arrays[name][:] = output_rec[name]
+            output_rec[name] = self.arrays[name]
+
+    def begin(self) -> None:
+        """
+        Mark the state as being written, before advancing a timestep.
+        """
+        self._header["sequence"] += np.uint64(1)
+
+    def commit(self, step: int, time: np.datetime64) -> None:
+        """
+        Mark the state as consistent after a timestep.
+
+        Args:
+            step (int): Number of timesteps completed.
+            time (np.datetime64): Model time of the state.
+        """
+        self._header["step"] = step
+        self._header["time"] = np.datetime64(time, "ns").astype(np.int64)
+        self._header["sequence"] += np.uint64(1)
+
+    def close(self) -> None:
+        """
+        Flush the state to disk. The file is kept for later inspection.
+        """
+        for array in self.arrays.values():
+            array.flush()
+        self._header.flush()
+
+
+class LiveStateSnapshot:
+    """
+    Consistent copy of a live state file at one timestep.
+    """
+
+    def __init__(
+        self,
+        step: int,
+        time: np.datetime64,
+        origin: tuple[int, int],
+        arrays: dict[str, np.ndarray],
+    ):
+        self.step = step
+        self.time = time
+        self.origin = origin
+        self.arrays = arrays
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+
+class LiveStateReader:
+    """
+    Read-only view of a live state file written by a running simulation.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Args:
+            path (Path): Path of the live state file.
+        """
+        self.path = Path(path)
+        self._header = np.memmap(self.path, dtype=HEADER_DTYPE, mode="r", shape=())
+        if bytes(self._header["magic"]) != MAGIC:
+            raise ValueError(f"{self.path} is not a live state file")
+        if int(self._header["version"]) != VERSION:
+            raise ValueError(
+                f"{self.path} has live state version {int(self._header['version'])}"
+            )
+
+        table = np.memmap(
+            self.path,
+            dtype=FIELD_DTYPE,
+            mode="r",
+            offset=HEADER_DTYPE.itemsize,
+            shape=(int(self._header["n_fields"]),),
+        )
+        self.shape = tuple(int(v) for v in self._header["shape"])
+        self.origin = tuple(int(v) for v in self._header["origin"])
+        self.arrays = {
+            name.decode(): np.memmap(
+                self.path,
+                dtype=np.float64,
+                mode="r",
+                offset=int(offset),
+                shape=self.shape,
+            )
+            for name, offset in table
+        }
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self.arrays.keys())
+
+    @property
+    def step(self) -> int:
+        """
+        Number of timesteps completed, possibly while the next one is being written.
+        """
+        return int(self._header["step"])
+
+    def snapshot(
+        self, fields: Optional[list[str]] = None, timeout: float = 60.0
+    ) -> LiveStateSnapshot:
+        """
+        Copy the state once no timestep is being written, retrying when the writer
+        advanced while copying. Waits at most about one timestep of the simulation.
+
+        Args:
+            fields (list[str]): Fields to copy. Defaults to all fields.
+            timeout (float): Seconds to wait for a consistent state.
+
+        Returns:
+            LiveStateSnapshot: Copy of the state.
+        """
+        fields = fields or self.fields
+        deadline = time.monotonic() + timeout
+        wait = 1e-4
+
+        while True:
+            sequence = int(self._header["sequence"])
+            if sequence % 2 == 0:
+                step = int(self._header["step"])
+                model_time = np.datetime64(int(self._header["time"]), "ns")
+                arrays = {name: np.array(self.arrays[name]) for name in fields}
+                if int(self._header["sequence"]) == sequence:
+                    return LiveStateSnapshot(step, model_time, self.origin, arrays)
+
+            if time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"no consistent state in {self.path} within {timeout} s"
+                )
+            time.sleep(wait)
+            wait = min(wait * 2, 0.1)
+
+
+def read_live_grid(
+    directory: Union[str, Path],
+    fields: Optional[list[str]] = None,
+    timeout: float = 60.0,
+) -> dict[str, np.ndarray]:
+    """
+    Assemble the state of a chunked grid simulation from the live state files of
+    its chunks. The chunks advance independently, so they may be at different
+    timesteps; the step of each pixel is returned as 'step'.
+
+    Args:
+        directory (Path): Directory of the live state files.
+        fields (list[str]): Fields to read. Defaults to all fields.
+        timeout (float): Seconds to wait for a consistent state of each chunk.
+
+    Returns:
+        dict: Grids of each field and 'step', NaN where no chunk has written yet.
+    """
+    snapshots = [
+        LiveStateReader(path).snapshot(fields, timeout)
+        for path in sorted(Path(directory).glob(f"*{FILE_SUFFIX}"))
+    ]
+    if len(snapshots) == 0:
+        raise ValueError(f"no live state files in {directory}")
+
+    shapes = [next(iter(s.arrays.values())).shape for s in snapshots]
+    ny = max(s.origin[0] + shape[0] for s, shape in zip(snapshots, shapes))
+    nx = max(s.origin[1] + shape[1] for s, shape in zip(snapshots, shapes))
+
+    grids = {}
+    for s, (sy, sx) in zip(snapshots, shapes):
+        region = (
+            slice(s.origin[0], s.origin[0] + sy),
+            slice(s.origin[1], s.origin[1] + sx),
+        )
+        for name, array in [*s.arrays.items(), ("step", s.step)]:
+            if name not in grids:
+                grids[name] = np.full((ny, nx), np.nan)
+            grids[name][region] = array
+
+    return grids
+
+
+def _align(size: int, alignment: int) -> int:
+    return -(-size // alignment) * alignment
@@ -0,0 +1,204 @@
+import copy
+from typing import Any, Callable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+import pysnobal.defaults as defaults
+import pysnobal.ipysnobal as ipysnobal
+import pysnobal.utils as utils
+from pysnobal.c_snobal import snobal
+from pysnobal.pysnobal import _check_config, _check_output_vars, _parse_config
+
+INT_FIELDS = ["layer_count", "mask"]
+
+
+class SnobalModel:
+    """
+    Snobal grid held in memory and advanced one data timestep at a time, for coupling
+    with other models (in the style of the Basic Model Interface).
+
+    The state is kept in place in preallocated arrays, and the forcing is written into
+    two preallocated sets of arrays (forcing_t and forcing_t1) that are bound to Snobal
+    once. run_until swaps the two sets between timesteps, so forcing_t and forcing_t1
+    always refer to the arrays bound for the next timestep. A step therefore only calls
+    Snobal, without converting dicts or allocating, and the outputs are read as NumPy
+    views of the state (get_value).
+
+    All values are in Snobal units, e.g. temperatures in Kelvin.
+    """
+
+    def __init__(
+        self,
+        config: dict[str, Any],
+        elevation: np.ndarray,
+        roughness_length: Union[np.ndarray, float],
+        start_time: Union[str, pd.Timestamp, np.datetime64],
+        time_step: Union[float, pd.Timedelta],
+        mask: Optional[np.ndarray] = None,
+        output_vars: Optional[list[str]] = None,
+        nthreads: int = 1,
+        numa: bool = False,
+    ):
+        """
+        Args:
+            config (dict): Model configuration parameters for the 'z', 'init' and
+                'defaults' sections, as in the point model config.
+            elevation (np.ndarray): Elevation (m) of the grid.
+            roughness_length (np.ndarray): Roughness length (m), a grid or a scalar.
+            start_time (pd.Timestamp): Time of the initial state.
+            time_step (float): Data timestep, in seconds or as a Timedelta.
+            mask (np.ndarray): Pixels to run (1) or skip (0). Defaults to all pixels.
+            output_vars (list[str]): Output only terms to compute, see run_snobal.
+                Defaults to all terms.
+            nthreads (int): Number of threads used by Snobal.
+            numa (bool): NUMA-aware run (see do_tstep_grid), with the state and
+                forcing arrays allocated by snobal.numa_empty.
+        """
+        elevation = np.asarray(elevation, dtype=np.float64)
+        if elevation.ndim != 2:
+            raise ValueError("elevation must be a 2D grid")
+
+        if isinstance(time_step, pd.Timedelta):
+            time_step = time_step.total_seconds()
+        self.time_step = pd.Timedelta(seconds=float(time_step))
+        self.time = pd.Timestamp(start_time)
+        self.n_steps = 0
+
+        config = copy.deepcopy(config)
+        config["io"] = {"output_path": ""}
+        config["params"] = {"elevation_m": 0.0, "roughness_length_m": 0.0}
+        _check_config(config)
+        mh, params, timestep_info = _parse_config(config, float(time_step))
+
+        init = {
+            defaults.INIT_NAMES_CUSTOM2SNOBAL[k]: float(v)
+            for k, v in config["init"].items()
+        }
+        init["T_s_0"] += utils.C_TO_K
+        init["T_s"] += utils.C_TO_K
+        init["elevation"] = elevation
+        init["z_0"] = roughness_length
+        init["mask"] = 1.0 if mask is None else mask
+
+        def _empty(dtype: type) -> np.ndarray:
+            if numa:
+                return snobal.numa_empty(elevation.shape, dtype, nthreads)
+            return np.zeros(elevation.shape, dtype=dtype)
+
+        # contiguous state arrays, which Snobal updates in place
+        self._state = {}
+        for key, value in ipysnobal.initialize({"elevation": elevation}).items():
+            self._state[key] = _empty(np.int32 if key in INT_FIELDS else np.float64)
+            self._state[key][:] = init.get(key, value)
+
+        forcing_t, forcing_t1 = (
+            {
+                k: _empty(np.float64)
+                for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values()
+            }
+            for _ in range(2)
+        )
+        self._forcing = None
+
+        self._grid = snobal.SnobalGrid(
+            self._state,
+            timestep_info,
+            mh,
+            params,
+            output_vars=None
+            if output_vars is None
+            else _check_output_vars(output_vars),
+            nthreads=nthreads,
+            numa=numa,
+        )
+        self._grid.bind_forcing(forcing_t, forcing_t1)
+
+    @property
+    def forcing_t(self) -> dict[str, np.ndarray]:
+        """
+        Arrays bound as the forcing at the start of the next timestep.
+        """
+        return self._grid.input1
+
+    @property
+    def forcing_t1(self) -> dict[str, np.ndarray]:
+        """
+        Arrays bound as the forcing at the end of the next timestep.
+        """
+        return self._grid.input2
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self._grid.shape
+
+    @property
+    def output_var_names(self) -> list[str]:
+        return list(self._state.keys())
+
+    def get_value(self, name: str) -> np.ndarray:
+        """
+        View of a state or output term, updated in place by each step.
+
+        Args:
+            name (str): Snobal name of the term, e.g. 'ro_pred_sum'.
+
+        Returns:
+            np.ndarray: The term, not to be written to except for coupling.
+        """
+        return self._state[name]
+
+    def step(
+        self,
+        forcing_t: Optional[dict[str, np.ndarray]] = None,
+        forcing_t1: Optional[dict[str, np.ndarray]] = None,
+    ) -> None:
+        """
+        Advance the grid one data timestep.
+
+        Args:
+            forcing_t (dict): Forcing at the start of the timestep, keyed by the
+                Snobal forcing names. Defaults to the bound forcing_t. Other arrays
+                are bound until the next call that passes arrays, which checks them.
+            forcing_t1 (dict): Forcing at the end of the timestep. Defaults to the
+                bound forcing_t1.
+        """
+        if forcing_t is not None or forcing_t1 is not None:
+            self._grid.bind_forcing(
+                forcing_t if forcing_t is not None else self._grid.input1,
+                forcing_t1 if forcing_t1 is not None else self._grid.input2,
+            )
+
+        rt = self._grid.advance(self.n_steps == 1)
+        if rt != -1:
+            raise ValueError(f"isnobal error on time step {self.time}")
+
+        self.n_steps += 1
+        self.time += self.time_step
+
+    def run_until(
+        self,
+        time: Union[str, pd.Timestamp, np.datetime64],
+        read_forcing: Callable[[pd.Timestamp, dict[str, np.ndarray]], None],
+    ) -> None:
+        """
+        Advance the grid in data timesteps up to a time, reading the forcing of each
+        time once into the bound arrays, which are swapped between timesteps.
+
+        Args:
+            time (pd.Timestamp): Time to advance to. Ends at the last timestep
+                before it, when it is between timesteps.
+            read_forcing (Callable): Called as read_forcing(time, forcing) to fill
+                forcing with the forcing at time.
+        """
+        time = pd.Timestamp(time)
+
+        # forcing at the current time, unless read by the previous call
+        if self._forcing != self.time:
+            read_forcing(self.time, self._grid.input1)
+
+        while self.time + self.time_step <= time:
+            read_forcing(self.time + self.time_step, self._grid.input2)
+            self.step()
+            self._grid.swap_forcing()
+        self._forcing = self.time
@@ -0,0 +1,277 @@
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+import pysnobal.defaults as defaults
+from pysnobal.c_snobal import snobal
+from pysnobal.dedup import do_tstep_grid_dedup
+from pysnobal.pysnobal import _check_output_vars
+from pysnobal.stations import StationExtractor
+
+STAGES = ["read", "compute", "write"]
+
+
+class PipelineStats:
+    """
+    Time spent working in each stage of a pipelined run.
+    """
+
+    def __init__(
+        self,
+        n_steps: int,
+        wall_time_s: float,
+        busy_s: dict[str, float],
+        n_groups: Optional[float] = None,
+    ):
+        self.n_steps = n_steps
+        self.wall_time_s = wall_time_s
+        self.busy_s = busy_s
+        # mean number of pixel groups computed per timestep, when deduplicating
+        self.n_groups = n_groups
+
+    @property
+    def utilisation(self) -> dict[str, float]:
+        """
+        Fraction of the wall time each stage was busy.
+        """
+        return {
+            stage: busy / self.wall_time_s if self.wall_time_s > 0 else 0.0
+            for stage, busy in self.busy_s.items()
+        }
+
+    def summary(self) -> str:
+        lines = [
+            f"{self.n_steps} timesteps in {self.wall_time_s:.2f} s "
+            f"({self.n_steps / max(self.wall_time_s, 1e-9):.1f} timesteps/s)"
+        ]
+        for stage in STAGES:
+            lines.append(
+                f"  {stage:8s} busy {self.busy_s[stage]:8.2f} s "
+                f"({100 * self.utilisation[stage]:5.1f}%)"
+            )
+        if self.n_groups is not None:
+            lines.append(f"  {self.n_groups:.1f} unique pixels per timestep")
+        return "\n".join(lines)
+
+
+def run_pipeline(
+    read_forcing: Callable[[int, dict[str, np.ndarray]], None],
+    write_output: Optional[Callable[[int, dict[str, np.ndarray]], None]],
+    n_steps: int,
+    output_rec: dict[str, np.ndarray],
+    timestep_info: list[dict],
+    mh: dict,
+    params: dict,
+    output_vars: Optional[list[str]] = None,
+    queue_depth: int = 2,
+    nthreads: int = 1,
+    stations: Optional[StationExtractor] = None,
+    dedup: Optional[str] = None,
+    numa: bool = False,
+) -> PipelineStats:
+    """
+    Run a grid over n_steps data timesteps with reading, computing and writing
+    overlapped in three stages.
+
+    A prefetch thread reads the forcing of the coming timesteps while Snobal computes
+    the current one, with the GIL released, and a writer thread writes the output of
+    the previous timesteps. The stages are connected by bounded queues of
+    preallocated buffers, which are reused once a stage is done with them, so the
+    memory use is fixed and the wall time approaches that of the slowest stage.
+
+    Args:
+        read_forcing (Callable): Called as read_forcing(step, buffer) to fill the
+            buffer, a dict of float64 grids keyed by the Snobal forcing names, with
+            the forcing at the start of data timestep step, in Snobal units (Kelvin).
+            Called for steps 0 to n_steps.
+        write_output (Callable): Called as write_output(step, output) with the
+            output_vars and layer_count of output_rec, in Snobal units, at the end of
+            data timestep step. The output is reused after the call returns. None
+            skips the grid output, e.g. when only stations are extracted.
+        n_steps (int): Number of data timesteps.
+        output_rec (dict): Snobal state and static layers, updated in place.
+        timestep_info (list[dict]): Timestep info, see _parse_config.
+        mh (dict): Measurement heights.
+        params (dict): Snobal parameters.
+        output_vars (list[str]): Output variables passed to write_output. Defaults to
+            all variables.
+        queue_depth (int): Timesteps read or written ahead of the computation.
+        nthreads (int): Number of threads used by Snobal.
+        stations (StationExtractor): Stations whose output is recorded each data
+            timestep, straight from the state of the grid.
+        dedup (str): Compute pixels with identical forcing and state once (see
+            do_tstep_grid_dedup), grouping them every timestep ('step') or once, at
+            the first timestep ('static'), when the forcing of the pixels of each
+            group stays identical.
+        numa (bool): NUMA-aware run (see do_tstep_grid), with the forcing buffers
+            allocated by snobal.numa_empty. output_rec should be allocated likewise,
+            e.g. with ipysnobal.initialize(init, numa_threads=nthreads).
+
+    Returns:
+        PipelineStats: Wall time and the busy time of each stage.
+    """
+    if queue_depth < 1:
+        raise ValueError("queue_depth must be at least 1")
+    if dedup not in [None, "step", "static"]:
+        raise ValueError(
+            f"Invalid dedup {dedup}. Must be one of [None, 'step', 'static']"
+        )
+    if numa and dedup is not None:
+        raise ValueError("numa does not apply to the compacted grids of dedup")
+    output_vars = _check_output_vars(output_vars)
+    written = output_vars + ["layer_count"]
+
+    # Snobal only computes the variables that are written or extracted
+    computed = output_vars if write_output is not None else []
+    if stations is not None:
+        computed = computed + stations.output_vars
+    computed = _check_output_vars(computed or None)
+
+    shape = output_rec["elevation"].shape
+    busy = {stage: 0.0 for stage in STAGES}
+    failed = threading.Event()
+    errors = []
+    groups = None
+    n_groups = []
+
+    # the computation holds two forcing buffers, input1 and input2
+    free_forcing = queue.Queue()
+    for _ in range(queue_depth + 2):
+        free_forcing.put(
+            {
+                k: snobal.numa_empty(shape, nthreads=nthreads)
+                if numa
+                else np.empty(shape, dtype=np.float64)
+                for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values()
+            }
+        )
+    free_output = queue.Queue()
+    for _ in range(queue_depth + 1):
+        free_output.put({v: np.empty(shape, dtype=np.float64) for v in written})
+
+    forcing_queue = queue.Queue(maxsize=queue_depth)
+    output_queue = queue.Queue(maxsize=queue_depth)
+
+    def _get(q: queue.Queue):
+        # give up waiting once another stage failed
+        while True:
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                if failed.is_set():
+                    raise RuntimeError("pipeline stage failed") from None
+
+    def _put(q: queue.Queue, item) -> None:
+        while True:
+            try:
+                return q.put(item, timeout=0.1)
+            except queue.Full:
+                if failed.is_set():
+                    raise RuntimeError("pipeline stage failed") from None
+
+    def _reader() -> None:
+        try:
+            for step in range(n_steps + 1):
+                buffer = _get(free_forcing)
+                start = time.perf_counter()
+                read_forcing(step, buffer)
+                busy["read"] += time.perf_counter() - start
+                _put(forcing_queue, buffer)
+        except BaseException as e:
+            if not failed.is_set():
+                errors.append(e)
+            failed.set()
+
+    def _writer() -> None:
+        try:
+            for step in range(n_steps):
+                output = _get(output_queue)
+                start = time.perf_counter()
+                write_output(step, output)
+                busy["write"] += time.perf_counter() - start
+                free_output.put(output)
+        except BaseException as e:
+            if not failed.is_set():
+                errors.append(e)
+            failed.set()
+
+    threads = [threading.Thread(target=_reader, name="pysnobal-read", daemon=True)]
+    if write_output is not None:
+        threads.append(
+            threading.Thread(target=_writer, name="pysnobal-write", daemon=True)
+        )
+    wall_start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+
+    try:
+        input2 = _get(forcing_queue)
+        for step in range(n_steps):
+            input1, input2 = input2, _get(forcing_queue)
+            if write_output is not None:
+                output = _get(free_output)
+
+            start = time.perf_counter()
+            if dedup is None:
+                rt = snobal.do_tstep_grid(
+                    input1,
+                    input2,
+                    output_rec,
+                    timestep_info,
+                    mh,
+                    params,
+                    first_step=int(step == 1),
+                    nthreads=nthreads,
+                    output_vars=computed,
+                    numa=numa,
+                )
+            else:
+                rt, step_groups = do_tstep_grid_dedup(
+                    input1,
+                    input2,
+                    output_rec,
+                    timestep_info,
+                    mh,
+                    params,
+                    first_step=int(step == 1),
+                    nthreads=nthreads,
+                    output_vars=computed,
+                    groups=groups,
+                )
+                if dedup == "static":
+                    groups = step_groups
+                n_groups.append(step_groups.n_groups)
+            if rt != -1:
+                raise ValueError(f"isnobal error on data timestep {step}")
+
+            if stations is not None:
+                stations.record(step, output_rec)
+            if write_output is not None:
+                for v in written:
+                    np.copyto(output[v], output_rec[v])
+            output_rec["time_since_out"][:] = 0.0
+            busy["compute"] += time.perf_counter() - start
+
+            free_forcing.put(input1)
+            if write_output is not None:
+                _put(output_queue, output)
+    except BaseException as e:
+        if not failed.is_set():
+            errors.append(e)
+        failed.set()
+
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return PipelineStats(
+        n_steps,
+        time.perf_counter() - wall_start,
+        busy,
+        float(np.mean(n_groups)) if n_groups else None,
+    )
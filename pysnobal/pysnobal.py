@@ -1,13 +1,16 @@
 import argparse
+import sys
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 import numpy as np
 import pandas as pd
 import progressbar
 import yaml
 
+import pysnobal.cache as cache
 import pysnobal.defaults as defaults
+import pysnobal.ipysnobal as ipysnobal
 import pysnobal.utils as utils
 from pysnobal.c_snobal import snobal
 
@@ -26,8 +29,41 @@ def load_config(path: Path) -> dict[str, Any]:
         return yaml.safe_load(f)
 
 
+def load_forcing(path: Path, use_cache: bool = False) -> pd.DataFrame:
+    """
+    Loads forcing data CSV file into a DataFrame.
+
+    With use_cache, the checked forcing data, renamed to the names used within Snobal
+    and converted to Kelvin, is stored in a binary cache next to the CSV file (see
+    cache.ForcingCache). Subsequent loads of an unchanged file read the cache instead
+    of parsing the CSV file, and run_snobal skips checking and converting the forcing.
+
+    Args:
+        path (Path): Path to forcing data file.
+        use_cache (bool): Use the binary forcing cache.
+
+    Returns:
+        pd.DataFrame: Forcing data.
+    """
+    if not use_cache:
+        return pd.read_csv(path, parse_dates=True, index_col=0)
+
+    forcing_cache = cache.ForcingCache(path)
+
+    forcing_data_df = forcing_cache.load()
+    if forcing_data_df is None:
+        forcing_data_df = pd.read_csv(path, parse_dates=True, index_col=0)
+        _convert_forcing_df(forcing_data_df, _check_forcing_df(forcing_data_df))
+        forcing_cache.store(forcing_data_df)
+
+    return forcing_data_df
+
+
 def run_snobal(
-    forcing_data_df: pd.DataFrame, config: dict[str, Any], show_pbar: bool = False
+    forcing_data_df: pd.DataFrame,
+    config: dict[str, Any],
+    show_pbar: bool = False,
+    output_vars: Optional[list[str]] = None,
 ) -> pd.DataFrame:
     """
     Run Snobal using the provided forcing data and model configuration parameters.
@@ -38,44 +74,89 @@ def run_snobal(
         forcing_data_df (pd.DataFrame): Forcing data.
         config (dict): Model configuration parameters.
         show_pbar (bool): Prints a progressbar to stdout when True.
+        output_vars (list[str]): Output variables to return, using either the Snobal
+            or output column names. Takes precedence over 'io.output_vars' in config.
+            Defaults to all energy balance and snow terms.
 
     Returns:
         pd.DataFrame: Model output terms.
     """
+    _check_config(config)
+
+    if output_vars is None:
+        output_vars = config["io"].get("output_vars")
+    output_vars = _check_output_vars(output_vars)
+
+    # return the output of an identical previous run, when a cache is configured
+    result_cache = None
+    if config["io"].get("cache_dir"):
+        result_cache = cache.ResultCache(
+            config["io"]["cache_dir"], config["io"].get("cache_size_mb")
+        )
+        cache_key = result_cache.key(forcing_data_df, config, output_vars)
+
+        output_df = result_cache.get(cache_key)
+        if output_df is not None:
+            return output_df
+
+    # continue a previous run from the first change to its forcing, when configured
+    checkpoints = None
+    if config["io"].get("checkpoint_dir"):
+        checkpoints = cache.RunCheckpoints(
+            config["io"]["checkpoint_dir"],
+            config,
+            output_vars,
+            config["io"].get("checkpoint_block"),
+            _forcing_source(config),
+        )
+
     # translate forcing_data to data structures expected by do_tstep_grid
     forcing_data_df, mh, params, timestep_info, output_rec = _parse_inputs(
         forcing_data_df, config
     )
 
-    # pre-make forcing pairs (vectorized opperation, faster than iterating, memory shouldn't be an issue)
-    forcing_records = forcing_data_df.to_dict(orient="records")
-    datetime = forcing_data_df.index.to_list()
-    forcing_pairs = {
-        datetime[i]: (
-            {k: np.atleast_2d(v) for k, v in forcing_records[i].items()},
-            {k: np.atleast_2d(v) for k, v in forcing_records[i + 1].items()},
-        )
-        for i in range(len(forcing_records) - 1)
+    # forcing as float64 columns, loaded into the double buffer one timestep at a time
+    forcing = {
+        k: forcing_data_df[k].to_numpy(dtype=np.float64)
+        for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values()
     }
+    datetime = forcing_data_df.index.to_list()[:-1]
+
+    start = 0
+    previous_df = None
+    if checkpoints is not None:
+        start, previous_df = checkpoints.restore(forcing_data_df, output_rec)
+
+    forcing_buffer = ipysnobal.ForcingBuffer({k: v[start] for k, v in forcing.items()})
 
     # run model loop, invoking the Snobal binding, keeping running list of output
-    running_output = (
-        {"Datetime": []}
-        | {defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[c]: [] for c in defaults.EM_OUT}
-        | {defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[c]: [] for c in defaults.SNOW_OUT}
-    )
+    running_output = {"Datetime": []} | {
+        defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[c]: [] for c in output_vars
+    }
 
     if show_pbar:
-        pbar = progressbar.ProgressBar(max_value=len(forcing_pairs))
+        pbar = progressbar.ProgressBar(max_value=len(datetime))
 
-    for i, (dt, forcing_pair) in enumerate(forcing_pairs.items()):
-        # call model
-        input1 = forcing_pair[0]
-        input2 = forcing_pair[1]
+    for i in range(start, len(datetime)):
+        dt = datetime[i]
+        if checkpoints is not None:
+            checkpoints.snapshot(i, output_rec)
+
+        # call model, the end of the last timestep is the start of this one
+        input1, input2 = forcing_buffer.advance(
+            {k: v[i + 1] for k, v in forcing.items()}
+        )
         is_first = int(i == 1)
 
         rt = snobal.do_tstep_grid(
-            input1, input2, output_rec, timestep_info, mh, params, first_step=is_first
+            input1,
+            input2,
+            output_rec,
+            timestep_info,
+            mh,
+            params,
+            first_step=is_first,
+            output_vars=output_vars,
         )
 
         # check return value and raise exception as needed
@@ -83,12 +164,25 @@ def run_snobal(
             raise ValueError(f"pointsnobal error on time step {dt}")
 
         # output data at the frequency and last time step
-        _append_output(running_output, dt, output_rec)
+        _append_output(running_output, dt, output_rec, output_vars)
 
         if show_pbar:
             pbar.update(i)
 
     output_df = pd.DataFrame(running_output).set_index("Datetime")
+
+    if checkpoints is not None:
+        if start < len(datetime):
+            checkpoints.snapshot(len(datetime), output_rec)
+            if previous_df is not None:
+                output_df = pd.concat([previous_df, output_df])
+        else:
+            output_df = previous_df
+        checkpoints.save(output_df)
+
+    if result_cache is not None:
+        result_cache.put(cache_key, output_df)
+
     return output_df
 
 
@@ -97,6 +191,8 @@ def _override_config(config: dict[str, Any], overrides: list[str]) -> dict[str,
     Update nested config dict using a list of key=value strings.
 
     Supports dot notation for nested keys, e.g. 'params.elevation_m=1234'.
+    Optional io settings (see defaults.DEFAULT_IO) are accepted even when the config
+    does not list them.
 
     Args:
         config (dict): Model configuration parameters.
@@ -126,7 +222,8 @@ def _override_config(config: dict[str, Any], overrides: list[str]) -> dict[str,
                     f"Invalid override '{key}'. Parameter not accepted in config."
                 )
 
-        if keys[-1] not in subconfig:
+        optional_io = keys[:-1] == ["io"] and keys[-1] in defaults.DEFAULT_IO
+        if keys[-1] not in subconfig and not optional_io:
             raise ValueError(
                 f"Invalid override '{key}'. Parameter not accepted in config."
             )
@@ -219,6 +316,27 @@ def _check_forcing_df(forcing_data_df: pd.DataFrame) -> float:
     return data_tstep_sec
 
 
+def _convert_forcing_df(forcing_data_df: pd.DataFrame, data_tstep_sec: float) -> None:
+    """
+    Rename checked forcing data to the names used within Snobal and convert degC to K.
+
+    The data timestep is stored in the attrs of the forcing data, marking it as converted.
+
+    Args:
+        forcing_data_df (pd.DataFrame): Forcing data, modified in place.
+        data_tstep_sec (float): Data timestep in seconds.
+
+    Returns:
+        None
+    """
+    forcing_data_df.rename(columns=defaults.FORCING_NAMES_CUSTOM2SNOBAL, inplace=True)
+    forcing_data_df["T_a"] += utils.C_TO_K
+    forcing_data_df["T_g"] += utils.C_TO_K
+    forcing_data_df["T_pp"] += utils.C_TO_K
+
+    forcing_data_df.attrs[defaults.SNOBAL_FORCING_ATTR] = data_tstep_sec
+
+
 def _check_config(config: dict[str, Any]) -> None:
     """
     Verify config has required components and correct format; backfill with defaults as needed.
@@ -240,6 +358,10 @@ def _check_config(config: dict[str, Any]) -> None:
             "config must contain a path for the output data: {'io' : {'output_path' : <your path>}}"
         )
 
+    # check requested output variables, when provided
+    if config["io"].get("output_vars") is not None:
+        config["io"]["output_vars"] = _check_output_vars(config["io"]["output_vars"])
+
     # check to make sure input heights provided and non-negative
     for h in ["air_temp_m", "soil_temp_m", "wind_speed_m"]:
         if config["z"].get(h) is None:
@@ -263,7 +385,7 @@ def _check_config(config: dict[str, Any]) -> None:
         and (sorted(list(config["init"].keys())))
         == sorted(list(defaults.INIT_NAMES_CUSTOM2SNOBAL.keys()))
     ):
-        config["init"] = defaults.DEFAULT_SNOWPACK
+        config["init"] = dict(defaults.DEFAULT_SNOWPACK)
     else:
         for s in defaults.INIT_NAMES_CUSTOM2SNOBAL.keys():
             if config["init"].get(s) is None:
@@ -272,7 +394,7 @@ def _check_config(config: dict[str, Any]) -> None:
                 )
 
     if config.get("defaults") is None:
-        config["defaults"] = defaults.DEFAULT_PARAMS
+        config["defaults"] = dict(defaults.DEFAULT_PARAMS)
     else:
         for k in defaults.DEFAULT_PARAMS:
             if config["defaults"].get(k) is None:
@@ -281,41 +403,78 @@ def _check_config(config: dict[str, Any]) -> None:
     # TODO: check to make sure tstep lengths divide evenly
 
 
-def _parse_inputs(
-    forcing_data_df: pd.DataFrame, config: dict[str, Any]
-) -> tuple[pd.DataFrame, dict, dict, list[dict], dict]:
+def _forcing_source(config: dict[str, Any]) -> Optional[str]:
     """
-    Check forcing data and config correctness before converting to Snobal datastructures.
-
-    Verifies all required forcing variables and forcing parameters exists and are formatted
-    correctly. Translates temperature to Kelvin, as expected by Snobal. Translates externally
-    defined variable names to variables names used internally within Snobal. Prepares the data
-    structures (mh, params, timestep_info, output_rec) expected by Snobal and the Cython
-    intermediary.
+    Identify the forcing data of a run by the absolute path it is loaded from.
 
     Args:
-        forcing_data_df (pd.DataFrame): Forcing data.
         config (dict): Model configuration parameters.
 
     Returns:
-        pd.DataFrame: Reformatted forcing data.
+        str: Absolute forcing path, or None when the config does not set one.
+    """
+    forcing_path = config["io"].get("forcing_path")
+    if not forcing_path:
+        return None
+    return str(Path(forcing_path).resolve())
+
+
+def _check_output_vars(output_vars: Optional[list[str]]) -> list[str]:
+    """
+    Verify requested output variables and translate them to names used within Snobal.
+
+    Variables can be given with either the Snobal name (e.g. 'm_s') or the output
+    column name (e.g. 'specific_mass_snow_kgm-2'). The result follows the order of
+    the energy balance and snow terms in defaults, regardless of the requested order.
+
+    Args:
+        output_vars (list[str]): Requested output variables. None selects all terms.
+
+    Returns:
+        list[str]: Snobal names of the requested output variables.
+    """
+    all_vars = defaults.EM_OUT + defaults.SNOW_OUT
+
+    if output_vars is None:
+        return all_vars
+
+    if isinstance(output_vars, str):
+        output_vars = [output_vars]
+
+    custom2snobal = {defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[v]: v for v in all_vars}
+
+    requested = set()
+    for v in output_vars:
+        if v in all_vars:
+            requested.add(v)
+        elif v in custom2snobal:
+            requested.add(custom2snobal[v])
+        else:
+            raise ValueError(
+                f"Invalid output variable {v}. Output variables must be one of: {all_vars}"
+            )
+
+    if len(requested) == 0:
+        raise ValueError("At least one output variable must be requested")
+
+    return [v for v in all_vars if v in requested]
+
+
+def _parse_config(
+    config: dict[str, Any], data_tstep_sec: float
+) -> tuple[dict, dict, list[dict]]:
+    """
+    Convert checked model configuration parameters to Snobal datastructures.
+
+    Args:
+        config (dict): Model configuration parameters, after _check_config.
+        data_tstep_sec (float): Data timestep in seconds.
+
+    Returns:
         dict: Measurement height dictionary.
         dict: Parameter dictionary.
         list[dict]: timestep_info data structure.
-        dict: output_rec data structure.
     """
-    # check validity of inputs
-    data_tstep_sec = _check_forcing_df(forcing_data_df)
-    _check_config(config)
-
-    # rename forcing dataframe and convert degC to K
-    forcing_data_df.rename(columns=defaults.FORCING_NAMES_CUSTOM2SNOBAL, inplace=True)
-    forcing_data_df["T_a"] += utils.C_TO_K
-    forcing_data_df["T_g"] += utils.C_TO_K
-    forcing_data_df["T_pp"] += utils.C_TO_K
-    config["init"]["active_layer_temp_degC"] += utils.C_TO_K
-    config["init"]["avg_snow_temp_degC"] += utils.C_TO_K
-
     # assemble measurement height dictionary
     mh = {
         "z_t": config["z"]["air_temp_m"],
@@ -364,6 +523,47 @@ def _parse_inputs(
             timestep_info[i - 1]["time_step"] / timestep_info[i]["time_step"]
         )
 
+    return mh, params, timestep_info
+
+
+def _parse_inputs(
+    forcing_data_df: pd.DataFrame, config: dict[str, Any]
+) -> tuple[pd.DataFrame, dict, dict, list[dict], dict]:
+    """
+    Check forcing data and config correctness before converting to Snobal datastructures.
+
+    Verifies all required forcing variables and forcing parameters exists and are formatted
+    correctly. Translates temperature to Kelvin, as expected by Snobal. Translates externally
+    defined variable names to variables names used internally within Snobal. Prepares the data
+    structures (mh, params, timestep_info, output_rec) expected by Snobal and the Cython
+    intermediary.
+
+    Args:
+        forcing_data_df (pd.DataFrame): Forcing data.
+        config (dict): Model configuration parameters.
+
+    Returns:
+        pd.DataFrame: Reformatted forcing data.
+        dict: Measurement height dictionary.
+        dict: Parameter dictionary.
+        list[dict]: timestep_info data structure.
+        dict: output_rec data structure.
+    """
+    # check validity of inputs, unless the forcing was already checked and converted
+    # (e.g. when loaded from the forcing cache)
+    data_tstep_sec = forcing_data_df.attrs.get(defaults.SNOBAL_FORCING_ATTR)
+    if data_tstep_sec is None:
+        data_tstep_sec = _check_forcing_df(forcing_data_df)
+    _check_config(config)
+
+    # rename forcing dataframe and convert degC to K
+    if forcing_data_df.attrs.get(defaults.SNOBAL_FORCING_ATTR) is None:
+        _convert_forcing_df(forcing_data_df, data_tstep_sec)
+    config["init"]["active_layer_temp_degC"] += utils.C_TO_K
+    config["init"]["avg_snow_temp_degC"] += utils.C_TO_K
+
+    mh, params, timestep_info = _parse_config(config, data_tstep_sec)
+
     # prepare output_rec datastructure
     mask = np.atleast_2d(1.0)
     elevation = np.atleast_2d(config["params"]["elevation_m"])
@@ -385,7 +585,10 @@ def _parse_inputs(
 
 
 def _append_output(
-    running_output: dict[str, list], dt: pd.Timestamp, output_rec: dict[str, Any]
+    running_output: dict[str, list],
+    dt: pd.Timestamp,
+    output_rec: dict[str, Any],
+    output_vars: Optional[list[str]] = None,
 ) -> None:
     """
     Append timestep output to running list of output.
@@ -394,21 +597,30 @@ def _append_output(
         running_output (dict): Running output (mapping variable name to list of values).
         dt (pd.Timestamp): Timestamp for start of current timestep.
         output_rec (dict): Output returned by Snobal for the current timestep.
+        output_vars (list[str]): Snobal names of the output variables to append.
+            Defaults to all energy balance and snow terms.
 
     Returns
         None
     """
+    if output_vars is None:
+        output_vars = defaults.EM_OUT + defaults.SNOW_OUT
+
     # add datetime for timestep
     running_output["Datetime"].append(dt)
 
     # add EB terms
     for x in defaults.EM_OUT:
+        if x not in output_vars:
+            continue
         running_output[defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[x]].append(
             output_rec[x][0][0]
         )
 
     # add snow terms
     for x in defaults.SNOW_OUT:
+        if x not in output_vars:
+            continue
         v_name = defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[x]
         if "temp" in v_name:
             running_output[v_name].append(output_rec[x][0][0] - utils.C_TO_K)
@@ -421,12 +633,23 @@ def _append_output(
 def run_pysnobal():
     """
     Excute model using config and optional overrides from the command line.
+
+    'pysnobal batch ...' runs many configs across a process pool instead, see
+    batch.run_pysnobal_batch.
     """
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from pysnobal.batch import run_pysnobal_batch
+
+        summary_df = run_pysnobal_batch(sys.argv[2:])
+        if (summary_df["status"] != "ok").any():
+            sys.exit(1)
+        return
+
     config = _load_override_config()
 
     # open forcing data
-    forcing_data_df = pd.read_csv(
-        config["io"]["forcing_path"], parse_dates=True, index_col=0
+    forcing_data_df = load_forcing(
+        config["io"]["forcing_path"], use_cache=bool(config["io"].get("forcing_cache"))
     )
 
     # run model
@@ -0,0 +1,183 @@
+import copy
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional, Sequence, Union
+
+import pandas as pd
+
+import pysnobal.defaults as defaults
+import pysnobal.pysnobal as pysnobal
+from pysnobal.batch import _init_worker
+
+# Snow terms that are zero at the end of a segment when no snow carries over
+SNOW_FREE_VARS = ["m_s", "z_s"]
+
+# Attribute of the output listing the breakpoints verified as snow-free
+BREAKPOINTS_ATTR = "snow_free_breakpoints"
+
+
+def water_year_starts(index: pd.DatetimeIndex, month: int = 10) -> list[pd.Timestamp]:
+    """
+    Find the first time of each water year within a forcing record.
+
+    Args:
+        index (pd.DatetimeIndex): Times of the forcing data.
+        month (int): First month of the water year.
+
+    Returns:
+        list[pd.Timestamp]: First time in index on or after the start of each water
+            year, excluding the first and last time of the record.
+    """
+    index = pd.DatetimeIndex(index)
+    starts = []
+    for year in range(index[0].year, index[-1].year + 1):
+        pos = index.searchsorted(pd.Timestamp(year=year, month=month, day=1))
+        if 0 < pos < len(index) - 1:
+            starts.append(index[pos])
+    return starts
+
+
+def run_retrospective(
+    forcing_data_df: pd.DataFrame,
+    config: dict[str, Any],
+    breakpoints: Optional[Sequence[Union[str, pd.Timestamp]]] = None,
+    processes: Optional[int] = None,
+    output_vars: Optional[list[str]] = None,
+    water_year_month: int = 10,
+) -> pd.DataFrame:
+    """
+    Run a long record as segments split at snow-free breakpoints, concurrently across
+    a pool of worker processes.
+
+    A segment starting without snow does not depend on the segments before it, so all
+    segments after the first start from the bare-ground state (DEFAULT_SNOWPACK) and
+    run concurrently. The first segment starts from the initial state in config. Each
+    breakpoint is verified once the segment before it completes: when snow carries
+    over (a non-zero snow mass or depth at the end of that segment), the two segments
+    are merged and run again. The output is therefore identical to run_snobal over the
+    whole record, and the verified breakpoints are listed in
+    output_df.attrs['snow_free_breakpoints'].
+
+    Args:
+        forcing_data_df (pd.DataFrame): Forcing data, as for run_snobal.
+        config (dict): Model configuration parameters.
+        breakpoints (list[pd.Timestamp]): Times to split the record at, which must be
+            in the index of forcing_data_df. Defaults to the start of each water year.
+        processes (int): Number of worker processes. Defaults to the number of CPUs.
+            Segments are run in this process when 1.
+        output_vars (list[str]): Output variables, see run_snobal. Defaults to
+            'io.output_vars' in config, or all energy balance and snow terms.
+        water_year_month (int): First month of the water year, for the default
+            breakpoints.
+
+    Returns:
+        pd.DataFrame: Model output terms, as returned by run_snobal.
+    """
+    config = copy.deepcopy(config)
+    pysnobal._check_config(config)
+    if output_vars is None:
+        output_vars = config["io"].get("output_vars")
+    output_vars = pysnobal._check_output_vars(output_vars)
+    # the segments also report the snow terms, to verify the breakpoints
+    segment_vars = pysnobal._check_output_vars(list(output_vars) + SNOW_FREE_VARS)
+
+    # snapshots are keyed by the configuration, which the segments share
+    config["io"]["checkpoint_dir"] = None
+
+    index = forcing_data_df.index
+    if breakpoints is None:
+        breakpoints = water_year_starts(index, water_year_month)
+    bounds = [0]
+    for b in sorted(pd.Timestamp(b) for b in breakpoints):
+        if b not in index:
+            raise ValueError(f"Breakpoint {b} is not a time of the forcing data")
+        pos = index.get_loc(b)
+        if not 0 < pos < len(index) - 1:
+            raise ValueError(
+                f"Breakpoint {b} must be after the first and before the last time"
+            )
+        if pos != bounds[-1]:
+            bounds.append(pos)
+    bounds.append(len(index) - 1)
+
+    # segments as [start, end) timesteps, merged while snow carries over a breakpoint
+    segments = list(zip(bounds[:-1], bounds[1:]))
+    outputs = {}
+    while True:
+        pending = [s for s in segments if s not in outputs]
+        outputs.update(
+            zip(
+                pending,
+                _run_segments(
+                    forcing_data_df, config, segment_vars, pending, processes
+                ),
+            )
+        )
+
+        merged = [segments[0]]
+        for segment in segments[1:]:
+            # segments merged in this pass are verified once they were run again
+            if merged[-1] not in outputs or _snow_free(outputs[merged[-1]]):
+                merged.append(segment)
+            else:
+                merged[-1] = (merged[-1][0], segment[1])
+        if merged == segments:
+            break
+        segments = merged
+
+    columns = [defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[v] for v in output_vars]
+    output_df = pd.concat([outputs[s][columns] for s in segments])
+    output_df.attrs[BREAKPOINTS_ATTR] = [index[start] for start, _ in segments[1:]]
+
+    return output_df
+
+
+def _snow_free(output_df: pd.DataFrame) -> bool:
+    """
+    Whether no snow is left at the end of a segment.
+    """
+    last = output_df.iloc[-1]
+    return all(
+        last[defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[v]] == 0 for v in SNOW_FREE_VARS
+    )
+
+
+def _run_segments(
+    forcing_data_df: pd.DataFrame,
+    config: dict[str, Any],
+    output_vars: list[str],
+    segments: list[tuple[int, int]],
+    processes: Optional[int],
+) -> list[pd.DataFrame]:
+    """
+    Run the segments, from the initial state in config for the one starting at the
+    first timestep and from bare ground for the others.
+    """
+    jobs = []
+    for start, end in segments:
+        segment_config = copy.deepcopy(config)
+        if start > 0:
+            segment_config["init"] = dict(defaults.DEFAULT_SNOWPACK)
+        jobs.append(
+            (forcing_data_df.iloc[start : end + 1].copy(), segment_config, output_vars)
+        )
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if processes == 1 or len(jobs) == 1:
+        return [_run_segment(*job) for job in jobs]
+
+    # spawn fresh workers, as forking after OpenMP was used in this process can hang
+    with ProcessPoolExecutor(
+        max_workers=min(processes, len(jobs)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    ) as executor:
+        return list(executor.map(_run_segment, *zip(*jobs)))
+
+
+def _run_segment(
+    forcing_data_df: pd.DataFrame, config: dict[str, Any], output_vars: list[str]
+) -> pd.DataFrame:
+    return pysnobal.run_snobal(forcing_data_df, config, output_vars=output_vars)
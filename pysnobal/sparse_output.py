@@ -0,0 +1,278 @@
+import json
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+VERSION = 1
+META_FILE = "sparse.json"
+STEPS_FILE = "steps.bin"
+INDICES_FILE = "indices.bin"
+
+# One record per timestep: model time (ns), first entry and number of entries
+STEP_DTYPE = np.dtype([("time", "<i8"), ("start", "<i8"), ("count", "<i8")])
+
+
+class SparseOutputWriter:
+    """
+    Write gridded output as index/value pairs, storing for each timestep only the
+    pixels with a snowcover (layer_count > 0) and the pixels whose values changed
+    since the previous timestep. Every keyframe_interval timesteps all pixels are
+    stored, bounding the number of timesteps a reader has to replay.
+
+    The output is a directory with one raw file of flat pixel indices, one raw file
+    of values per field and a table of timesteps, each appended to as the run goes.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        shape: tuple[int, int],
+        fields: list[str],
+        keyframe_interval: int = 720,
+        dtype: Union[str, np.dtype] = np.float64,
+    ):
+        """
+        Args:
+            path (Path): Output directory, created if missing. Existing output is
+                overwritten.
+            shape (tuple): Shape of the grid.
+            fields (list[str]): Fields written each timestep.
+            keyframe_interval (int): Timesteps between keyframes storing all pixels.
+            dtype (np.dtype): Data type the values are stored in.
+        """
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.shape = tuple(shape)
+        self.fields = list(fields)
+        self.keyframe_interval = keyframe_interval
+        self.dtype = np.dtype(dtype)
+
+        with open(self.path / META_FILE, "w") as f:
+            json.dump(
+                {
+                    "version": VERSION,
+                    "shape": self.shape,
+                    "fields": self.fields,
+                    "dtype": self.dtype.str,
+                    "keyframe_interval": keyframe_interval,
+                },
+                f,
+            )
+
+        self._files = {
+            name: open(self.path / f"{name}.bin", "wb") for name in self.fields
+        }
+        self._indices = open(self.path / INDICES_FILE, "wb")
+        self._steps = open(self.path / STEPS_FILE, "wb")
+
+        self._previous = None
+        self._n_steps = 0
+        self._n_entries = 0
+
+    def __enter__(self) -> "SparseOutputWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, time: np.datetime64, values: dict[str, np.ndarray]) -> int:
+        """
+        Append one timestep.
+
+        Args:
+            time (np.datetime64): Time of the timestep.
+            values (dict): Grid of each field. 'layer_count' selects the pixels with
+                a snowcover, when it is one of the values.
+
+        Returns:
+            int: Number of pixels stored.
+        """
+        current = {
+            name: np.asarray(values[name], dtype=self.dtype).ravel()
+            for name in self.fields
+        }
+
+        if self._n_steps % self.keyframe_interval == 0:
+            indices = np.arange(current[self.fields[0]].size, dtype=np.int64)
+        else:
+            stored = np.zeros(current[self.fields[0]].size, dtype=bool)
+            if "layer_count" in values:
+                stored |= np.asarray(values["layer_count"]).ravel() > 0
+            for name in self.fields:
+                stored |= _changed(current[name], self._previous[name])
+            indices = np.flatnonzero(stored)
+
+        indices.astype("<i4").tofile(self._indices)
+        for name in self.fields:
+            current[name][indices].astype(self.dtype.newbyteorder("<")).tofile(
+                self._files[name]
+            )
+
+        step = np.array(
+            [
+                (
+                    np.datetime64(time, "ns").astype(np.int64),
+                    self._n_entries,
+                    len(indices),
+                )
+            ],
+            dtype=STEP_DTYPE,
+        )
+        step.tofile(self._steps)
+
+        # copies, as the caller may reuse its arrays
+        self._previous = {name: v.copy() for name, v in current.items()}
+        self._n_steps += 1
+        self._n_entries += len(indices)
+
+        return len(indices)
+
+    def flush(self) -> None:
+        for f in [*self._files.values(), self._indices, self._steps]:
+            f.flush()
+
+    def close(self) -> None:
+        for f in [*self._files.values(), self._indices, self._steps]:
+            f.close()
+
+
+class SparseOutput:
+    """
+    Lazy reader of output written by SparseOutputWriter. Dense grids and point
+    series are reconstructed on demand from the memory-mapped files.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Args:
+            path (Path): Output directory.
+        """
+        self.path = Path(path)
+        with open(self.path / META_FILE) as f:
+            meta = json.load(f)
+        if meta["version"] != VERSION:
+            raise ValueError(f"{self.path} has sparse output version {meta['version']}")
+
+        self.shape = tuple(meta["shape"])
+        self.fields = meta["fields"]
+        self.keyframe_interval = meta["keyframe_interval"]
+        self.dtype = np.dtype(meta["dtype"])
+
+        # only complete timesteps, the writer may still be appending
+        steps = _memmap(self.path / STEPS_FILE, STEP_DTYPE)
+        n_entries = _memmap(self.path / INDICES_FILE, np.dtype("<i4")).size
+        for name in self.fields:
+            n_entries = min(
+                n_entries, _memmap(self.path / f"{name}.bin", self.dtype).size
+            )
+        self._steps = steps[steps["start"] + steps["count"] <= n_entries]
+
+    def __len__(self) -> int:
+        return len(self._steps)
+
+    @property
+    def times(self) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(self._steps["time"].astype("datetime64[ns]"))
+
+    def grid(
+        self,
+        step: Union[int, np.datetime64, pd.Timestamp],
+        fields: Optional[list[str]] = None,
+    ) -> dict[str, np.ndarray]:
+        """
+        Reconstruct the dense grids of one timestep, replaying the timesteps since
+        the last keyframe.
+
+        Args:
+            step (int or time): Index or time of the timestep.
+            fields (list[str]): Fields to reconstruct. Defaults to all fields.
+
+        Returns:
+            dict: Grid of each field.
+        """
+        fields = fields or self.fields
+        step = self._step_index(step)
+        indices = _memmap(self.path / INDICES_FILE, np.dtype("<i4"))
+
+        grids = {}
+        for name in fields:
+            values = self._values(name)
+            grid = np.full(int(np.prod(self.shape)), np.nan, dtype=self.dtype)
+            for start, count in self._steps[
+                step - step % self.keyframe_interval : step + 1
+            ][["start", "count"]]:
+                grid[indices[start : start + count]] = values[start : start + count]
+            grids[name] = grid.reshape(self.shape)
+
+        return grids
+
+    def series(
+        self, y: int, x: int, fields: Optional[list[str]] = None
+    ) -> pd.DataFrame:
+        """
+        Reconstruct the time series of one pixel.
+
+        Args:
+            y (int): Row of the pixel.
+            x (int): Column of the pixel.
+            fields (list[str]): Fields to reconstruct. Defaults to all fields.
+
+        Returns:
+            pd.DataFrame: Series of each field, indexed by time.
+        """
+        fields = fields or self.fields
+        pixel = np.ravel_multi_index((y, x), self.shape)
+        indices = _memmap(self.path / INDICES_FILE, np.dtype("<i4"))
+
+        # entry of the pixel in each timestep, or the last timestep storing it
+        entries = np.full(len(self), -1, dtype=np.int64)
+        entry = -1
+        for n, (start, count) in enumerate(self._steps[["start", "count"]]):
+            # indices of each timestep are sorted
+            k = np.searchsorted(indices[start : start + count], pixel)
+            if k < count and indices[start + k] == pixel:
+                entry = start + k
+            entries[n] = entry
+
+        series = {}
+        for name in fields:
+            values = np.full(len(self), np.nan, dtype=self.dtype)
+            found = entries >= 0
+            values[found] = self._values(name)[entries[found]]
+            series[name] = values
+
+        return pd.DataFrame(series, index=self.times)
+
+    def _values(self, name: str) -> np.ndarray:
+        if name not in self.fields:
+            raise ValueError(f"{name} is not in the sparse output")
+        return _memmap(self.path / f"{name}.bin", self.dtype)
+
+    def _step_index(self, step: Union[int, np.datetime64, pd.Timestamp]) -> int:
+        if isinstance(step, (int, np.integer)):
+            if not -len(self) <= step < len(self):
+                raise IndexError(f"timestep {step} is out of range")
+            return int(step) % len(self)
+
+        matches = np.flatnonzero(self.times == pd.Timestamp(step))
+        if len(matches) == 0:
+            raise KeyError(f"no timestep at {step}")
+        return int(matches[0])
+
+
+def _changed(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    # NaN, e.g. of masked pixels, is unchanged
+    return (current != previous) & ~(np.isnan(current) & np.isnan(previous))
+
+
+def _memmap(path: Path, dtype: np.dtype) -> np.ndarray:
+    # np.memmap cannot map an empty file
+    size = path.stat().st_size // dtype.itemsize
+    if size == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(size,))
@@ -0,0 +1,114 @@
+from pathlib import Path
+from typing import Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+import pysnobal.defaults as defaults
+import pysnobal.utils as utils
+from pysnobal.pysnobal import _check_output_vars
+
+
+class StationExtractor:
+    """
+    Collect the time series of output variables at station pixels while a grid runs,
+    so validation runs need no full grid output.
+
+    The values are gathered into one preallocated array per variable as each
+    timestep completes (see record), and returned as a table per station.
+    """
+
+    def __init__(
+        self,
+        points: Sequence[tuple[float, float]],
+        times: Union[pd.DatetimeIndex, np.ndarray],
+        output_vars: Optional[list[str]] = None,
+        names: Optional[list[str]] = None,
+        x: Optional[np.ndarray] = None,
+        y: Optional[np.ndarray] = None,
+    ):
+        """
+        Args:
+            points (list[tuple]): Station locations, as (row, col) pixel indices or,
+                when x and y are given, as (x, y) coordinates of the nearest pixel.
+            times (pd.DatetimeIndex): Time of each recorded timestep.
+            output_vars (list[str]): Output variables to collect, see run_snobal.
+                Defaults to all variables.
+            names (list[str]): Station names. Defaults to the station number.
+            x (np.ndarray): Coordinates of the grid columns.
+            y (np.ndarray): Coordinates of the grid rows.
+        """
+        self.output_vars = _check_output_vars(output_vars)
+        self.times = pd.DatetimeIndex(times)
+        self.names = list(names) if names is not None else list(range(len(points)))
+        if len(self.names) != len(points):
+            raise ValueError("names must have one name per station")
+
+        if (x is None) != (y is None):
+            raise ValueError("both x and y coordinates are required")
+
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if x is not None:
+            self.cols = _nearest(np.asarray(x), points[:, 0], "x")
+            self.rows = _nearest(np.asarray(y), points[:, 1], "y")
+        else:
+            if not np.array_equal(points, np.round(points)) or (points < 0).any():
+                raise ValueError("station pixels must be given as (row, col) indices")
+            self.rows = points[:, 0].astype(np.intp)
+            self.cols = points[:, 1].astype(np.intp)
+
+        self._values = {
+            v: np.full((len(self.times), len(self.names)), np.nan)
+            for v in self.output_vars
+        }
+
+    def record(self, step: int, output_rec: dict[str, np.ndarray]) -> None:
+        """
+        Gather the values at the stations at the end of one timestep.
+
+        Args:
+            step (int): Index of the timestep in times.
+            output_rec (dict): Grids of the output variables.
+        """
+        for v in self.output_vars:
+            self._values[v][step] = output_rec[v][self.rows, self.cols]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Returns:
+            pd.DataFrame: Time series indexed by station and time, with a column per
+                output variable named and in the units of the point model output.
+        """
+        columns = {}
+        for v in self.output_vars:
+            values = self._values[v]
+            if "temp" in defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[v]:
+                values = values - utils.C_TO_K
+            columns[defaults.OUTPUT_NAMES_SNOBAL2CUSTOM[v]] = values.T.ravel()
+
+        index = pd.MultiIndex.from_product(
+            [self.names, self.times], names=["station", "time"]
+        )
+        return pd.DataFrame(columns, index=index)
+
+    def to_parquet(self, path: Union[str, Path]) -> None:
+        """
+        Write the station table to a Parquet file (requires pyarrow or fastparquet).
+
+        Args:
+            path (Path): Output file.
+        """
+        self.to_dataframe().to_parquet(path)
+
+
+def _nearest(coords: np.ndarray, values: np.ndarray, name: str) -> np.ndarray:
+    # index of the nearest coordinate, within half a pixel of the grid edge
+    half = abs(coords[1] - coords[0]) / 2 if len(coords) > 1 else 0.0
+    low, high = coords.min() - half, coords.max() + half
+    outside = (values < low) | (values > high)
+    if outside.any():
+        raise ValueError(
+            f"stations {np.flatnonzero(outside)} are outside the grid {name}"
+        )
+
+    return np.abs(coords[None, :] - values[:, None]).argmin(axis=1)
@@ -0,0 +1,389 @@
+import hashlib
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import numpy as np
+
+import pysnobal.defaults as defaults
+import pysnobal.ipysnobal as ipysnobal
+from pysnobal.pipeline import run_pipeline
+from pysnobal.pysnobal import _check_output_vars
+
+# Terms of the output_rec created by ipysnobal.initialize, plus the static layers
+STATE_FIELDS = list(defaults.OUTPUT_NAMES_SNOBAL2CUSTOM.keys()) + [
+    "elevation",
+    "z_0",
+    "mask",
+]
+N_FORCING = len(defaults.FORCING_NAMES_CUSTOM2SNOBAL)
+
+DEFAULT_OVERHEAD_MB = 256.0  # interpreter, libraries and Snobal thread buffers
+
+# Tiles and initial state of a run_tiled run, under its state directory
+PLAN_FILE = "plan.json"
+
+
+class Tile:
+    """
+    Rectangular part of a grid, run as an independent Snobal grid.
+    """
+
+    def __init__(self, index: int, rows: slice, cols: slice):
+        self.index = index
+        self.rows = rows
+        self.cols = cols
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return (self.rows.stop - self.rows.start, self.cols.stop - self.cols.start)
+
+    def __repr__(self) -> str:
+        return (
+            f"Tile({self.index}, rows={self.rows.start}:{self.rows.stop}, "
+            f"cols={self.cols.start}:{self.cols.stop})"
+        )
+
+
+class MemoryPlan:
+    """
+    Split of a grid into tiles that each fit a memory budget.
+    """
+
+    def __init__(
+        self,
+        shape: tuple[int, int],
+        tiles: list[Tile],
+        bytes_per_pixel: dict[str, int],
+        budget_bytes: float,
+        overhead_bytes: float,
+    ):
+        self.shape = tuple(shape)
+        self.tiles = tiles
+        self.bytes_per_pixel = bytes_per_pixel
+        self.budget_bytes = budget_bytes
+        self.overhead_bytes = overhead_bytes
+
+    @property
+    def peak_bytes(self) -> float:
+        """
+        Estimated peak memory of running the largest tile.
+        """
+        pixels = max(t.shape[0] * t.shape[1] for t in self.tiles)
+        return self.overhead_bytes + pixels * sum(self.bytes_per_pixel.values())
+
+    def summary(self) -> str:
+        lines = [
+            f"grid {self.shape[0]}x{self.shape[1]} in {len(self.tiles)} tiles, "
+            f"peak {self.peak_bytes / 2**20:.0f} MB of {self.budget_bytes / 2**20:.0f} MB"
+        ]
+        for name, size in self.bytes_per_pixel.items():
+            lines.append(f"  {name:8s} {size:6d} bytes/pixel")
+        return "\n".join(lines)
+
+
+def bytes_per_pixel(
+    output_vars: Optional[list[str]] = None, queue_depth: int = 2
+) -> dict[str, int]:
+    """
+    Estimate the memory per pixel of running a grid with run_pipeline.
+
+    Args:
+        output_vars (list[str]): Output variables written each timestep.
+        queue_depth (int): Queue depth of the pipeline.
+
+    Returns:
+        dict: Bytes per pixel of the state, forcing and output buffers and the
+            temporary arrays of do_tstep_grid.
+    """
+    n_output = len(_check_output_vars(output_vars)) + 1  # with layer_count
+    float_size = np.dtype(np.float64).itemsize
+
+    return {
+        "state": len(STATE_FIELDS) * float_size,
+        "forcing": (queue_depth + 2) * N_FORCING * float_size,
+        "output": (queue_depth + 1) * n_output * float_size,
+        # int32 copies of layer_count and mask
+        "scratch": 2 * np.dtype(np.int32).itemsize,
+    }
+
+
+def plan_tiles(
+    shape: tuple[int, int],
+    memory_budget_mb: float,
+    output_vars: Optional[list[str]] = None,
+    queue_depth: int = 2,
+    overhead_mb: float = DEFAULT_OVERHEAD_MB,
+) -> MemoryPlan:
+    """
+    Split a grid into tiles that each run within a memory budget. Tiles are bands
+    of whole rows, or parts of single rows when one row does not fit.
+
+    Args:
+        shape (tuple): Shape of the grid.
+        memory_budget_mb (float): Memory available to run one tile (MB).
+        output_vars (list[str]): Output variables written each timestep.
+        queue_depth (int): Queue depth of the pipeline.
+        overhead_mb (float): Memory used independently of the grid size (MB).
+
+    Returns:
+        MemoryPlan: The tiles, in row-major order.
+    """
+    per_pixel = bytes_per_pixel(output_vars, queue_depth)
+    budget_bytes = memory_budget_mb * 2**20
+    overhead_bytes = overhead_mb * 2**20
+
+    max_pixels = int((budget_bytes - overhead_bytes) // sum(per_pixel.values()))
+    if max_pixels < 1:
+        raise ValueError(
+            f"memory budget of {memory_budget_mb} MB does not fit a single pixel "
+            f"besides the overhead of {overhead_mb} MB"
+        )
+
+    ny, nx = shape
+    tiles = []
+    if max_pixels >= nx:
+        rows_per_tile = min(max_pixels // nx, ny)
+        for start in range(0, ny, rows_per_tile):
+            rows = slice(start, min(start + rows_per_tile, ny))
+            tiles.append(Tile(len(tiles), rows, slice(0, nx)))
+    else:
+        for row in range(ny):
+            for start in range(0, nx, max_pixels):
+                cols = slice(start, min(start + max_pixels, nx))
+                tiles.append(Tile(len(tiles), slice(row, row + 1), cols))
+
+    return MemoryPlan(shape, tiles, per_pixel, budget_bytes, overhead_bytes)
+
+
+def run_tiled(
+    init: dict[str, Union[np.ndarray, float]],
+    read_forcing: Callable[[Tile, int, dict[str, np.ndarray]], None],
+    n_steps: int,
+    timestep_info: list[dict],
+    mh: dict,
+    params: dict,
+    output_dir: Union[str, Path],
+    memory_budget_mb: float,
+    output_vars: Optional[list[str]] = None,
+    workers: int = 1,
+    queue_depth: int = 2,
+    nthreads: int = 1,
+    overhead_mb: float = DEFAULT_OVERHEAD_MB,
+) -> MemoryPlan:
+    """
+    Run a grid of any size within a fixed memory budget, splitting it into tiles
+    that run one after another, or across worker processes that share the budget.
+
+    The initial state is stored once in memory-mapped files, from which each tile
+    reads its part. Each tile writes its output straight into its part of one
+    memory-mapped '<output_dir>/<var>.npy' per output variable, with the dimensions
+    (time, y, x), so the output is reassembled as the tiles run. The final state of
+    each tile is persisted under '<output_dir>/state', tiles with a persisted state
+    are skipped when a run is restarted, and assemble_state joins the final states.
+    The tiles and a hash of init are recorded in '<output_dir>/state/plan.json', and
+    a restart with different tiles (e.g. from a changed memory budget or number of
+    workers), init, output variables or number of timesteps is refused.
+
+    Args:
+        init (dict): Initial state and static layers, as grids or scalars, in
+            Snobal units as for ipysnobal.initialize. Requires 'elevation', 'z_0'
+            and 'mask'.
+        read_forcing (Callable): Called as read_forcing(tile, step, buffer), to fill
+            the forcing of the tile as for run_pipeline. Must be picklable when
+            workers > 1.
+        n_steps (int): Number of data timesteps.
+        timestep_info (list[dict]): Timestep info, see _parse_config.
+        mh (dict): Measurement heights.
+        params (dict): Snobal parameters.
+        output_dir (Path): Directory of the output and the persisted state.
+        memory_budget_mb (float): Memory available to the run (MB), shared by the
+            workers.
+        output_vars (list[str]): Output variables to write. Defaults to all.
+        workers (int): Number of worker processes.
+        queue_depth (int): Queue depth of the pipeline of each tile.
+        nthreads (int): Number of threads used by Snobal in each tile.
+        overhead_mb (float): Memory used by each worker independently of the grid
+            size (MB).
+
+    Returns:
+        MemoryPlan: The tiles the grid was run in.
+    """
+    missing = [k for k in ["elevation", "z_0", "mask"] if k not in init]
+    if len(missing) > 0:
+        raise ValueError(f"init is missing the layers {missing}")
+
+    shape = np.shape(init["elevation"])
+    output_vars = _check_output_vars(output_vars)
+    plan = plan_tiles(
+        shape, memory_budget_mb / workers, output_vars, queue_depth, overhead_mb
+    )
+
+    output_dir = Path(output_dir)
+    state_dir = output_dir / "state"
+    state_dir.mkdir(parents=True, exist_ok=True)
+
+    run_plan = {
+        "shape": [int(n) for n in shape],
+        "n_steps": int(n_steps),
+        "output_vars": output_vars,
+        "tiles": [
+            [t.rows.start, t.rows.stop, t.cols.start, t.cols.stop] for t in plan.tiles
+        ],
+        "init_sha256": _init_hash(init, shape),
+    }
+    plan_path = state_dir / PLAN_FILE
+    if plan_path.exists():
+        with open(plan_path) as f:
+            stored_plan = json.load(f)
+        changed = [k for k, v in run_plan.items() if stored_plan.get(k) != v]
+        if len(changed) > 0:
+            raise ValueError(
+                f"Cannot resume the run in {output_dir}, as its {changed} changed. "
+                "Use a new output_dir or remove it to start over"
+            )
+        tiles = [
+            t for t in plan.tiles if not (state_dir / f"tile_{t.index}.npz").exists()
+        ]
+    else:
+        # initial state and output, memory-mapped so each tile maps only its part
+        for key, value in init.items():
+            grid = np.lib.format.open_memmap(
+                state_dir / f"init_{key}.npy", "w+", np.float64, shape
+            )
+            grid[:] = value
+            grid.flush()
+        for v in output_vars:
+            np.lib.format.open_memmap(
+                output_dir / f"{v}.npy", "w+", np.float64, (n_steps, *shape)
+            )
+
+        # written last, so a run is resumed only once its inputs are complete
+        tmp_path = plan_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(run_plan, f)
+        tmp_path.replace(plan_path)
+        tiles = plan.tiles
+
+    args = (
+        list(init.keys()),
+        read_forcing,
+        n_steps,
+        timestep_info,
+        mh,
+        params,
+        output_dir,
+        output_vars,
+        queue_depth,
+        nthreads,
+    )
+
+    if workers == 1:
+        for tile in tiles:
+            _run_tile(tile, *args)
+    else:
+        # spawn fresh workers, as forking after OpenMP was used can hang
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            for future in [executor.submit(_run_tile, tile, *args) for tile in tiles]:
+                future.result()
+
+    return plan
+
+
+def assemble_state(
+    plan: MemoryPlan, output_dir: Union[str, Path]
+) -> dict[str, np.ndarray]:
+    """
+    Join the persisted final state of the tiles of a run_tiled run, e.g. as the
+    initial state of the following run.
+
+    Args:
+        plan (MemoryPlan): Tiles of the run.
+        output_dir (Path): Output directory of the run.
+
+    Returns:
+        dict: Grid of each state term.
+    """
+    state = {}
+    for tile in plan.tiles:
+        with np.load(Path(output_dir) / "state" / f"tile_{tile.index}.npz") as f:
+            for key in f.files:
+                if key not in state:
+                    state[key] = np.empty(plan.shape)
+                state[key][tile.rows, tile.cols] = f[key]
+    return state
+
+
+def _init_hash(init: dict[str, Union[np.ndarray, float]], shape: tuple) -> str:
+    """
+    SHA-256 of the initial state and static layers, as the grids run_tiled stores.
+    """
+    h = hashlib.sha256()
+    for key in sorted(init):
+        h.update(key.encode())
+        h.update(
+            np.ascontiguousarray(
+                np.broadcast_to(np.asarray(init[key], dtype=np.float64), shape)
+            ).data
+        )
+    return h.hexdigest()
+
+
+def _run_tile(
+    tile: Tile,
+    init_keys: list[str],
+    read_forcing: Callable,
+    n_steps: int,
+    timestep_info: list[dict],
+    mh: dict,
+    params: dict,
+    output_dir: Path,
+    output_vars: list[str],
+    queue_depth: int,
+    nthreads: int,
+) -> None:
+    """
+    Run all timesteps of one tile and persist its final state.
+    """
+    state_dir = output_dir / "state"
+    output_rec = ipysnobal.initialize(
+        {
+            key: np.array(
+                np.load(state_dir / f"init_{key}.npy", mmap_mode="r")[
+                    tile.rows, tile.cols
+                ]
+            )
+            for key in init_keys
+        }
+    )
+
+    outputs = {v: np.load(output_dir / f"{v}.npy", mmap_mode="r+") for v in output_vars}
+
+    def write_output(step: int, output: dict[str, np.ndarray]) -> None:
+        for v in output_vars:
+            outputs[v][step, tile.rows, tile.cols] = output[v]
+
+    run_pipeline(
+        lambda step, buffer: read_forcing(tile, step, buffer),
+        write_output,
+        n_steps,
+        output_rec,
+        timestep_info,
+        mh,
+        params,
+        output_vars=output_vars,
+        queue_depth=queue_depth,
+        nthreads=nthreads,
+    )
+
+    for output in outputs.values():
+        output.flush()
+
+    # written last, marking the tile as done
+    path = state_dir / f"tile_{tile.index}.npz"
+    np.savez(path.with_suffix(".tmp.npz"), **output_rec)
+    path.with_suffix(".tmp.npz").rename(path)
@@ -1,11 +1,13 @@
 #!/usr/bin/env python
 
 import glob
+import os
+import platform
 import sys
 
 import numpy as np
 from setuptools import setup, Extension
-from setuptools.command.build_ext import build_ext as build_ext
+from setuptools.command.build_ext import build_ext as _build_ext
 from Cython.Build import cythonize
 
 if sys.platform == "darwin":
@@ -15,27 +17,79 @@ else:
     extra_compile_args = ["-fopenmp", "-O3"]
     extra_link_args = ["-fopenmp"]
 
-sources = glob.glob(
-    "pysnobal/c_snobal/libsnobal/*.c"
-) + [
-    "pysnobal/c_snobal/snobal.pyx"
+# Instruction set variants of the whole extension, built in addition to the
+# baseline on x86-64; pysnobal.c_snobal imports the best one the CPU supports.
+# Floating point contraction into FMA is disabled, so every variant gives results
+# identical to the baseline.
+ISA_VARIANTS = {
+    "avx2": ["-mavx2", "-mfma"],
+    "avx512": [
+        "-mavx2",
+        "-mfma",
+        "-mavx512f",
+        "-mavx512cd",
+        "-mavx512bw",
+        "-mavx512dq",
+        "-mavx512vl",
+    ],
+}
+if platform.machine().lower() not in ["x86_64", "amd64"] or sys.platform == "win32":
+    ISA_VARIANTS = {}
+
+libsnobal = glob.glob("pysnobal/c_snobal/libsnobal/*.c")
+include_dirs = [
+    np.get_include(),
+    "pysnobal/c_snobal",
+    "pysnobal/c_snobal/h",
 ]
 
-extensions = [
-    Extension(
-        "pysnobal.c_snobal.snobal",
-        sources=sources,
-        include_dirs=[
-            np.get_include(),
-            "pysnobal/c_snobal",
-            "pysnobal/c_snobal/h",
-        ],
-        extra_compile_args=extra_compile_args,
-        extra_link_args=extra_link_args,
+
+class build_ext(_build_ext):
+    """
+    Compile each extension in its own temporary directory, as the instruction set
+    variants compile the same sources with different flags.
+    """
+
+    def build_extension(self, ext):
+        build_temp = self.build_temp
+        self.build_temp = os.path.join(build_temp, ext.name.rsplit(".", 1)[-1])
+        try:
+            super().build_extension(ext)
+        finally:
+            self.build_temp = build_temp
+
+
+extensions = cythonize(
+    [
+        Extension(
+            "pysnobal.c_snobal.snobal",
+            sources=libsnobal + ["pysnobal/c_snobal/snobal.pyx"],
+            include_dirs=include_dirs,
+            extra_compile_args=extra_compile_args,
+            extra_link_args=extra_link_args,
+        )
+    ],
+    language_level="3",
+)
+
+# the variants compile the C code generated by Cython for the baseline, under
+# their own module name
+for isa, flags in ISA_VARIANTS.items():
+    extensions.append(
+        Extension(
+            f"pysnobal.c_snobal.snobal_{isa}",
+            sources=libsnobal + ["pysnobal/c_snobal/snobal.c"],
+            include_dirs=include_dirs,
+            define_macros=[
+                ("PyInit_snobal", f"PyInit_snobal_{isa}"),
+                ("SNOBAL_ISA", f'"{isa}"'),
+            ],
+            extra_compile_args=extra_compile_args + flags + ["-ffp-contract=off"],
+            extra_link_args=extra_link_args,
+        )
     )
-]
 
 setup(
     cmdclass={"build_ext": build_ext},
-    ext_modules=cythonize(extensions, language_level="3"),
-)
\ No newline at end of file
+    ext_modules=extensions,
+)
@@ -0,0 +1,136 @@
+import pandas as pd
+import pytest
+import yaml
+from pysnobal.batch import _job_names, load_manifest, run_batch
+from pysnobal.pysnobal import load_config, run_pysnobal
+
+
+def write_configs(tmp_path, test_data, n):
+    forcing_path = tmp_path / "forcing.csv"
+    pd.read_csv(test_data.model_input(), index_col=0).iloc[:200].to_csv(forcing_path)
+
+    paths = []
+    for i in range(n):
+        config = load_config(test_data.config("baseline", "config"))
+        config["io"]["forcing_path"] = str(forcing_path)
+        config["io"]["output_path"] = str(tmp_path / f"output_{i}.csv")
+        config["params"]["elevation_m"] = 2000 + 100 * i
+
+        path = tmp_path / f"station_{i}.yaml"
+        with open(path, "w") as f:
+            yaml.safe_dump(config, f)
+        paths.append(path)
+
+    return paths
+
+
+def test_run_batch(tmp_path, test_data):
+    paths = write_configs(tmp_path, test_data, 3)
+    jobs = [{"config": str(p)} for p in paths]
+    jobs.append({"config": str(paths[0]), "overrides": ["params.not_a_param=1"]})
+
+    summary_df = run_batch(jobs, workers=2, log_dir=tmp_path / "logs")
+
+    assert list(summary_df["name"]) == [
+        "station_0",
+        "station_1",
+        "station_2",
+        "station_0_1",
+    ]
+    assert list(summary_df["status"]) == ["ok", "ok", "ok", "failed"]
+    assert list(summary_df["timesteps"]) == [199, 199, 199, 0]
+    assert "not_a_param" in summary_df["error"].iloc[-1]
+
+    for i in range(3):
+        assert len(pd.read_csv(tmp_path / f"output_{i}.csv")) == 199
+    for name in summary_df["name"]:
+        assert (tmp_path / "logs" / f"{name}.log").exists()
+
+
+def test_run_batch_worker_dies(tmp_path, test_data):
+    paths = write_configs(tmp_path, test_data, 1)
+    # overrides are evaluated in the worker, here exiting it without a result
+    jobs = [
+        {
+            "config": str(paths[0]),
+            "overrides": ["params.elevation_m=__import__('os')._exit(1)"],
+        }
+    ]
+
+    summary_df = run_batch(jobs, workers=1)
+
+    assert list(summary_df["status"]) == ["failed"]
+    assert "BrokenProcessPool" in summary_df["error"].iloc[0]
+
+
+def test_run_batch_optional_io_override(tmp_path, test_data):
+    paths = write_configs(tmp_path, test_data, 1)
+    assert "forcing_cache" not in load_config(paths[0])["io"]
+
+    summary_df = run_batch(
+        [{"config": str(paths[0])}], workers=1, overrides=["io.forcing_cache=True"]
+    )
+
+    assert list(summary_df["status"]) == ["ok"]
+    assert (tmp_path / "forcing.csv.snobal").exists()
+
+
+def test_job_names():
+    jobs = [
+        {"config": "configs/a.yaml"},
+        {"config": "other/a.yaml"},
+        {"config": "b.yaml", "name": "a_1"},
+        {"config": "a.yaml", "name": "a"},
+    ]
+    names = _job_names(jobs)
+    assert names == ["a", "a_2", "a_1", "a_3"]
+    assert len(set(names)) == len(names)
+
+
+def test_load_manifest(tmp_path):
+    manifest = {
+        "jobs": [
+            "a.yaml",
+            {
+                "config": "/abs/b.yaml",
+                "overrides": ["params.elevation_m=1"],
+                "name": "b",
+            },
+        ]
+    }
+    path = tmp_path / "manifest.yaml"
+    with open(path, "w") as f:
+        yaml.safe_dump(manifest, f)
+
+    assert load_manifest(path) == [
+        {"config": str(tmp_path / "a.yaml"), "overrides": [], "name": None},
+        {"config": "/abs/b.yaml", "overrides": ["params.elevation_m=1"], "name": "b"},
+    ]
+
+    with open(path, "w") as f:
+        yaml.safe_dump({"jobs": [{"overrides": []}]}, f)
+    with pytest.raises(ValueError):
+        load_manifest(path)
+
+
+def test_batch_cli(monkeypatch, tmp_path, test_data, capsys):
+    write_configs(tmp_path, test_data, 2)
+    summary_path = tmp_path / "summary.csv"
+
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "pysnobal",
+            "batch",
+            "--configs",
+            str(tmp_path / "station_*.yaml"),
+            "--workers",
+            "2",
+            "--summary",
+            str(summary_path),
+        ],
+    )
+    run_pysnobal()
+
+    assert "jobs: 2 (2 succeeded, 0 failed)" in capsys.readouterr().out
+    assert list(pd.read_csv(summary_path)["status"]) == ["ok", "ok"]
@@ -0,0 +1,100 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+import pysnobal
+from pysnobal import c_snobal, defaults
+from pysnobal.pysnobal import _parse_inputs, load_config
+
+ROOT = Path(pysnobal.__file__).parents[1]
+
+
+def _import_with(isa: str) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYSNOBAL_ISA=isa, PYTHONPATH=str(ROOT))
+    return subprocess.run(
+        [sys.executable, "-c", "import pysnobal; print(pysnobal.build_info()['isa'])"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+
+def test_build_info():
+    info = pysnobal.build_info()
+
+    assert info["isa"] in info["built"]
+    assert "baseline" in info["built"]
+    assert info["cpu"] in c_snobal.ISA_VARIANTS
+    if info["override"] is None:
+        # the most capable variant that was built and that the CPU supports
+        supported = c_snobal.ISA_VARIANTS[
+            : c_snobal.ISA_VARIANTS.index(info["cpu"]) + 1
+        ]
+        assert info["isa"] == [v for v in info["built"] if v in supported][-1]
+
+    # imports of the module resolve to the selected variant
+    from pysnobal.c_snobal import snobal
+
+    assert snobal is c_snobal.snobal
+    assert snobal.ISA == info["isa"]
+
+
+def test_isa_override():
+    result = _import_with("baseline")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "baseline"
+
+    result = _import_with("sse9")
+    assert result.returncode != 0
+    assert "Invalid PYSNOBAL_ISA" in result.stderr
+
+
+def test_variants_match_baseline(test_data):
+    variants = [
+        v
+        for v in pysnobal.build_info()["built"]
+        if c_snobal.ISA_VARIANTS.index(v)
+        <= c_snobal.ISA_VARIANTS.index(pysnobal.build_info()["cpu"])
+    ]
+    if variants == ["baseline"]:
+        pytest.skip("no instruction set variant was built for this CPU")
+
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df = forcing_df.iloc[500:800]
+
+    output = {}
+    for isa in variants:
+        config = load_config(test_data.config("baseline", "config"))
+        snobal_df, mh, params, timestep_info, output_rec = _parse_inputs(
+            forcing_df.copy(), config
+        )
+        module = c_snobal._import_variant(isa)
+        for i in range(len(snobal_df) - 1):
+            input1, input2 = (
+                {
+                    k: np.atleast_2d(snobal_df[k].iloc[j])
+                    for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values()
+                }
+                for j in (i, i + 1)
+            )
+            rt = module.do_tstep_grid(
+                input1,
+                input2,
+                output_rec,
+                timestep_info,
+                mh,
+                params,
+                first_step=int(i == 1),
+            )
+            assert rt == -1
+            output_rec["time_since_out"][:] = 0.0
+        output[isa] = output_rec
+
+    assert output["baseline"]["m_s"].max() > 0
+    for isa in variants[1:]:
+        for k, v in output["baseline"].items():
+            np.testing.assert_array_equal(output[isa][k], v, err_msg=f"{isa} {k}")
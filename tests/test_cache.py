@@ -0,0 +1,288 @@
+import multiprocessing
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pysnobal.cache
+import pysnobal.pysnobal
+import pysnobal.defaults as defaults
+import pysnobal.utils as utils
+from pysnobal.cache import ForcingCache, ResultCache, RunCheckpoints
+from pysnobal.pysnobal import _check_config, load_config, load_forcing, run_snobal
+
+
+def get_output_df(n=24):
+    index = pd.date_range("2026-01-19 00:00", periods=n, freq="H", name="Datetime")
+    return pd.DataFrame(
+        {c: np.random.rand(n) for c in ["thickness_snow_m", "snowmelt_kgm-2"]},
+        index=index,
+    )
+
+
+def get_forcing_df():
+    index = pd.date_range("2026-01-19 00:00", periods=24, freq="H")
+    return pd.DataFrame(
+        {c: np.arange(24.0) for c in defaults.FORCING_NAMES_CUSTOM2SNOBAL.keys()},
+        index=index,
+    )
+
+
+def test_cache_put_get(tmp_path):
+    result_cache = ResultCache(tmp_path)
+    output_df = get_output_df()
+
+    assert result_cache.get("missing") is None
+
+    result_cache.put("abc", output_df)
+    pd.testing.assert_frame_equal(result_cache.get("abc"), output_df, check_freq=False)
+
+
+def test_cache_key(tmp_path, test_data):
+    result_cache = ResultCache(tmp_path)
+    config = load_config(test_data.config("baseline", "config"))
+    _check_config(config)
+    output_vars = defaults.EM_OUT + defaults.SNOW_OUT
+
+    key = result_cache.key(get_forcing_df(), config, output_vars)
+
+    # paths in the io section and int vs float values do not change the key
+    config["io"]["output_path"] = "elsewhere.csv"
+    config["defaults"]["normal_tstep_min"] = 60
+    assert result_cache.key(get_forcing_df(), config, output_vars) == key
+
+    # forcing, parameters and output variables do
+    forcing_df = get_forcing_df()
+    forcing_df.iloc[5, 0] += 1.0
+    assert result_cache.key(forcing_df, config, output_vars) != key
+    assert result_cache.key(get_forcing_df(), config, ["m_s"]) != key
+
+    config["params"]["roughness_length_m"] = 0.005
+    assert result_cache.key(get_forcing_df(), config, output_vars) != key
+
+
+def test_cache_eviction(tmp_path):
+    output_df = get_output_df(1000)
+    entry_size = 2 * 8 * 1000 + 8 * 1000
+
+    # room for two entries
+    result_cache = ResultCache(tmp_path, max_size_mb=2.5 * entry_size / 1024**2)
+
+    result_cache.put("first", output_df)
+    result_cache.put("second", output_df)
+    result_cache.get("first")
+    result_cache.put("third", output_df)
+
+    assert result_cache.get("first") is not None
+    assert result_cache.get("second") is None
+    assert result_cache.get("third") is not None
+
+
+def test_run_snobal_cache(tmp_path, test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    config["io"]["cache_dir"] = str(tmp_path)
+
+    input_path = test_data.model_input()
+    forcing_df = pd.read_csv(input_path, index_col=0, parse_dates=True)
+
+    result_df = run_snobal(forcing_df, config)
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+
+    config = load_config(test_data.config("baseline", "config"))
+    config["io"]["cache_dir"] = str(tmp_path)
+    forcing_df = pd.read_csv(input_path, index_col=0, parse_dates=True)
+
+    cached_df = run_snobal(forcing_df, config)
+    pd.testing.assert_frame_equal(cached_df, result_df)
+
+
+def test_forcing_cache(tmp_path, test_data):
+    source = tmp_path / "forcing.csv"
+    shutil.copy(test_data.model_input(), source)
+
+    forcing_df = load_forcing(source, use_cache=True)
+    assert (tmp_path / "forcing.csv.snobal").is_dir()
+    assert forcing_df.attrs[defaults.SNOBAL_FORCING_ATTR] == 3600
+
+    cached_df = ForcingCache(source).load()
+    pd.testing.assert_frame_equal(cached_df, forcing_df)
+    assert cached_df.attrs == forcing_df.attrs
+
+    expected_df = pd.read_csv(source, index_col=0, parse_dates=True)
+    pd.testing.assert_series_equal(
+        cached_df["T_a"] - utils.C_TO_K,
+        expected_df["temp_air_degC"].rename("T_a"),
+    )
+
+    # touching the file keeps the cache, changing it invalidates it
+    os.utime(source, ns=(0, 0))
+    assert ForcingCache(source).load() is not None
+
+    with open(source, "a") as f:
+        f.write("2020-04-08 00:00:00" + ",0.0" * (len(expected_df.columns)) + "\n")
+    assert ForcingCache(source).load() is None
+
+
+def test_run_snobal_forcing_cache(tmp_path, test_data):
+    source = tmp_path / "forcing.csv"
+    shutil.copy(test_data.model_input(), source)
+
+    expected_df = pd.read_csv(
+        test_data.model_expected(), index_col="Datetime", parse_dates=True
+    )
+
+    for _ in range(2):
+        config = load_config(test_data.config("baseline", "config"))
+        forcing_df = load_forcing(source, use_cache=True)
+
+        result_df = run_snobal(forcing_df, config)
+
+        # see test_pysnobal_real_data
+        drop_list = [
+            "inter_layer_heat_flux_Wm-2",
+            "delta_active_layer_energy_Wm-2",
+        ]
+
+        pd.testing.assert_frame_equal(
+            result_df.drop(columns=drop_list).reset_index(),
+            expected_df.drop(columns=drop_list).reset_index(),
+            check_exact=False,
+        )
+
+
+def test_cache_get_evicted(tmp_path, monkeypatch):
+    cache = ResultCache(tmp_path)
+    cache.put("a", get_output_df())
+    cache.put("b", get_output_df())
+
+    # a partially deleted entry is a miss and is dropped
+    path = next(tmp_path.glob("a*"))
+    path.write_bytes(path.read_bytes()[:100])
+    assert cache.get("a") is None
+    assert not path.exists()
+
+    # an entry evicted between the existence check and the load is a miss
+    def evicted(path):
+        os.remove(path)
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(pysnobal.cache, "_load_output", evicted)
+    assert cache.get("b") is None
+
+
+def _checkpoint_config(test_data, checkpoint_dir, **io):
+    config = load_config(test_data.config("baseline", "config"))
+    config["io"]["checkpoint_dir"] = str(checkpoint_dir)
+    config["io"]["checkpoint_block"] = 100
+    config["io"].update(io)
+    return config
+
+
+def _count_steps(monkeypatch):
+    steps = []
+    do_tstep_grid = pysnobal.pysnobal.snobal.do_tstep_grid
+
+    def counted(*args, **kwargs):
+        steps.append(1)
+        return do_tstep_grid(*args, **kwargs)
+
+    monkeypatch.setattr(pysnobal.pysnobal.snobal, "do_tstep_grid", counted)
+    return steps
+
+
+def test_run_snobal_checkpoints(tmp_path, test_data, monkeypatch):
+    input_path = test_data.model_input()
+    forcing_df = pd.read_csv(input_path, index_col=0, parse_dates=True).iloc[500:1051]
+
+    run_snobal(forcing_df.iloc[:451].copy(), _checkpoint_config(test_data, tmp_path))
+    assert len(list(tmp_path.glob("*/state_*.npz"))) == 5
+
+    # revise the forcing of the last days and extend it
+    revised_df = forcing_df.copy()
+    revised_df.iloc[420:, revised_df.columns.get_loc("precip_mass_mm")] += 0.5
+    expected_df = run_snobal(
+        revised_df.copy(), load_config(test_data.config("baseline", "config"))
+    )
+
+    steps = _count_steps(monkeypatch)
+    output_df = run_snobal(revised_df.copy(), _checkpoint_config(test_data, tmp_path))
+    pd.testing.assert_frame_equal(output_df, expected_df)
+    # restarted from the snapshot at timestep 400
+    assert len(steps) == 150
+
+    # unchanged forcing returns the stored output
+    steps.clear()
+    output_df = run_snobal(revised_df.copy(), _checkpoint_config(test_data, tmp_path))
+    pd.testing.assert_frame_equal(output_df, expected_df)
+    assert len(steps) == 0
+
+    # a change to the configuration runs all timesteps
+    config = _checkpoint_config(test_data, tmp_path)
+    config["params"]["roughness_length_m"] *= 2
+    run_snobal(revised_df.copy(), config)
+    assert len(steps) == 550
+
+
+def test_run_checkpoints_full_rerun_invalidates(tmp_path, test_data):
+    input_path = test_data.model_input()
+    forcing_df = pd.read_csv(input_path, index_col=0, parse_dates=True).iloc[500:951]
+    run_snobal(forcing_df.copy(), _checkpoint_config(test_data, tmp_path))
+    (meta_path,) = tmp_path.glob("*/meta.json")
+
+    # a change to the first block restarts the run, dropping the stored hashes
+    revised_df = forcing_df.copy()
+    revised_df.iloc[10, revised_df.columns.get_loc("precip_mass_mm")] += 0.5
+    config = _checkpoint_config(test_data, tmp_path)
+    _check_config(config)
+    output_vars = pysnobal.pysnobal._check_output_vars(None)
+    checkpoints = RunCheckpoints(tmp_path, config, output_vars, 100)
+    assert checkpoints.run_dir == meta_path.parent
+    forcing, _, _, _, output_rec = pysnobal.pysnobal._parse_inputs(
+        revised_df.copy(), config
+    )
+    assert checkpoints.restore(forcing, output_rec) == (0, None)
+    assert not meta_path.exists()
+
+
+def test_run_checkpoints_keyed_on_source(tmp_path, test_data):
+    config = _checkpoint_config(test_data, tmp_path)
+    _check_config(config)
+    station_a = RunCheckpoints(tmp_path, config, ["m_s"], source="/data/a.csv")
+    station_b = RunCheckpoints(tmp_path, config, ["m_s"], source="/data/b.csv")
+    assert station_a.run_dir != station_b.run_dir
+
+    config["io"]["forcing_path"] = str(tmp_path / "a.csv")
+    assert pysnobal.pysnobal._forcing_source(config) == str(tmp_path / "a.csv")
+
+
+def test_forcing_cache_concurrent_writers(tmp_path, test_data):
+    source = tmp_path / "forcing.csv"
+    shutil.copy(test_data.model_input(), source)
+    expected_df = load_forcing(tmp_path / "forcing.csv", use_cache=False)
+
+    context = multiprocessing.get_context("spawn")
+    for n in range(3):
+        if n == 2:
+            # replace a stale cache
+            with open(source, "a") as f:
+                f.write(
+                    "2020-05-16 00:00:00" + ",0.0" * len(expected_df.columns) + "\n"
+                )
+
+        processes = [
+            context.Process(target=load_forcing, args=(source, True)) for _ in range(8)
+        ]
+        for p in processes:
+            p.start()
+        for p in processes:
+            p.join()
+        assert [p.exitcode for p in processes] == [0] * 8
+
+        cached_df = ForcingCache(source).load()
+        assert cached_df is not None
+        assert len(cached_df) == len(expected_df) + int(n == 2)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "forcing.csv",
+        "forcing.csv.snobal",
+    ]
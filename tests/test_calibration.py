@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pysnobal.calibration import (
+    calibrate,
+    kge,
+    rmse,
+    run_parameter_sets,
+    sample_parameters,
+)
+from pysnobal.pysnobal import load_config, run_snobal
+
+BOUNDS = {
+    "params.roughness_length_m": (0.0005, 0.01),
+    "defaults.max_h2o_vol_frac": (0.01, 0.05),
+}
+
+
+@pytest.mark.parametrize("method", ["grid", "random", "lhs"])
+def test_sample_parameters(method):
+    param_sets = sample_parameters(BOUNDS, 5, method=method, seed=0)
+
+    assert list(param_sets.columns) == list(BOUNDS.keys())
+    assert len(param_sets) == (25 if method == "grid" else 5)
+    for name, (lower, upper) in BOUNDS.items():
+        assert param_sets[name].between(lower, upper).all()
+
+
+def test_sample_parameters_lhs_strata():
+    param_sets = sample_parameters({"x": (0.0, 1.0)}, 10, method="lhs", seed=0)
+    assert sorted(np.floor(param_sets["x"] * 10).astype(int)) == list(range(10))
+
+
+def test_sample_parameters_exceptions():
+    with pytest.raises(ValueError):
+        sample_parameters(BOUNDS, 5, method="sobol")
+
+
+def test_objectives():
+    observed = np.array([1.0, 2.0, np.nan, 4.0])
+    simulated = np.array([[1.0, 2.0, 10.0, 4.0], [2.0, 3.0, 10.0, 5.0]])
+
+    np.testing.assert_allclose(rmse(simulated, observed), [0.0, 1.0])
+    np.testing.assert_allclose(kge(simulated[:1], observed), [1.0])
+    assert kge(simulated, observed)[1] < 1.0
+
+
+def test_run_parameter_sets_matches_run_snobal(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df = forcing_df.iloc[:500]
+
+    param_sets = pd.DataFrame(
+        {
+            "params.roughness_length_m": [0.001, 0.005, 0.001],
+            "defaults.max_h2o_vol_frac": [0.01, 0.01, 0.03],
+        }
+    )
+
+    with pytest.warns(UserWarning, match="grid runs"):
+        simulated = run_parameter_sets(forcing_df, config, param_sets)
+    simulated = simulated["thickness_snow_m"]
+    assert simulated.shape == (len(forcing_df) - 1, len(param_sets))
+
+    for i, row in param_sets.iterrows():
+        set_config = load_config(test_data.config("baseline", "config"))
+        set_config["params"]["roughness_length_m"] = row["params.roughness_length_m"]
+        set_config["defaults"]["max_h2o_vol_frac"] = row["defaults.max_h2o_vol_frac"]
+
+        expected = run_snobal(forcing_df.copy(), set_config, output_vars=["z_s"])
+
+        np.testing.assert_allclose(
+            simulated[i].to_numpy(), expected["thickness_snow_m"].to_numpy()
+        )
+
+
+def test_calibrate(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df = forcing_df.iloc[:500]
+
+    param_sets = sample_parameters(BOUNDS, 4, method="lhs", seed=1)
+    observed = run_snobal(
+        forcing_df.copy(),
+        load_config(test_data.config("baseline", "config")),
+        output_vars=["z_s"],
+    )["thickness_snow_m"]
+
+    with pytest.warns(UserWarning, match="grid runs"):
+        surface = calibrate(forcing_df, config, observed, param_sets, objective="rmse")
+
+    assert list(surface.columns) == list(BOUNDS.keys()) + ["rmse"]
+    assert len(surface) == len(param_sets)
+    assert surface["rmse"].is_monotonic_increasing
+
+    with pytest.raises(ValueError):
+        calibrate(forcing_df, config, observed, param_sets, objective="nse")
+
+
+def test_run_parameter_sets_grid_sampling_does_not_warn(test_data, recwarn):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df = forcing_df.iloc[:50]
+
+    # 2 values of max_h2o_vol_frac, each run as one grid of 2 roughness lengths
+    param_sets = sample_parameters(BOUNDS, 2, method="grid")
+    run_parameter_sets(forcing_df, config, param_sets)
+
+    assert len(recwarn) == 0
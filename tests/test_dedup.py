@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pysnobal import defaults
+from pysnobal.c_snobal import snobal
+from pysnobal.dedup import do_tstep_grid_dedup, group_pixels
+from pysnobal.pipeline import run_pipeline
+from pysnobal.pysnobal import _parse_inputs, load_config
+
+SHAPE = (4, 6)
+OUTPUT_VARS = ["m_s", "cc_s", "h2o"]
+
+
+def _inputs(test_data, n_times=150):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df, mh, params, timestep_info, output_rec = _parse_inputs(
+        forcing_df.iloc[550 : 551 + n_times].copy(), config
+    )
+    for key, value in output_rec.items():
+        output_rec[key] = np.full(SHAPE, value.ravel()[0], dtype=np.float64)
+
+    # three elevations repeated over the grid, two forcing zones
+    output_rec["elevation"][:] = np.tile([1500.0, 2000.0, 2500.0], (4, 2))
+    output_rec["mask"][3, 5] = 0
+    zone = np.zeros(SHAPE)
+    zone[2:] = 1.0
+
+    def forcing(i):
+        values = {
+            k: np.full(SHAPE, forcing_df[k].iloc[i])
+            for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values()
+        }
+        values["I_lw"] += 10.0 * zone
+        values["m_pp"] *= 1.0 + 0.5 * zone
+        return values
+
+    return forcing, output_rec, timestep_info, mh, params, n_times
+
+
+def _run(test_data, dedup):
+    forcing, output_rec, timestep_info, mh, params, n_times = _inputs(test_data)
+    output = []
+    n_groups = []
+    for i in range(n_times):
+        args = (forcing(i), forcing(i + 1), output_rec, timestep_info, mh, params)
+        kwargs = {"first_step": int(i == 1), "output_vars": OUTPUT_VARS}
+        if dedup:
+            rt, groups = do_tstep_grid_dedup(*args, **kwargs)
+            n_groups.append(groups.n_groups)
+        else:
+            rt = snobal.do_tstep_grid(*args, **kwargs)
+        assert rt == -1
+        output.append({k: v.copy() for k, v in output_rec.items()})
+        output_rec["time_since_out"][:] = 0.0
+    return output, n_groups
+
+
+def test_dedup_matches_do_tstep_grid(test_data):
+    expected, _ = _run(test_data, dedup=False)
+    output, n_groups = _run(test_data, dedup=True)
+
+    # 3 elevations in 2 forcing zones
+    assert set(n_groups) == {6}
+    assert expected[-1]["m_s"].min() < expected[-1]["m_s"].max()
+
+    for step_expected, step_output in zip(expected, output):
+        for k in step_expected:
+            np.testing.assert_array_equal(step_output[k], step_expected[k], err_msg=k)
+
+
+def test_group_pixels(test_data):
+    forcing, output_rec, *_ = _inputs(test_data, n_times=1)
+    groups = group_pixels(forcing(0), forcing(1), output_rec)
+
+    assert groups.n_pixels == 23
+    assert groups.n_groups == 6
+    labels = np.full(SHAPE, -1)
+    labels[groups.pixels] = groups.labels
+    np.testing.assert_array_equal(labels[0], [0, 1, 2, 0, 1, 2])
+    np.testing.assert_array_equal(labels[3], [3, 4, 5, 3, 4, -1])
+
+    # any difference in the state splits a group
+    output_rec["z_s"][0, 3] = 0.1
+    assert group_pixels(forcing(0), forcing(1), output_rec).n_groups == 7
+
+    output_rec["mask"][:] = 0
+    rt, groups = do_tstep_grid_dedup(forcing(0), forcing(1), output_rec, *_[:3])
+    assert rt == -1 and groups.n_groups == 0
+
+
+@pytest.mark.parametrize("dedup", ["step", "static"])
+def test_pipeline_dedup(test_data, dedup):
+    expected, _ = _run(test_data, dedup=False)
+    forcing, output_rec, timestep_info, mh, params, n_times = _inputs(test_data)
+
+    def read_forcing(step, buffer):
+        for k, v in forcing(step).items():
+            buffer[k][:] = v
+
+    output = []
+    stats = run_pipeline(
+        read_forcing,
+        lambda step, values: output.append(values["m_s"].copy()),
+        n_times,
+        output_rec,
+        timestep_info,
+        mh,
+        params,
+        output_vars=OUTPUT_VARS,
+        dedup=dedup,
+    )
+
+    assert stats.n_groups == 6
+    assert "unique pixels" in stats.summary()
+    for step_expected, step_output in zip(expected, output):
+        np.testing.assert_array_equal(step_output, step_expected["m_s"])
+
+    with pytest.raises(ValueError):
+        run_pipeline(
+            read_forcing, None, 1, output_rec, timestep_info, mh, params, dedup="hash"
+        )
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pysnobal import defaults
+from pysnobal.ensemble import (
+    EnsembleStatistics,
+    Perturbation,
+    clip_forcing,
+    run_ensemble,
+)
+from pysnobal.pysnobal import _parse_inputs, load_config, run_snobal
+
+OUTPUT_VARS = ["m_s", "z_s", "T_s", "melt_sum"]
+
+
+def _forcing(test_data):
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    return forcing_df.iloc[500:900][list(defaults.FORCING_NAMES_CUSTOM2SNOBAL.keys())]
+
+
+def test_unperturbed_ensemble_matches_run_snobal(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = _forcing(test_data)
+
+    output = run_ensemble(forcing_df, config, [], n_members=3, output_vars=OUTPUT_VARS)
+    expected = run_snobal(forcing_df.copy(), config, output_vars=OUTPUT_VARS)
+
+    assert list(output.columns.levels[1]) == ["mean", "q0.05", "q0.5", "q0.95"]
+    for name in expected.columns:
+        for statistic in ["mean", "q0.05", "q0.5", "q0.95"]:
+            np.testing.assert_allclose(
+                output[(name, statistic)], expected[name], rtol=1e-12, atol=1e-12
+            )
+
+
+def test_ensemble_statistics_match_members(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = _forcing(test_data)
+
+    precip = np.array([0.5, 0.8, 1.0, 1.3, 2.0])
+    air_temp = np.array([-1.0, 0.0, 0.5, 1.0, 2.0])
+    perturbations = [
+        Perturbation("precip_mass_mm", factor=precip),
+        Perturbation("T_a", offset=air_temp),
+        Perturbation("S_n", factor=0.9),
+    ]
+    output = run_ensemble(
+        forcing_df,
+        config,
+        perturbations,
+        n_members=5,
+        output_vars=OUTPUT_VARS,
+        quantiles=[0.1, 0.5],
+    )
+
+    # each member run on its own, perturbing the forcing in Snobal units
+    snobal_df, *_ = _parse_inputs(
+        forcing_df.copy(), load_config(test_data.config("baseline", "config"))
+    )
+    members = []
+    for n in range(5):
+        member_df = snobal_df.copy()
+        member_df["m_pp"] *= precip[n]
+        member_df["T_a"] += air_temp[n]
+        member_df["S_n"] *= 0.9
+        member_df.attrs = dict(snobal_df.attrs)
+        members.append(
+            run_snobal(
+                member_df,
+                load_config(test_data.config("baseline", "config")),
+                output_vars=OUTPUT_VARS,
+            )
+        )
+
+    for name in members[0].columns:
+        values = np.stack([m[name].to_numpy() for m in members], axis=1)
+        # temperatures are converted to degC after the statistics
+        np.testing.assert_allclose(
+            output[(name, "mean")], values.mean(axis=1), rtol=1e-12, atol=1e-12
+        )
+        for q in [0.1, 0.5]:
+            np.testing.assert_allclose(
+                output[(name, f"q{q:g}")],
+                np.quantile(values, q, axis=1),
+                rtol=1e-12,
+                atol=1e-12,
+            )
+    assert (output[("specific_mass_snow_kgm-2", "q0.5")] > 0).any()
+    assert output.index.equals(forcing_df.index[:-1])
+
+
+def test_perturbation_checks(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = _forcing(test_data)
+
+    with pytest.raises(ValueError):
+        Perturbation("precip")
+    with pytest.raises(ValueError):
+        run_ensemble(
+            forcing_df, config, [Perturbation("m_pp", factor=[1.0, 2.0])], n_members=3
+        )
+
+    values = np.array([1.0, -2.0])
+    Perturbation("m_pp", factor=2.0, offset=[0.0, 1.0]).apply(values)
+    np.testing.assert_array_equal(values, [2.0, -3.0])
+
+    statistics = EnsembleStatistics(pd.date_range("2020-01-01", periods=2), ["m_s"])
+    statistics.record(0, {"m_s": np.array([[1.0, 2.0, 3.0]])})
+    table = statistics.to_dataframe()
+    assert table[("specific_mass_snow_kgm-2", "mean")].iloc[0] == 2.0
+    assert np.isnan(table[("specific_mass_snow_kgm-2", "q0.5")].iloc[1])
+
+
+def test_perturbed_forcing_is_clipped(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = _forcing(test_data)
+
+    forcing = {
+        "percent_snow": np.array([-0.5, 0.5, 3.0]),
+        "u": np.array([-1.0, 2.0, 3.0]),
+        "rho_snow": np.array([-10.0, 0.0, 100.0]),
+        "T_a": np.array([-10.0, 0.0, 10.0]),
+    }
+    clip_forcing(forcing, list(forcing.keys()))
+    np.testing.assert_array_equal(forcing["percent_snow"], [0.0, 0.5, 1.0])
+    np.testing.assert_array_equal(forcing["u"], [0.0, 2.0, 3.0])
+    np.testing.assert_array_equal(forcing["rho_snow"], [0.0, 0.0, 100.0])
+    np.testing.assert_array_equal(forcing["T_a"], [-10.0, 0.0, 10.0])
+
+    # a member with an out of range snow fraction and wind speed runs as the clipped
+    # forcing
+    perturbations = [
+        Perturbation("percent_snow", factor=4.0),
+        Perturbation("u", offset=-1.0),
+    ]
+    output = run_ensemble(
+        forcing_df, config, perturbations, n_members=1, output_vars=OUTPUT_VARS
+    )
+
+    clipped_df = forcing_df.copy()
+    clipped_df["snow_precip_fraction"] = (4 * clipped_df["snow_precip_fraction"]).clip(
+        0, 1
+    )
+    clipped_df["wind_speed_ms-1"] = (clipped_df["wind_speed_ms-1"] - 1).clip(lower=0)
+    assert (forcing_df["wind_speed_ms-1"] < 1).any()
+    expected = run_snobal(clipped_df, config, output_vars=OUTPUT_VARS)
+
+    for name in expected.columns:
+        np.testing.assert_allclose(
+            output[(name, "mean")], expected[name], rtol=1e-12, atol=1e-12
+        )
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pysnobal.defaults import FORCING_NAMES_CUSTOM2SNOBAL
+from pysnobal.live_state import read_live_grid
+from pysnobal.pysnobal import load_config, run_snobal
+
+xr = pytest.importorskip("xarray")
+pytest.importorskip("dask")
+
+from pysnobal.gridded import run_gridded  # noqa: E402
+
+OUTPUT_VARS = ["z_s", "rho", "m_s", "T_s", "melt_sum", "ro_pred_sum"]
+
+
+def _grid_inputs(forcing_df, elevations):
+    ny, nx = elevations.shape
+    forcing = xr.Dataset(
+        {
+            k: (
+                ["time", "y", "x"],
+                np.broadcast_to(
+                    forcing_df[k].to_numpy()[:, None, None], (len(forcing_df), ny, nx)
+                ).copy(),
+            )
+            for k in forcing_df.columns
+        },
+        coords={
+            "time": forcing_df.index.values,
+            "y": np.arange(ny),
+            "x": np.arange(nx),
+        },
+    )
+    elevation = xr.DataArray(
+        elevations, dims=["y", "x"], coords={"y": forcing["y"], "x": forcing["x"]}
+    )
+    return forcing, elevation
+
+
+def test_run_gridded_matches_run_snobal(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df = forcing_df.iloc[:500][list(FORCING_NAMES_CUSTOM2SNOBAL.keys())]
+
+    elevations = np.array([[1500.0, 2000.0, 2500.0], [1000.0, 2101.0, 3000.0]])
+    forcing, elevation = _grid_inputs(forcing_df, elevations)
+    mask = xr.ones_like(elevation)
+    mask[1, 2] = 0
+
+    output = run_gridded(
+        forcing,
+        elevation,
+        config["params"]["roughness_length_m"],
+        config,
+        mask=mask,
+        output_vars=OUTPUT_VARS,
+        chunks={"y": 1, "x": 2},
+    )
+
+    # lazily evaluated, one task per spatial chunk
+    assert output["thickness_snow_m"].chunks == ((499,), (1, 1), (2, 1))
+    output = output.compute()
+
+    assert output.sizes == {"time": 499, "y": 2, "x": 3}
+    assert np.isnan(output["thickness_snow_m"][:, 1, 2]).all()
+
+    for y, x in [(0, 0), (0, 2), (1, 1)]:
+        pixel_config = load_config(test_data.config("baseline", "config"))
+        pixel_config["params"]["elevation_m"] = elevations[y, x]
+        expected = run_snobal(forcing_df.copy(), pixel_config, output_vars=OUTPUT_VARS)
+
+        for name in expected.columns:
+            np.testing.assert_allclose(
+                output[name][:, y, x].to_numpy(), expected[name].to_numpy()
+            )
+
+
+def test_run_gridded_exceptions(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing, elevation = _grid_inputs(forcing_df.iloc[:10], np.ones((2, 2)))
+
+    with pytest.raises(ValueError):
+        run_gridded(forcing.drop_vars("temp_air_degC"), elevation, 0.001, config)
+
+    with pytest.raises(ValueError):
+        run_gridded(forcing.isel(time=[0, 1, 3]), elevation, 0.001, config)
+
+
+def test_run_gridded_live_state(test_data, tmp_path):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing, elevation = _grid_inputs(forcing_df.iloc[550:600], np.full((2, 3), 2000.0))
+
+    output = run_gridded(
+        forcing,
+        elevation,
+        0.001,
+        config,
+        output_vars=["z_s", "m_s"],
+        chunks={"y": 1, "x": 2},
+        live_state_dir=tmp_path,
+    ).compute()
+
+    grids = read_live_grid(tmp_path)
+
+    assert len(list(tmp_path.iterdir())) == 4
+    np.testing.assert_array_equal(grids["step"], 49)
+    np.testing.assert_allclose(grids["m_s"], output["specific_mass_snow_kgm-2"][-1])
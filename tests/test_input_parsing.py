@@ -6,6 +6,7 @@ import pytest
 from pysnobal.pysnobal import (
     _check_config,
     _check_forcing_df,
+    _check_output_vars,
     _parse_inputs,
     load_config,
 )
@@ -192,3 +193,22 @@ def test_parse_inputs(case, test_data):
                 )
         else:
             assert output_rec[key] == np.atleast_2d(0.0)
+
+
+@pytest.mark.parametrize(
+    "output_vars, expected",
+    [
+        (None, defaults.EM_OUT + defaults.SNOW_OUT),
+        (["m_s", "z_s"], ["z_s", "m_s"]),
+        (["snowmelt_kgm-2", "ro_pred_sum"], ["melt_sum", "ro_pred_sum"]),
+        ("H_bar", ["H_bar"]),
+    ],
+)
+def test_check_output_vars(output_vars, expected):
+    assert _check_output_vars(output_vars) == expected
+
+
+@pytest.mark.parametrize("output_vars", [[], ["m_s", "not_a_variable"], ["mask"]])
+def test_check_output_vars_exceptions(output_vars):
+    with pytest.raises(ValueError):
+        _check_output_vars(output_vars)
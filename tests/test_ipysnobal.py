@@ -0,0 +1,30 @@
+import numpy as np
+from pysnobal.ipysnobal import ForcingBuffer
+
+
+def test_forcing_buffer():
+    shape = (3, 4)
+    forcing = [
+        {"T_a": np.full(shape, i, dtype=np.float32), "S_n": float(10 * i)}
+        for i in range(4)
+    ]
+
+    forcing_buffer = ForcingBuffer(forcing[0])
+
+    previous_input2 = forcing_buffer.input2
+    for i in range(1, len(forcing)):
+        input1, input2 = forcing_buffer.advance(forcing[i])
+
+        # the end of the last timestep is reused as the start of this one
+        assert input1 is previous_input2
+        previous_input2 = input2
+
+        for inputs, expected in [(input1, forcing[i - 1]), (input2, forcing[i])]:
+            assert inputs["T_a"].dtype == np.float64
+            assert inputs["T_a"].flags["C_CONTIGUOUS"]
+            np.testing.assert_array_equal(inputs["T_a"], expected["T_a"])
+            assert inputs["S_n"].shape == (1, 1)
+            assert inputs["S_n"][0, 0] == expected["S_n"]
+
+    # two preallocated slots, swapped every timestep
+    assert forcing_buffer.advance(forcing[0])[1] is input1
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pysnobal import defaults, ipysnobal
+from pysnobal.c_snobal import snobal
+from pysnobal.live_state import LiveState, LiveStateReader, read_live_grid
+from pysnobal.pysnobal import _parse_inputs, load_config
+
+
+def test_live_state_snobal_writes_in_place(test_data, tmp_path):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df, mh, params, timestep_info, output_rec = _parse_inputs(
+        forcing_df.iloc[550:600].copy(), config
+    )
+
+    shape = (2, 3)
+    for key, value in output_rec.items():
+        output_rec[key] = np.full(shape, value.ravel()[0], dtype=np.float64)
+
+    live_state = LiveState(tmp_path / "grid.snobal_live", shape)
+    live_state.attach(output_rec)
+    live_state.commit(0, forcing_df.index[0])
+    reader = LiveStateReader(tmp_path / "grid.snobal_live")
+
+    assert reader.shape == shape
+    assert reader.fields == list(defaults.OUTPUT_NAMES_SNOBAL2CUSTOM.keys())
+    assert reader.snapshot().step == 0
+
+    def forcing(i):
+        return {
+            k: np.full(shape, forcing_df[k].iloc[i])
+            for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values()
+        }
+
+    forcing_buffer = ipysnobal.ForcingBuffer(forcing(0))
+    for i in range(len(forcing_df) - 1):
+        input1, input2 = forcing_buffer.advance(forcing(i + 1))
+        live_state.begin()
+        snobal.do_tstep_grid(
+            input1,
+            input2,
+            output_rec,
+            timestep_info,
+            mh,
+            params,
+            first_step=int(i == 1),
+        )
+        live_state.commit(i + 1, forcing_df.index[i + 1])
+
+    # Snobal wrote the state straight into the file
+    snapshot = reader.snapshot(["z_s", "m_s", "layer_count"])
+    assert snapshot.step == len(forcing_df) - 1
+    assert snapshot.time == np.datetime64(forcing_df.index[-1], "ns")
+    assert snapshot["m_s"].max() > 0
+    for name in ["z_s", "m_s", "layer_count"]:
+        np.testing.assert_array_equal(snapshot[name], output_rec[name])
+        assert isinstance(output_rec[name], np.memmap)
+
+    live_state.close()
+
+
+def test_live_state_consistency(tmp_path):
+    live_state = LiveState(tmp_path / "a.snobal_live", (2, 2), fields=["z_s"])
+    reader = LiveStateReader(tmp_path / "a.snobal_live")
+
+    # nothing committed yet
+    with pytest.raises(TimeoutError):
+        reader.snapshot(timeout=0.01)
+
+    live_state.arrays["z_s"][:] = 1.0
+    live_state.commit(0, np.datetime64("2020-01-01T00"))
+    live_state.begin()
+    live_state.arrays["z_s"][:] = 2.0
+
+    # timestep in progress
+    with pytest.raises(TimeoutError):
+        reader.snapshot(timeout=0.01)
+
+    live_state.commit(1, np.datetime64("2020-01-01T01"))
+    snapshot = reader.snapshot()
+    assert snapshot.step == 1
+    np.testing.assert_array_equal(snapshot["z_s"], 2.0)
+
+    with pytest.raises(ValueError):
+        LiveState(tmp_path / "b.snobal_live", (2, 2), fields=["a_very_long_field_name"])
+
+    (tmp_path / "c.snobal_live").write_bytes(b"\0" * 4096)
+    with pytest.raises(ValueError):
+        LiveStateReader(tmp_path / "c.snobal_live")
+
+
+def test_read_live_grid(tmp_path):
+    chunks = [((0, 0), (2, 2), 3), ((0, 2), (2, 1), 5)]
+    for origin, shape, step in chunks:
+        live_state = LiveState(
+            tmp_path / f"{origin[0]}_{origin[1]}.snobal_live",
+            shape,
+            fields=["z_s"],
+            origin=origin,
+        )
+        live_state.arrays["z_s"][:] = step / 10
+        live_state.commit(step, np.datetime64("2020-01-01T00"))
+
+    grids = read_live_grid(tmp_path)
+
+    np.testing.assert_array_equal(grids["step"], [[3, 3, 5], [3, 3, 5]])
+    np.testing.assert_array_equal(grids["z_s"], [[0.3, 0.3, 0.5], [0.3, 0.3, 0.5]])
+
+    with pytest.raises(ValueError):
+        read_live_grid(tmp_path / "missing")
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pysnobal import defaults
+from pysnobal.c_snobal import snobal
+from pysnobal.model import SnobalModel
+from pysnobal.pysnobal import _parse_inputs, load_config
+
+SHAPE = (2, 3)
+N_TIMES = 200
+
+
+def _inputs(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df = forcing_df.iloc[550 : 551 + N_TIMES][
+        list(defaults.FORCING_NAMES_CUSTOM2SNOBAL.keys())
+    ]
+    snobal_df, mh, params, timestep_info, output_rec = _parse_inputs(
+        forcing_df.copy(), load_config(test_data.config("baseline", "config"))
+    )
+    for key, value in output_rec.items():
+        output_rec[key] = np.full(SHAPE, value.ravel()[0], dtype=np.float64)
+
+    def read_forcing(time, buffer):
+        for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values():
+            buffer[k][:] = snobal_df.loc[time, k]
+
+    return config, snobal_df, read_forcing, output_rec, timestep_info, mh, params
+
+
+def _model(config, snobal_df, **kwargs):
+    return SnobalModel(
+        config,
+        np.full(SHAPE, config["params"]["elevation_m"]),
+        config["params"]["roughness_length_m"],
+        snobal_df.index[0],
+        snobal_df.index[1] - snobal_df.index[0],
+        **kwargs,
+    )
+
+
+def _expected(snobal_df, output_rec, timestep_info, mh, params, output_vars=None):
+    expected = []
+    for i in range(N_TIMES):
+        input1, input2 = (
+            {k: np.full(SHAPE, snobal_df[k].iloc[j]) for k in snobal_df.columns}
+            for j in (i, i + 1)
+        )
+        rt = snobal.do_tstep_grid(
+            input1,
+            input2,
+            output_rec,
+            timestep_info,
+            mh,
+            params,
+            first_step=int(i == 1),
+            output_vars=output_vars,
+        )
+        assert rt == -1
+        output_rec["time_since_out"][:] = 0.0
+        expected.append({k: v.copy() for k, v in output_rec.items()})
+    return expected
+
+
+def test_step_matches_do_tstep_grid(test_data):
+    config, snobal_df, read_forcing, *args = _inputs(test_data)
+    expected = _expected(snobal_df, *args)
+    model = _model(config, snobal_df)
+
+    m_s = model.get_value("m_s")
+    for i in range(N_TIMES):
+        read_forcing(snobal_df.index[i], model.forcing_t)
+        read_forcing(snobal_df.index[i + 1], model.forcing_t1)
+        model.step()
+
+        # the outputs are views of the state, updated in place
+        assert model.get_value("m_s") is m_s
+        for k, v in expected[i].items():
+            if k != "mask":
+                np.testing.assert_array_equal(model.get_value(k), v, err_msg=k)
+
+    assert model.n_steps == N_TIMES
+    assert model.time == snobal_df.index[N_TIMES]
+    assert expected[-1]["m_s"].max() > 0
+
+
+def test_run_until(test_data):
+    config, snobal_df, read_forcing, *args = _inputs(test_data)
+    expected = _expected(snobal_df, *args, output_vars=["m_s", "h2o"])
+
+    model = _model(config, snobal_df, output_vars=["m_s", "h2o"])
+    reads = []
+
+    def counting_read(time, buffer):
+        reads.append(time)
+        read_forcing(time, buffer)
+
+    # between timesteps, and in two calls
+    model.run_until(snobal_df.index[100] + pd.Timedelta(minutes=30), counting_read)
+    assert model.n_steps == 100
+    model.run_until(snobal_df.index[N_TIMES], counting_read)
+
+    # each forcing time is read once
+    assert reads == list(snobal_df.index[: N_TIMES + 1])
+    for k in ["m_s", "h2o", "z_s", "ro_pred_sum"]:
+        np.testing.assert_array_equal(model.get_value(k), expected[-1][k], err_msg=k)
+
+
+def test_forcing_arrays_follow_run_until(test_data):
+    config, snobal_df, read_forcing, *args = _inputs(test_data)
+    expected = _expected(snobal_df, *args)
+    model = _model(config, snobal_df)
+
+    # steps filling forcing_t and forcing_t1 between odd and even run_until calls
+    for end in [2, 5, 7, 12, 14]:
+        model.run_until(snobal_df.index[end - 1], read_forcing)
+        i = model.n_steps
+        assert model.forcing_t is model._grid.input1
+        read_forcing(snobal_df.index[i], model.forcing_t)
+        read_forcing(snobal_df.index[i + 1], model.forcing_t1)
+        model.step()
+        assert model.n_steps == end
+
+        for k, v in expected[end - 1].items():
+            if k != "mask":
+                np.testing.assert_array_equal(model.get_value(k), v, err_msg=k)
+
+
+def test_model_checks(test_data):
+    config, snobal_df, *_ = _inputs(test_data)
+    model = _model(config, snobal_df)
+
+    with pytest.raises(ValueError):
+        model.step(forcing_t={"S_n": np.zeros(SHAPE)})
+    with pytest.raises(ValueError):
+        model.step(forcing_t1={**model.forcing_t1, "T_a": np.zeros((3, 2))})
+    with pytest.raises(ValueError):
+        SnobalModel(config, np.zeros(4), 0.01, snobal_df.index[0], 3600.0)
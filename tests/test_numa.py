@@ -0,0 +1,94 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from pysnobal import defaults, ipysnobal
+from pysnobal.benchmark import benchmark_threads
+from pysnobal.c_snobal import snobal
+from pysnobal.pipeline import run_pipeline
+from pysnobal.pysnobal import _parse_inputs, load_config
+
+SHAPE = (5, 7)
+OUTPUT_VARS = ["m_s", "cc_s", "h2o"]
+
+
+def _run(test_data, nthreads, numa, n_times=150):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df, mh, params, timestep_info, output_rec = _parse_inputs(
+        forcing_df.iloc[550 : 551 + n_times].copy(), config
+    )
+
+    init = {k: np.full(SHAPE, v.ravel()[0]) for k, v in output_rec.items()}
+    init["elevation"] = np.linspace(1500.0, 2500.0, np.prod(SHAPE)).reshape(SHAPE)
+    init["mask"][0, 1] = 0
+    output_rec = ipysnobal.initialize(init, numa_threads=nthreads if numa else None)
+
+    def read_forcing(step, buffer):
+        for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values():
+            buffer[k][:] = forcing_df[k].iloc[step]
+
+    output = []
+    run_pipeline(
+        read_forcing,
+        lambda step, values: output.append({k: v.copy() for k, v in values.items()}),
+        n_times,
+        output_rec,
+        timestep_info,
+        mh,
+        params,
+        output_vars=OUTPUT_VARS,
+        nthreads=nthreads,
+        numa=numa,
+    )
+    return output
+
+
+def test_numa_matches(test_data):
+    expected = _run(test_data, 1, numa=False)
+    assert expected[-1]["m_s"].max() > 0
+
+    for nthreads in [1, 2]:
+        output = _run(test_data, nthreads, numa=True)
+        for step_expected, step_output in zip(expected, output):
+            for k in step_expected:
+                np.testing.assert_array_equal(
+                    step_output[k], step_expected[k], err_msg=k
+                )
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux") or len(os.sched_getaffinity(0)) < 2,
+    reason="threads are pinned only on Linux with several CPUs",
+)
+def test_numa_restores_affinity(test_data):
+    affinity = os.sched_getaffinity(0)
+    _run(test_data, 2, numa=True, n_times=5)
+
+    # every thread of the process, including the OpenMP workers
+    for tid in os.listdir("/proc/self/task"):
+        assert os.sched_getaffinity(int(tid)) == affinity
+
+
+def test_numa_empty():
+    array = snobal.numa_empty((3, 4), np.int32, nthreads=2)
+    assert array.dtype == np.int32 and array.shape == (3, 4)
+    assert array.flags["C_CONTIGUOUS"]
+    np.testing.assert_array_equal(array, 0)
+
+    output_rec = ipysnobal.initialize(
+        {"elevation": np.full((3, 4), 2000.0), "z_0": 0.01}, numa_threads=2
+    )
+    np.testing.assert_array_equal(output_rec["z_0"], 0.01)
+    assert output_rec["m_s"].shape == (3, 4)
+
+
+def test_benchmark_threads(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    table = benchmark_threads(config, (4, 4), [1, 2], n_steps=2, numa=True)
+
+    assert list(table.index) == [1, 2]
+    assert table.loc[1, "speedup"] == 1.0
+    assert (table["pixels_per_second"] > 0).all()
@@ -0,0 +1,118 @@
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+from pysnobal import defaults, ipysnobal
+from pysnobal.c_snobal import snobal
+from pysnobal.pipeline import run_pipeline
+from pysnobal.pysnobal import _parse_inputs, load_config
+
+OUTPUT_VARS = ["z_s", "m_s", "rho", "melt_sum"]
+SHAPE = (2, 5)
+
+
+def _inputs(test_data, n_times):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df, mh, params, timestep_info, output_rec = _parse_inputs(
+        forcing_df.iloc[550 : 551 + n_times].copy(), config
+    )
+    for key, value in output_rec.items():
+        output_rec[key] = np.full(SHAPE, value.ravel()[0], dtype=np.float64)
+    output_rec["elevation"][:] = np.linspace(1500, 2500, SHAPE[1])
+
+    def forcing(i):
+        return {
+            k: np.full(SHAPE, forcing_df[k].iloc[i])
+            for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values()
+        }
+
+    return forcing, output_rec, timestep_info, mh, params
+
+
+def _run_sequential(test_data, n_times):
+    forcing, output_rec, timestep_info, mh, params = _inputs(test_data, n_times)
+    forcing_buffer = ipysnobal.ForcingBuffer(forcing(0))
+    output = []
+    for i in range(n_times):
+        input1, input2 = forcing_buffer.advance(forcing(i + 1))
+        snobal.do_tstep_grid(
+            input1,
+            input2,
+            output_rec,
+            timestep_info,
+            mh,
+            params,
+            first_step=int(i == 1),
+            output_vars=OUTPUT_VARS,
+        )
+        output.append({v: output_rec[v].copy() for v in OUTPUT_VARS + ["layer_count"]})
+        output_rec["time_since_out"][:] = 0.0
+    return output
+
+
+def _run_pipelined(test_data, n_times, delay=0.0, fail=None, **kwargs):
+    forcing, output_rec, timestep_info, mh, params = _inputs(test_data, n_times)
+    output = [None] * n_times
+
+    def read_forcing(step, buffer):
+        time.sleep(delay)
+        if fail == "read" and step == 3:
+            raise OSError("forcing unavailable")
+        for k, v in forcing(step).items():
+            buffer[k][:] = v
+
+    def write_output(step, values):
+        time.sleep(delay)
+        if fail == "write" and step == 3:
+            raise OSError("disk full")
+        output[step] = {k: v.copy() for k, v in values.items()}
+
+    stats = run_pipeline(
+        read_forcing,
+        write_output,
+        n_times,
+        output_rec,
+        timestep_info,
+        mh,
+        params,
+        output_vars=OUTPUT_VARS,
+        **kwargs,
+    )
+    return output, stats
+
+
+@pytest.mark.parametrize("queue_depth", [1, 3])
+def test_pipeline_matches_sequential(test_data, queue_depth):
+    expected = _run_sequential(test_data, 100)
+    output, stats = _run_pipelined(test_data, 100, queue_depth=queue_depth)
+
+    assert expected[-1]["m_s"].max() > 0
+    for step_expected, step_output in zip(expected, output):
+        assert step_output.keys() == step_expected.keys()
+        for v in step_expected:
+            np.testing.assert_array_equal(step_output[v], step_expected[v], err_msg=v)
+
+    assert stats.n_steps == 100
+    assert set(stats.utilisation) == {"read", "compute", "write"}
+    assert "timesteps/s" in stats.summary()
+
+
+def test_pipeline_overlaps_io(test_data):
+    _, stats = _run_pipelined(test_data, 20, delay=0.02)
+
+    # reading and writing overlap, rather than adding up
+    assert stats.busy_s["read"] > 0.4 and stats.busy_s["write"] > 0.4
+    assert stats.wall_time_s < 0.8 * sum(stats.busy_s.values())
+
+
+@pytest.mark.parametrize("fail", ["read", "write"])
+def test_pipeline_stage_errors(test_data, fail):
+    with pytest.raises(OSError):
+        _run_pipelined(test_data, 10, fail=fail)
+
+
+def test_pipeline_exceptions(test_data):
+    with pytest.raises(ValueError):
+        _run_pipelined(test_data, 2, queue_depth=0)
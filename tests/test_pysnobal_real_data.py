@@ -67,3 +67,29 @@ def test_pysnobal_functional_entrypoint_real_data(test_data):
         expected_df.drop(columns=drop_list).reset_index(),
         check_exact=False,
     )
+
+
+def test_pysnobal_output_vars_real_data(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    output_vars = ["m_s", "z_s", "melt_sum", "ro_pred_sum"]
+
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+
+    expected_df = pd.read_csv(
+        test_data.model_expected(), index_col="Datetime", parse_dates=True
+    )
+    expected_columns = [
+        "thickness_snow_m",
+        "specific_mass_snow_kgm-2",
+        "snowmelt_kgm-2",
+        "surface_Water_input_kg",
+    ]
+
+    result_df = run_snobal(forcing_df, config, output_vars=output_vars)
+
+    assert list(result_df.columns) == expected_columns
+    pd.testing.assert_frame_equal(
+        result_df.reset_index(),
+        expected_df[expected_columns].reset_index(),
+        check_exact=False,
+    )
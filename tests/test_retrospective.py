@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+from pysnobal.pysnobal import load_config, run_snobal
+from pysnobal.retrospective import (
+    BREAKPOINTS_ATTR,
+    run_retrospective,
+    water_year_starts,
+)
+
+
+def test_run_retrospective(test_data):
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    expected_df = run_snobal(
+        forcing_df.copy(), load_config(test_data.config("baseline", "config"))
+    )
+
+    # a breakpoint after a snow-free timestep, and one during the snow season
+    snow = expected_df["specific_mass_snow_kgm-2"]
+    snow_free = forcing_df.index[1:][(snow == 0).to_numpy()]
+    snow_free = snow_free[snow_free < "2019-12-01"][-1]
+    snowy = pd.Timestamp("2020-02-01 00:00")
+    assert snow.loc[snowy] > 0
+
+    output_df = run_retrospective(
+        forcing_df.copy(),
+        load_config(test_data.config("baseline", "config")),
+        breakpoints=[snowy, snow_free],
+        processes=2,
+    )
+    pd.testing.assert_frame_equal(output_df, expected_df)
+    assert output_df.attrs[BREAKPOINTS_ATTR] == [snow_free]
+
+    with pytest.raises(ValueError):
+        run_retrospective(
+            forcing_df,
+            load_config(test_data.config("baseline", "config")),
+            breakpoints=[forcing_df.index[-1]],
+        )
+
+
+def test_water_year_starts():
+    index = pd.date_range("2019-09-01", "2021-10-01", freq="6H")
+    # the last time of the record is not a breakpoint
+    assert water_year_starts(index) == [
+        pd.Timestamp("2019-10-01"),
+        pd.Timestamp("2020-10-01"),
+    ]
+
+    index = pd.date_range("2019-09-30 23:00", "2022-03-01", freq="7H")
+    starts = water_year_starts(index, month=10)
+    assert starts == [index[index >= f"{y}-10-01"][0] for y in [2019, 2020, 2021]]
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pysnobal import defaults, ipysnobal
+from pysnobal.c_snobal import snobal
+from pysnobal.pysnobal import _parse_inputs, load_config
+from pysnobal.sparse_output import SparseOutput, SparseOutputWriter
+
+
+def _run_grid(test_data, writer=None, n_times=200):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df, mh, params, timestep_info, output_rec = _parse_inputs(
+        forcing_df.iloc[500 : 501 + n_times].copy(), config
+    )
+
+    # snow only in the pixels with precipitation
+    shape = (3, 4)
+    for key, value in output_rec.items():
+        output_rec[key] = np.full(shape, value.ravel()[0], dtype=np.float64)
+    output_rec["mask"][0, 0] = 0
+    precip_scale = np.zeros(shape)
+    precip_scale[1:, 2:] = 1.0
+
+    def forcing(i):
+        values = {}
+        for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values():
+            values[k] = np.full(shape, forcing_df[k].iloc[i])
+        values["m_pp"] *= precip_scale
+        return values
+
+    forcing_buffer = ipysnobal.ForcingBuffer(forcing(0))
+    output = []
+    for i in range(n_times):
+        input1, input2 = forcing_buffer.advance(forcing(i + 1))
+        snobal.do_tstep_grid(
+            input1,
+            input2,
+            output_rec,
+            timestep_info,
+            mh,
+            params,
+            first_step=int(i == 1),
+        )
+        output_rec["time_since_out"][:] = 0.0
+
+        step = {k: output_rec[k].copy() for k in defaults.SNOW_OUT + ["layer_count"]}
+        step["z_s"][0, 0] = np.nan
+        output.append(step)
+        if writer is not None:
+            writer.write(forcing_df.index[i], step)
+
+    return forcing_df.index[:n_times], output
+
+
+def test_sparse_output_round_trip(test_data, tmp_path):
+    with SparseOutputWriter(
+        tmp_path, (3, 4), defaults.SNOW_OUT, keyframe_interval=50
+    ) as writer:
+        times, expected = _run_grid(test_data, writer)
+
+    output = SparseOutput(tmp_path)
+    assert len(output) == len(expected)
+    assert (output.times == times).all()
+
+    # snow in the 4 pixels with precipitation only
+    assert (expected[-1]["layer_count"] > 0).sum() == 4
+
+    stored = output._steps["count"]
+    assert stored[0] == 12
+    assert stored.sum() < 0.5 * 12 * len(expected)
+
+    for n in [0, 49, 50, 120, len(expected) - 1]:
+        grids = output.grid(n)
+        for k in defaults.SNOW_OUT:
+            np.testing.assert_array_equal(grids[k], expected[n][k], err_msg=k)
+
+    grids = output.grid(times[120], fields=["m_s"])
+    np.testing.assert_array_equal(grids["m_s"], expected[120]["m_s"])
+
+    series = output.series(2, 3, fields=["m_s", "z_s"])
+    np.testing.assert_array_equal(series["m_s"], [s["m_s"][2, 3] for s in expected])
+    np.testing.assert_array_equal(series["z_s"], [s["z_s"][2, 3] for s in expected])
+    assert (series.index == times).all()
+
+
+def test_sparse_output_exceptions(tmp_path):
+    with pytest.raises(ValueError):
+        SparseOutputWriter(tmp_path, (2, 2), ["m_s"], keyframe_interval=0)
+
+    with SparseOutputWriter(tmp_path, (2, 2), ["m_s"]) as writer:
+        writer.write(np.datetime64("2020-01-01"), {"m_s": np.zeros((2, 2))})
+
+    output = SparseOutput(tmp_path)
+    with pytest.raises(ValueError):
+        output.grid(0, fields=["z_s"])
+    with pytest.raises(IndexError):
+        output.grid(1)
+    with pytest.raises(KeyError):
+        output.grid(np.datetime64("2021-01-01"))
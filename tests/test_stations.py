@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pysnobal import defaults, utils
+from pysnobal.pipeline import run_pipeline
+from pysnobal.pysnobal import _parse_inputs, load_config, run_snobal
+from pysnobal.stations import StationExtractor
+
+OUTPUT_VARS = ["z_s", "m_s", "T_s", "melt_sum", "H_bar"]
+
+
+def _run_stations(test_data, forcing_df, stations, shape=(4, 6)):
+    config = load_config(test_data.config("baseline", "config"))
+    _, mh, params, timestep_info, output_rec = _parse_inputs(forcing_df.copy(), config)
+    for key, value in output_rec.items():
+        output_rec[key] = np.full(shape, value.ravel()[0], dtype=np.float64)
+
+    forcing = {
+        k: forcing_df[k].to_numpy() for k in defaults.FORCING_NAMES_CUSTOM2SNOBAL.keys()
+    }
+
+    def read_forcing(step, buffer):
+        for k, v in defaults.FORCING_NAMES_CUSTOM2SNOBAL.items():
+            buffer[v][:] = forcing[k][step]
+            if v in ["T_a", "T_g", "T_pp"]:
+                buffer[v] += utils.C_TO_K
+
+    run_pipeline(
+        read_forcing,
+        None,
+        len(forcing_df) - 1,
+        output_rec,
+        timestep_info,
+        mh,
+        params,
+        stations=stations,
+    )
+
+
+def test_station_extraction_matches_run_snobal(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df = forcing_df.iloc[500:800][
+        list(defaults.FORCING_NAMES_CUSTOM2SNOBAL.keys())
+    ]
+
+    stations = StationExtractor(
+        [(0, 0), (3, 5), (2, 1)],
+        forcing_df.index[:-1],
+        output_vars=OUTPUT_VARS,
+        names=["a", "b", "c"],
+    )
+    _run_stations(test_data, forcing_df, stations)
+    table = stations.to_dataframe()
+
+    assert table.index.names == ["station", "time"]
+    assert len(table) == 3 * (len(forcing_df) - 1)
+
+    expected = run_snobal(forcing_df.copy(), config, output_vars=OUTPUT_VARS)
+    assert list(table.columns) == list(expected.columns)
+    for name in ["a", "b", "c"]:
+        pd.testing.assert_frame_equal(
+            table.loc[name], expected, check_names=False, check_freq=False
+        )
+
+
+def test_station_coordinates():
+    times = pd.date_range("2020-01-01", periods=3, freq="H")
+    x = np.array([100.0, 150.0, 200.0])
+    y = np.array([500.0, 450.0])
+
+    stations = StationExtractor(
+        [(140.0, 460.0), (210.0, 500.0)], times, output_vars=["m_s"], x=x, y=y
+    )
+    np.testing.assert_array_equal(stations.rows, [1, 0])
+    np.testing.assert_array_equal(stations.cols, [1, 2])
+
+    output_rec = {"m_s": np.arange(6.0).reshape(2, 3)}
+    for step in range(3):
+        stations.record(step, output_rec)
+    table = stations.to_dataframe()
+    np.testing.assert_array_equal(
+        table["specific_mass_snow_kgm-2"], [4.0, 4.0, 4.0, 2.0, 2.0, 2.0]
+    )
+
+    with pytest.raises(ValueError):
+        StationExtractor([(300.0, 500.0)], times, x=x, y=y)
+    with pytest.raises(ValueError):
+        StationExtractor([(0.5, 1)], times)
+    with pytest.raises(ValueError):
+        StationExtractor([(0, 1)], times, names=["a", "b"])
+    with pytest.raises(ValueError):
+        StationExtractor([(0, 1)], times, x=x)
@@ -0,0 +1,170 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pysnobal import defaults
+from pysnobal.pipeline import run_pipeline
+from pysnobal.pysnobal import _parse_inputs, load_config
+from pysnobal.tiling import assemble_state, bytes_per_pixel, plan_tiles, run_tiled
+
+OUTPUT_VARS = ["z_s", "m_s", "melt_sum"]
+SHAPE = (4, 6)
+
+
+class GridForcing:
+    """
+    Converted forcing of the test data, with the precipitation varying over the grid.
+    """
+
+    def __init__(self, forcing_df):
+        self.forcing = {
+            v: forcing_df[v].to_numpy()
+            for v in defaults.FORCING_NAMES_CUSTOM2SNOBAL.values()
+        }
+        self.scale = np.linspace(0.5, 1.5, SHAPE[0] * SHAPE[1]).reshape(SHAPE)
+
+    def __call__(self, tile, step, buffer):
+        for k, v in self.forcing.items():
+            buffer[k][:] = v[step]
+        buffer["m_pp"] *= self.scale[tile.rows, tile.cols]
+
+
+def _inputs(test_data):
+    config = load_config(test_data.config("baseline", "config"))
+    forcing_df = pd.read_csv(test_data.model_input(), index_col=0, parse_dates=True)
+    forcing_df, mh, params, timestep_info, output_rec = _parse_inputs(
+        forcing_df.iloc[550:700].copy(), config
+    )
+    init = {k: float(v.ravel()[0]) for k, v in output_rec.items()}
+    init["elevation"] = np.linspace(1500, 2500, SHAPE[0] * SHAPE[1]).reshape(SHAPE)
+    return GridForcing(forcing_df), init, len(forcing_df) - 1, timestep_info, mh, params
+
+
+def test_plan_tiles():
+    per_pixel = sum(bytes_per_pixel().values())
+
+    plan = plan_tiles((100, 50), (per_pixel * 5000 + 2**20) / 2**20, overhead_mb=1)
+    assert len(plan.tiles) == 1
+
+    plan = plan_tiles((100, 50), per_pixel * 1200 / 2**20, overhead_mb=0)
+    assert [t.shape for t in plan.tiles] == [(24, 50)] * 4 + [(4, 50)]
+    assert plan.peak_bytes <= plan.budget_bytes
+    assert "bytes/pixel" in plan.summary()
+
+    plan = plan_tiles((3, 50), per_pixel * 20 / 2**20, overhead_mb=0)
+    assert [t.shape for t in plan.tiles] == [(1, 20), (1, 20), (1, 10)] * 3
+
+    # tiles cover the grid exactly once
+    covered = np.zeros((3, 50), dtype=int)
+    for tile in plan.tiles:
+        covered[tile.rows, tile.cols] += 1
+    assert (covered == 1).all()
+
+    with pytest.raises(ValueError):
+        plan_tiles((10, 10), 100)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_run_tiled_matches_whole_grid(test_data, tmp_path, workers):
+    read_forcing, init, n_steps, timestep_info, mh, params = _inputs(test_data)
+
+    # whole grid in one pipeline
+    output_rec = {k: np.full(SHAPE, v, dtype=np.float64) for k, v in init.items()}
+    expected = {v: np.empty((n_steps, *SHAPE)) for v in OUTPUT_VARS}
+
+    def write_output(step, output):
+        for v in OUTPUT_VARS:
+            expected[v][step] = output[v]
+
+    whole = plan_tiles(SHAPE, 1e6).tiles[0]
+    run_pipeline(
+        lambda step, buffer: read_forcing(whole, step, buffer),
+        write_output,
+        n_steps,
+        output_rec,
+        timestep_info,
+        mh,
+        params,
+        output_vars=OUTPUT_VARS,
+    )
+
+    # tiles of 4 pixels, parts of rows
+    budget_mb = workers * 4 * sum(bytes_per_pixel(OUTPUT_VARS).values()) / 2**20
+    plan = run_tiled(
+        init,
+        read_forcing,
+        n_steps,
+        timestep_info,
+        mh,
+        params,
+        tmp_path,
+        budget_mb,
+        output_vars=OUTPUT_VARS,
+        workers=workers,
+        overhead_mb=0,
+    )
+    assert len(plan.tiles) == 8
+
+    assert expected["m_s"][-1].min() < expected["m_s"][-1].max()
+    for v in OUTPUT_VARS:
+        np.testing.assert_array_equal(np.load(tmp_path / f"{v}.npy"), expected[v])
+
+    state = assemble_state(plan, tmp_path)
+    for k in ["z_s", "rho", "layer_count", "T_s_0"]:
+        np.testing.assert_array_equal(state[k], output_rec[k])
+
+    # a restart skips the finished tiles
+    (tmp_path / "m_s.npy").unlink()
+    np.lib.format.open_memmap(tmp_path / "m_s.npy", "w+", np.float64, (n_steps, *SHAPE))
+    run_tiled(
+        init,
+        read_forcing,
+        n_steps,
+        timestep_info,
+        mh,
+        params,
+        tmp_path,
+        budget_mb,
+        output_vars=OUTPUT_VARS,
+        workers=workers,
+        overhead_mb=0,
+    )
+    assert (np.load(tmp_path / "m_s.npy") == 0).all()
+
+    # a restart with other tiles or another initial state is refused
+    with pytest.raises(ValueError, match="tiles"):
+        run_tiled(
+            init,
+            read_forcing,
+            n_steps,
+            timestep_info,
+            mh,
+            params,
+            tmp_path,
+            2 * budget_mb,
+            output_vars=OUTPUT_VARS,
+            workers=workers,
+            overhead_mb=0,
+        )
+    with pytest.raises(ValueError, match="init_sha256"):
+        run_tiled(
+            {**init, "z_s": 0.5},
+            read_forcing,
+            n_steps,
+            timestep_info,
+            mh,
+            params,
+            tmp_path,
+            budget_mb,
+            output_vars=OUTPUT_VARS,
+            workers=workers,
+            overhead_mb=0,
+        )
+    assert (np.load(tmp_path / "m_s.npy") == 0).all()
+
+
+def test_run_tiled_exceptions(test_data, tmp_path):
+    read_forcing, init, n_steps, timestep_info, mh, params = _inputs(test_data)
+    del init["z_0"]
+
+    with pytest.raises(ValueError):
+        run_tiled(init, read_forcing, n_steps, timestep_info, mh, params, tmp_path, 1e3)